@@ -0,0 +1,102 @@
+import time
+
+import streamlit as st
+
+from audit_log import AUDIT_LOG
+from micro_batcher import BATCHING_ENABLED, batcher_stats
+from perf_metrics import STAGE_METRICS, TIMINGS_ENABLED
+from prediction_cache import PREDICTION_CACHE
+from risk_engine import STARTUP_TIMINGS, has_fast_path
+
+def render_prediction_cache_stats():
+    """Sidebar panel with prediction cache hit/miss/eviction counts"""
+    stats = PREDICTION_CACHE.stats()
+    with st.sidebar.expander("Prediction Cache", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Hit Rate", f"{stats['hit_rate']:.1%}")
+        col2.metric("Entries", f"{stats['size']:,} / {stats['maxsize']:,}")
+        col1.metric("Hits", f"{stats['hits']:,}")
+        col2.metric("Misses", f"{stats['misses']:,}")
+        col1.metric("Evictions", f"{stats['evictions']:,}")
+        col2.metric("Expired", f"{stats['expirations']:,}")
+        ttl = f"{stats['ttl']:g}s" if stats['ttl'] else "none"
+        st.caption(f"TTL: {ttl} · Keyed per model version")
+
+def render_batching_stats(model):
+    """Sidebar panel with micro-batching statistics for the serving model"""
+    with st.sidebar.expander("Request Batching", expanded=False):
+        if not BATCHING_ENABLED:
+            st.caption("Batching is disabled (RISK_APP_BATCHING=0).")
+            return
+        if model is not None and has_fast_path(model):
+            st.caption("Not used: the lookup table or interval grid answers without a model call.")
+            return
+        stats = batcher_stats(model) if model is not None else None
+        if stats is None:
+            st.caption("No batched predictions yet.")
+            return
+        col1, col2 = st.columns(2)
+        col1.metric("Batches", f"{stats['batches']:,}")
+        col2.metric("Rows", f"{stats['rows']:,}")
+        col1.metric("Mean Batch", f"{stats['mean_batch_size']:.1f}")
+        col2.metric("Largest Batch", f"{stats['largest_batch']:,}")
+        st.caption(f"Max batch: {stats['max_batch']} rows · Max wait: {stats['max_wait_ms']:g} ms")
+
+def render_model_registry(status):
+    """Sidebar panel with the serving model version and hot-swap state"""
+    with st.sidebar.expander("Model Registry", expanded=False):
+        if status["loaded_at"] is None:
+            st.caption("The model loads on the first risk assessment.")
+        else:
+            st.metric("Serving", status["version"] or "shipped model")
+            st.caption(f"Model hash: {status['model_version']} · Loaded "
+                       f"{time.strftime('%H:%M:%S', time.localtime(status['loaded_at']))} · "
+                       f"Swaps: {status['swaps']}")
+        if status["watching"]:
+            st.caption(f"Watching the registry every {status['poll_seconds']:g}s.")
+        if status["last_error"]:
+            st.warning(f"Last swap failed: {status['last_error']}")
+
+def render_startup_timings():
+    """Sidebar panel with the time this process spent loading each artifact"""
+    with st.sidebar.expander("Startup Timings", expanded=False):
+        if not STARTUP_TIMINGS:
+            st.caption("Nothing loaded yet.")
+            return
+        for stage, seconds in STARTUP_TIMINGS.items():
+            st.metric(stage.capitalize(), f"{seconds * 1000:,.0f} ms")
+        if "model" not in STARTUP_TIMINGS:
+            st.caption("The model loads on the first risk assessment.")
+
+def render_audit_log_stats():
+    """Sidebar panel with what the assessment audit log has written"""
+    stats = AUDIT_LOG.stats()
+    with st.sidebar.expander("Audit Log", expanded=False):
+        if not stats["enabled"]:
+            st.caption("Audit logging is disabled (RISK_APP_AUDIT=0).")
+            return
+        col1, col2 = st.columns(2)
+        col1.metric("Recorded", f"{stats['records']:,}")
+        col2.metric("Pending", f"{stats['pending']:,}")
+        col1.metric("Segments", f"{stats['segments']:,}")
+        col2.metric("Written", f"{stats['bytes_written'] / 1024:,.0f} KiB")
+        st.caption(f"Directory: {stats['directory']}")
+        if stats["last_error"]:
+            st.warning(f"Last write failed: {stats['last_error']}")
+
+def render_stage_latencies():
+    """Sidebar panel with rolling p50/p95/p99 latencies per stage and a Prometheus export"""
+    with st.sidebar.expander("Stage Latencies", expanded=False):
+        if not TIMINGS_ENABLED:
+            st.caption("Timing hooks are disabled (RISK_APP_TIMINGS=0).")
+            return
+        snapshot = STAGE_METRICS.snapshot()
+        if not snapshot:
+            st.caption("No timed stages yet.")
+            return
+        st.dataframe([{"Stage": stage, "Count": stats["count"], "p50 (ms)": stats["p50"] * 1000,
+                       "p95 (ms)": stats["p95"] * 1000, "p99 (ms)": stats["p99"] * 1000}
+                      for stage, stats in snapshot.items()],
+                     hide_index=True, use_container_width=True)
+        st.download_button("Prometheus metrics", data=STAGE_METRICS.prometheus_text(),
+                           file_name="metrics.txt", mime="text/plain")
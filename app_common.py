@@ -0,0 +1,262 @@
+"""Loaders and the assessment panel shared by the Streamlit apps and pages
+
+The data loaders take the app's data sources (a tuple of paths or URLs) as
+their first argument, so each app keeps its own dataset while the cached
+vocabularies, search indexes and statistics are built the same way. Their
+second argument is data_version(sources), so a copy swapped in by a background
+refresh (or rows appended to a local file) is picked up on the next rerun.
+"""
+import time
+
+import streamlit as st
+
+from data_sources import load_columns
+from dataset_stats import load_stats
+from model_registry import MODEL_SERVER
+from perf_metrics import observe, stage_timer
+from risk_engine import SHARED_ARTIFACTS, assess_pair, bundle_version, freeze_loaded, load_encoders
+from search_index import SearchIndex
+from shared_artifacts import attach_search_index
+from vocabulary import load_vocabulary
+
+def data_version(sources):
+    """Checksum of the dataset copy the sources serve now (keys the data loaders)
+
+    Only a stat and a manifest read once a copy is cached; a due revalidation
+    starts in the background and changes the checksum when it swaps data in.
+    """
+    try:
+        return load_columns(sources, ['name', 'name_manufacturer']).checksum
+    except Exception:
+        return None  # reported by the loaders, which hit the same error
+
+@st.cache_resource(max_entries=2)
+def load_data(sources, data_key):
+    """Load the dataset for autocomplete suggestions"""
+    try:
+        with stage_timer("load_data"):
+            # Served from the cached copy when there is one; a download is revalidated in the background
+            columns = load_columns(sources, ['name', 'name_manufacturer'])
+            # Unique device names and manufacturers, read in place from the memory-mapped string tables
+            device_names = columns.unique('name')
+            manufacturers = columns.unique('name_manufacturer')
+        return device_names, manufacturers
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return [], []
+
+def load_model_and_encoders():
+    """The serving model and its label encoders (hot-swapped from the model registry)"""
+    try:
+        # One deployment per assessment or file, so a swap mid-request cannot mix versions
+        with stage_timer("load_model_and_encoders"):
+            deployment = MODEL_SERVER.current()
+        freeze_loaded(("deployment", deployment.version, deployment.loaded_at))
+        return deployment.model, deployment.le_device, deployment.le_manuf
+    except Exception as e:
+        st.error(f"Error loading model: {e}")
+        return None, None, None
+
+@st.cache_resource
+def load_label_encoders():
+    """Load the label encoders (the model itself is loaded on the first assessment, see load_dataset_stats)"""
+    try:
+        return load_encoders()
+    except Exception as e:
+        st.error(f"Error loading encoders: {e}")
+        return None, None
+
+@st.cache_resource(max_entries=2)
+def load_vocabularies(sources, data_key):
+    """Load the presorted autocomplete vocabularies (shared across reruns and sessions)"""
+    try:
+        le_device, le_manuf = load_label_encoders()
+        columns = load_columns(sources, ['name', 'name_manufacturer'])
+        return (load_vocabulary(columns, 'name', le_device),
+                load_vocabulary(columns, 'name_manufacturer', le_manuf))
+    except Exception as e:
+        st.error(f"Error loading vocabulary: {e}")
+        return None, None
+
+@st.cache_resource(max_entries=4)
+def load_code_vocabularies(sources, data_key, device_digest, manuf_digest, _le_device, _le_manuf):
+    """Vocabularies coded with the served encoders (keyed by their digests, so a swap gets its own)"""
+    columns = load_columns(sources, ['name', 'name_manufacturer'])
+    return (load_vocabulary(columns, 'name', _le_device),
+            load_vocabulary(columns, 'name_manufacturer', _le_manuf))
+
+@st.cache_resource(max_entries=2)
+def load_search_indexes(sources, data_key):
+    """Build the server-side name search indexes from the vocabularies"""
+    if SHARED_ARTIFACTS:
+        # Every worker process maps the same published indexes instead of building its own
+        try:
+            le_device, le_manuf = load_label_encoders()
+            columns = load_columns(sources, ['name', 'name_manufacturer'])
+            return (attach_search_index(columns, 'name', le_device),
+                    attach_search_index(columns, 'name_manufacturer', le_manuf))
+        except Exception as e:
+            st.error(f"Error loading search indexes: {e}")
+            return None, None
+    device_vocab, manuf_vocab = load_vocabularies(sources, data_key)
+    if device_vocab is None:
+        return None, None
+    return SearchIndex(device_vocab.names), SearchIndex(manuf_vocab.names)
+
+class ModelChanged(Exception):
+    """The served bundle changed between keying the statistics and loading its model"""
+
+def served_model(paths):
+    """The served model and encoders, which must come from the bundle at paths"""
+    deployment = MODEL_SERVER.current()
+    if deployment.paths != tuple(paths):
+        raise ModelChanged(deployment.version)
+    freeze_loaded(("deployment", deployment.version, deployment.loaded_at))
+    return deployment.model, deployment.le_device, deployment.le_manuf
+
+@st.cache_resource(max_entries=2)
+def aggregate_dataset_stats(sources, data_key, bundle_key, paths):
+    """Aggregate the dashboard statistics over the cached dataset (only new rows after an append)"""
+    try:
+        with stage_timer("load_dataset_stats"):
+            return load_stats(load_columns(sources, ['name', 'name_manufacturer']), bundle_key,
+                              lambda: served_model(paths))
+    except ModelChanged:
+        raise
+    except Exception as e:
+        st.error(f"Error computing statistics: {e}")
+        return None
+
+def load_dataset_stats(sources, data_key):
+    """Statistics of the served deployment (recomputed, or loaded from the cache, after a hot swap)
+
+    They are keyed by the served bundle's files, so saved statistics load
+    without the model; it is only loaded to aggregate rows they do not cover.
+    """
+    for _ in range(3):
+        try:
+            paths = MODEL_SERVER.paths()
+            return aggregate_dataset_stats(sources, data_key, bundle_version(paths), paths)
+        except ModelChanged:
+            continue  # swapped while the statistics were keyed; the server now reports the bundle it loaded
+        except OSError as e:
+            st.error(f"Error computing statistics: {e}")
+            return None
+    return None
+
+def served_bundle_key():
+    """Content key of the bundle being served, or about to be, read without loading the model"""
+    return bundle_version(MODEL_SERVER.paths())
+
+@st.cache_data(max_entries=4)
+def risk_mix_rows(bundle_key, stats_digest, _stats, _manufacturers, limit=10):
+    """Rows for the per-manufacturer risk mix table (rebuilt when the served bundle or the counts change)"""
+    stats, manufacturers = _stats, _manufacturers
+    return [{"Manufacturer": name, "Records": rows, "High": f"{mix[1]:.1%}", "Medium": f"{mix[2]:.1%}",
+             "Low": f"{mix[3]:.1%}"} for name, rows, mix in stats.top_manufacturers(manufacturers, limit)]
+
+def predict_risk(sources, data_key, device_name, manufacturer_name, model, le_device, le_manuf):
+    """Predict risk level and class probabilities for given device and manufacturer"""
+    try:
+        # Display names resolve through the vocabulary; anything else must match a class exactly (-1 otherwise)
+        with stage_timer("predict_risk.encode"):
+            device_vocab, manuf_vocab = load_code_vocabularies(sources, data_key, le_device.digest,
+                                                               le_manuf.digest, le_device, le_manuf)
+            device_code = (device_vocab.code(device_name) if device_name in device_vocab
+                           else le_device.code(device_name))
+            manuf_code = (manuf_vocab.code(manufacturer_name) if manufacturer_name in manuf_vocab
+                          else le_manuf.code(manufacturer_name))
+        
+        # One predict_proba pass (0→1, 1→2, 2→3), serving repeated pairs from the process-wide cache,
+        # recorded in the audit log like the scoring service's /predict
+        with stage_timer("predict_risk.predict"):
+            return assess_pair(model, device_name, manufacturer_name, device_code, manuf_code)
+    except Exception as e:
+        st.error(f"Error in prediction: {e}")
+        return None
+
+def get_risk_display(risk_level):
+    """Get risk level display information"""
+    risk_info = {
+        1: {"label": "HIGH RISK", "color": "red", "icon": "🔴", "description": "High risk devices require immediate attention and careful monitoring."},
+        2: {"label": "MEDIUM RISK", "color": "orange", "icon": "🟡", "description": "Medium risk devices should be monitored regularly."},
+        3: {"label": "LOW RISK", "color": "green", "icon": "🟢", "description": "Low risk devices have minimal safety concerns."}
+    }
+    return risk_info.get(risk_level, {"label": "UNKNOWN", "color": "gray", "icon": "❓", "description": "Risk level could not be determined."})
+
+def render_result(device_name, manufacturer_name, prediction):
+    """Result card for one assessment (styled by the app's risk-* CSS classes)"""
+    render_started = time.perf_counter()
+    risk_level = prediction.risk_level
+    risk_info = get_risk_display(risk_level)
+    
+    st.markdown(f"""
+    <div class="risk-{risk_info['color']}">
+        <h2>{risk_info['icon']} {risk_info['label']}</h2>
+        <p><strong>Device:</strong> {device_name}</p>
+        <p><strong>Manufacturer:</strong> {manufacturer_name}</p>
+        <p><strong>Confidence:</strong> {prediction.confidence:.0%}</p>
+        <p>{risk_info['description']}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Risk meter with the class probabilities from the same model pass
+    st.markdown("### Risk Level Assessment")
+    st.progress(risk_level / 3)
+    st.caption(f"Risk Level: {risk_level}/3 ({risk_info['label']})")
+    high, medium, low = prediction.probabilities
+    st.caption(f"Class probabilities: High {high:.1%} · Medium {medium:.1%} · Low {low:.1%}")
+    observe("render.result", time.perf_counter() - render_started)
+
+@st.fragment
+def assessment_panel(sources, data_key, device_index, manuf_index, result_slot, button_label="Assess Risk Level"):
+    """Sidebar inputs and the result card
+
+    Runs as a fragment: typing, picking a match or clicking the assess button
+    reruns only this function, not the page around it. The last assessment is
+    kept in session state so its card stays up while the next one is entered.
+    """
+    # Names are searched server-side and only the top matches are sent to the browser
+    device_query = st.text_input(
+        "Device Name",
+        help="Type part of a device name; close matches are suggested below",
+        key="device_query"
+    )
+    device_matches = device_index.search(device_query)
+    device_name = st.selectbox(
+        "Matching devices",
+        options=[""] + device_matches,
+        index=1 if device_query.strip() and device_matches else 0,
+        label_visibility="collapsed"
+    )
+    
+    manufacturer_query = st.text_input(
+        "Manufacturer Name",
+        help="Type part of a manufacturer name; close matches are suggested below",
+        key="manufacturer_query"
+    )
+    manufacturer_matches = manuf_index.search(manufacturer_query)
+    manufacturer_name = st.selectbox(
+        "Matching manufacturers",
+        options=[""] + manufacturer_matches,
+        index=1 if manufacturer_query.strip() and manufacturer_matches else 0,
+        label_visibility="collapsed"
+    )
+    
+    predict_button = st.button(button_label, type="primary", use_container_width=True)
+    
+    with result_slot.container():
+        if predict_button and device_name and manufacturer_name:
+            with st.spinner("Analyzing device risk level..."):
+                model, le_device, le_manuf = load_model_and_encoders()
+                prediction = (predict_risk(sources, data_key, device_name, manufacturer_name, model, le_device,
+                                           le_manuf) if model else None)
+            if prediction:
+                st.session_state["last_assessment"] = (device_name, manufacturer_name, prediction)
+                render_result(device_name, manufacturer_name, prediction)
+        elif predict_button:
+            st.warning("Please select both device name and manufacturer to assess risk level.")
+        elif "last_assessment" in st.session_state:
+            render_result(*st.session_state["last_assessment"])
+        else:
+            st.info(f"Enter device information in the sidebar and click '{button_label}' to begin analysis.")
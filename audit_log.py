@@ -0,0 +1,537 @@
+"""Append-only audit log of risk assessments
+
+Every assessment made through risk_engine.assess_pair (the apps' predict_risk
+and the scoring service's /predict) is recorded with the names as entered, their encoded codes, the predicted level, the model version
+and a timestamp. ``AuditLog.record`` only appends a tuple to a deque, which
+takes about half a microsecond. A background thread drains the deque every
+RISK_APP_AUDIT_FLUSH_MS milliseconds, or as soon as a batch fills, and appends
+each batch as one frame to the process's current segment:
+
+    audit/<start ms>-<pid>-<n>.audit   rotated after RISK_APP_AUDIT_SEGMENT_MB
+
+A segment starts with an 8-byte magic. Each frame is a header (record count,
+payload size, crc32) followed by a zlib-compressed columnar payload:
+- int64 timestamps
+- int32 device and manufacturer codes
+- the names as UTF-8 blobs with offsets
+- uint16 model version ids and uint8 levels
+
+Segments are only ever appended to. A crash can at worst leave a torn last
+frame, which the scanner detects by its checksum and reports. Scanning
+decodes whole frames with NumPy and only turns the selected rows' names
+into strings.
+
+    python audit_log.py stats
+    python audit_log.py query --since 2026-10-01 --level 1 --manufacturer "Medtronic" --output high.csv
+    python audit_log.py verify
+
+RISK_APP_AUDIT=0 turns recording off, and RISK_APP_AUDIT_DIR moves the log
+(audit/ by default). RISK_APP_AUDIT_FSYNC=1 fsyncs every frame.
+"""
+import argparse
+import atexit
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+
+import numpy as np
+
+AUDIT_ENABLED = os.environ.get("RISK_APP_AUDIT", "1") != "0"
+AUDIT_DIR = os.environ.get("RISK_APP_AUDIT_DIR", "audit")
+SEGMENT_BYTES = int(float(os.environ.get("RISK_APP_AUDIT_SEGMENT_MB", 64)) * (1 << 20))
+FLUSH_SECONDS = float(os.environ.get("RISK_APP_AUDIT_FLUSH_MS", 200)) / 1000
+FSYNC = os.environ.get("RISK_APP_AUDIT_FSYNC", "0") == "1"
+BATCH_SIZE = 4096
+MAX_PENDING = 1_000_000  # only reached while writes keep failing; the oldest records are dropped beyond it
+COMPRESSION_LEVEL = 1
+
+SEGMENT_MAGIC = b"RISKAUD1"
+SEGMENT_SUFFIX = ".audit"
+FRAME_MAGIC = b"AFRM"
+FRAME = struct.Struct("<4sHIII")  # magic, flags, records, stored payload bytes, crc32 of the stored payload
+FLAG_ZLIB = 1
+COLUMNS = ["timestamp", "device_name", "manufacturer_name", "device_code", "manufacturer_code", "risk_level",
+           "model_version"]
+
+logger = logging.getLogger(__name__)
+
+# One decoded frame; the name columns stay packed until rows are selected
+AuditBatch = namedtuple("AuditBatch", ["timestamps", "device_codes", "manuf_codes", "levels", "version_ids",
+                                       "versions", "device_names", "manuf_names"])
+
+
+class PackedNames:
+    """UTF-8 blob plus offsets; strings are only decoded for the rows asked for
+
+    Lone surrogates, which UTF-8 cannot encode, are written as "?" so the
+    blob stays valid UTF-8 (a query for such a name is encoded the same way).
+    """
+
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, names):
+        encoded = [str(name).encode("utf-8", "replace") for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def take(self, rows):
+        starts, stops = self.offsets[rows].tolist(), self.offsets[np.asarray(rows) + 1].tolist()
+        blob = self.blob
+        return [blob[a:b].decode("utf-8") for a, b in zip(starts, stops)]
+
+    def tolist(self):
+        return self.take(np.arange(len(self)))
+
+    def matches(self, rows, name):
+        """The rows whose string is exactly name (compared as bytes, after a length check)"""
+        target = name.encode("utf-8", "replace")
+        rows = np.asarray(rows)
+        rows = rows[(self.offsets[rows + 1] - self.offsets[rows]) == len(target)]
+        blob = self.blob
+        return rows[[blob[a:a + len(target)] == target for a in self.offsets[rows].tolist()]]
+
+
+def encode_frame(records, compress=True):
+    """Frame bytes for [(timestamp_ns, device_name, manuf_name, device_code, manuf_code, level, version), ...]"""
+    timestamps, device_names, manuf_names, device_codes, manuf_codes, levels, versions = zip(*records)
+    version_list = list(dict.fromkeys(versions))
+    version_ids = {version: i for i, version in enumerate(version_list)}
+    devices, manufacturers, version_names = (PackedNames.pack(device_names), PackedNames.pack(manuf_names),
+                                             PackedNames.pack(version_list))
+    payload = b"".join([
+        struct.pack("<I", len(version_list)),
+        np.array(timestamps, dtype=np.int64).tobytes(),
+        np.array(device_codes, dtype=np.int32).tobytes(),
+        np.array(manuf_codes, dtype=np.int32).tobytes(),
+        devices.offsets.tobytes(),
+        manufacturers.offsets.tobytes(),
+        version_names.offsets.tobytes(),
+        np.array([version_ids[v] for v in versions], dtype=np.uint16).tobytes(),
+        np.array(levels, dtype=np.uint8).tobytes(),
+        devices.blob, manufacturers.blob, version_names.blob,
+    ])
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, COMPRESSION_LEVEL)
+        flags |= FLAG_ZLIB
+    return FRAME.pack(FRAME_MAGIC, flags, len(records), len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_frame(flags, n, stored):
+    """AuditBatch for one frame's stored payload"""
+    payload = zlib.decompress(stored) if flags & FLAG_ZLIB else stored
+    (n_versions,) = struct.unpack_from("<I", payload)
+    pos = 4
+
+    def column(dtype, count):
+        nonlocal pos
+        array = np.frombuffer(payload, dtype=dtype, count=count, offset=pos)
+        pos += array.nbytes
+        return array
+
+    timestamps = column(np.int64, n)
+    device_codes, manuf_codes = column(np.int32, n), column(np.int32, n)
+    device_offsets, manuf_offsets = column(np.uint32, n + 1), column(np.uint32, n + 1)
+    version_offsets = column(np.uint32, n_versions + 1)
+    version_ids, levels = column(np.uint16, n), column(np.uint8, n)
+    blobs = []
+    for offsets in (device_offsets, manuf_offsets, version_offsets):
+        size = int(offsets[-1])
+        blobs.append(payload[pos:pos + size])
+        pos += size
+    versions = PackedNames(blobs[2], version_offsets).tolist()
+    return AuditBatch(timestamps, device_codes, manuf_codes, levels, version_ids, versions,
+                      PackedNames(blobs[0], device_offsets), PackedNames(blobs[1], manuf_offsets))
+
+
+class CorruptSegment(Exception):
+    pass
+
+
+def iter_frames(path):
+    """(flags, records, stored payload) for each intact frame of a segment
+
+    Raises CorruptSegment (after yielding every frame before it) at a torn or
+    damaged frame.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+        raise CorruptSegment(f"{path}: not an audit segment")
+    pos = len(SEGMENT_MAGIC)
+    while pos < len(data):
+        if pos + FRAME.size > len(data):
+            raise CorruptSegment(f"{path}: torn frame header at byte {pos}")
+        magic, flags, n, size, crc = FRAME.unpack_from(data, pos)
+        stored = data[pos + FRAME.size:pos + FRAME.size + size]
+        if magic != FRAME_MAGIC or len(stored) != size or zlib.crc32(stored) != crc:
+            raise CorruptSegment(f"{path}: damaged frame at byte {pos}")
+        yield flags, n, stored
+        pos += FRAME.size + size
+
+
+def segment_paths(directory=AUDIT_DIR):
+    """Segments in the order they were started"""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def scan(directory=AUDIT_DIR, since_ns=None, until_ns=None, errors=None):
+    """AuditBatch per frame with any record in [since_ns, until_ns)
+
+    Damaged frames end their segment's scan. Their messages are appended to
+    errors when a list is given and logged otherwise.
+    """
+    for path in segment_paths(directory):
+        try:
+            for flags, n, stored in iter_frames(path):
+                batch = decode_frame(flags, n, stored)
+                if since_ns is not None and batch.timestamps.max() < since_ns:
+                    continue
+                if until_ns is not None and batch.timestamps.min() >= until_ns:
+                    continue
+                yield batch
+        except CorruptSegment as e:
+            if errors is None:
+                logger.warning("%s", e)
+            else:
+                errors.append(str(e))
+
+
+def query(directory=AUDIT_DIR, since_ns=None, until_ns=None, levels=None, manufacturer=None, device_contains=None,
+          model_version=None, limit=None):
+    """DataFrame of the matching records (COLUMNS), oldest segment first"""
+    import pandas as pd
+
+    needle = device_contains.lower() if device_contains else None
+    parts = []
+    found = 0
+    for batch in scan(directory, since_ns, until_ns):
+        mask = np.ones(len(batch.timestamps), dtype=bool)
+        if since_ns is not None:
+            mask &= batch.timestamps >= since_ns
+        if until_ns is not None:
+            mask &= batch.timestamps < until_ns
+        if levels:
+            mask &= np.isin(batch.levels, list(levels))
+        if model_version is not None:
+            if model_version not in batch.versions:
+                continue
+            mask &= batch.version_ids == batch.versions.index(model_version)
+        rows = np.flatnonzero(mask)
+        if manufacturer is not None and len(rows):
+            rows = batch.manuf_names.matches(rows, manufacturer)
+        if needle is not None and len(rows):
+            rows = rows[[needle in name.lower() for name in batch.device_names.take(rows)]]
+        if limit is not None:
+            rows = rows[:limit - found]
+        if not len(rows):
+            continue
+        parts.append(pd.DataFrame({
+            "timestamp": pd.to_datetime(batch.timestamps[rows], unit="ns", utc=True),
+            "device_name": batch.device_names.take(rows),
+            "manufacturer_name": batch.manuf_names.take(rows),
+            "device_code": batch.device_codes[rows],
+            "manufacturer_code": batch.manuf_codes[rows],
+            "risk_level": batch.levels[rows],
+            "model_version": np.asarray(batch.versions, dtype=object)[batch.version_ids[rows]],
+        }))
+        found += len(rows)
+        if limit is not None and found >= limit:
+            break
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=COLUMNS)
+
+
+def summarize(directory=AUDIT_DIR, since_ns=None, until_ns=None):
+    """Record counts per risk level, model version and UTC day, without decoding any names"""
+    level_counts = np.zeros(256, dtype=np.int64)
+    by_version, by_day = {}, {}
+    records = frames = 0
+    first = last = None
+    errors = []
+    for batch in scan(directory, since_ns, until_ns, errors):
+        mask = np.ones(len(batch.timestamps), dtype=bool)
+        if since_ns is not None:
+            mask &= batch.timestamps >= since_ns
+        if until_ns is not None:
+            mask &= batch.timestamps < until_ns
+        timestamps = batch.timestamps[mask]
+        if not len(timestamps):
+            continue
+        frames += 1
+        records += len(timestamps)
+        first = timestamps.min() if first is None else min(first, timestamps.min())
+        last = timestamps.max() if last is None else max(last, timestamps.max())
+        level_counts += np.bincount(batch.levels[mask], minlength=256)
+        for version, count in zip(batch.versions, np.bincount(batch.version_ids[mask],
+                                                             minlength=len(batch.versions)).tolist()):
+            by_version[version] = by_version.get(version, 0) + count
+        days, counts = np.unique(timestamps // (86_400 * 10**9), return_counts=True)
+        for day, count in zip(days.tolist(), counts.tolist()):
+            by_day[day] = by_day.get(day, 0) + count
+    return {
+        "records": records,
+        "frames": frames,
+        "segments": len(segment_paths(directory)),
+        "first_ns": None if first is None else int(first),
+        "last_ns": None if last is None else int(last),
+        "levels": {level: int(count) for level, count in enumerate(level_counts.tolist()) if count},
+        "model_versions": by_version,
+        "days": {time.strftime("%Y-%m-%d", time.gmtime(day * 86_400)): count for day, count in sorted(by_day.items())},
+        "errors": errors,
+    }
+
+
+class AuditLog:
+    """Buffered, append-only writer of assessment records (one per process)"""
+
+    def __init__(self, directory=AUDIT_DIR, segment_bytes=SEGMENT_BYTES, flush_seconds=FLUSH_SECONDS,
+                 batch_size=BATCH_SIZE, fsync=FSYNC, enabled=AUDIT_ENABLED):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.enabled = enabled
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()  # serializes writes and the writer thread's start
+        self._thread = None
+        self._file = None
+        self._segment_size = 0
+        self._segment_seq = 0
+        self.records = self.frames = self.segments = self.bytes_written = self.dropped = 0
+        self.last_error = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def record(self, device_name, manufacturer_name, device_code, manuf_code, risk_level, model_version):
+        """Queue one assessment; the write happens on the background thread"""
+        if not self.enabled:
+            return
+        self._pending.append((time.time_ns(), device_name, manufacturer_name, device_code, manuf_code, risk_level,
+                              model_version))
+        if self._thread is None:
+            self._start()
+        elif len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:  # the writer must outlive any one bad flush
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.exception("Audit log flush failed")
+
+    def flush(self):
+        """Write every queued record now"""
+        with self._lock:
+            self._trim()
+            while self._pending:
+                batch = []
+                pop = self._pending.popleft
+                for _ in range(min(len(self._pending), self.batch_size)):
+                    batch.append(pop())
+                try:
+                    frame = encode_frame(batch)
+                except Exception as e:
+                    batch = self._encodable(batch, e)
+                    if not batch:
+                        continue
+                    frame = encode_frame(batch)
+                try:
+                    self._write(frame)
+                except OSError as e:
+                    # Keep the records for the next flush rather than lose them
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    logger.warning("Audit log write failed: %s", e)
+                    self._pending.extendleft(reversed(batch))
+                    self._trim()
+                    self._close_segment()
+                    return
+                self.records += len(batch)
+                self.frames += 1
+
+    def _trim(self):
+        while len(self._pending) > MAX_PENDING:
+            self._pending.popleft()
+            self.dropped += 1
+
+    def _encodable(self, batch, error):
+        """The records of a batch that encode on their own; the others are dropped (they would never encode)"""
+        self.last_error = f"{type(error).__name__}: {error}"
+        logger.warning("Audit log dropped unencodable records: %s", error)
+        kept = []
+        for record in batch:
+            try:
+                encode_frame([record])
+            except Exception:
+                self.dropped += 1
+            else:
+                kept.append(record)
+        return kept
+
+    def _write(self, frame):
+        if self._file is None or self._segment_size + len(frame) > self.segment_bytes:
+            self._open_segment()
+        self._file.write(frame)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._segment_size += len(frame)
+        self.bytes_written += len(frame)
+
+    def _open_segment(self):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_seq += 1
+        name = f"{time.time_ns() // 1_000_000:013d}-{os.getpid()}-{self._segment_seq:04d}{SEGMENT_SUFFIX}"
+        self._file = open(os.path.join(self.directory, name), "xb")
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_size = len(SEGMENT_MAGIC)
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def close(self):
+        """Write what is queued and close the current segment"""
+        self.flush()
+        with self._lock:
+            self._close_segment()
+
+    def _after_fork(self):
+        # The writer thread does not survive a fork; the child starts its own segments
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._segment_size = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "records": self.records,
+            "pending": len(self._pending),
+            "frames": self.frames,
+            "segments": self.segments,
+            "bytes_written": self.bytes_written,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+
+AUDIT_LOG = AuditLog()
+
+
+def _timestamp_ns(value):
+    """Nanoseconds since the epoch for an ISO date/time (UTC unless it has an offset)"""
+    import pandas as pd
+
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize("UTC")
+    return stamp.value
+
+
+def _format_ns(ns):
+    return "n/a" if ns is None else time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ns / 1e9)) + " UTC"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the assessment audit log")
+    parser.add_argument("--dir", default=AUDIT_DIR, help="audit log directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("query", "print or export matching records"),
+                            ("stats", "record counts per level, model version and day")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--since", help="ISO date/time (UTC unless an offset is given)")
+        command.add_argument("--until", help="ISO date/time, exclusive")
+    query_parser = commands.choices["query"]
+    query_parser.add_argument("--level", type=int, action="append", choices=[1, 2, 3],
+                              help="risk level (repeatable)")
+    query_parser.add_argument("--manufacturer", help="exact manufacturer name as entered")
+    query_parser.add_argument("--device-contains", help="case-insensitive substring of the device name")
+    query_parser.add_argument("--model-version")
+    query_parser.add_argument("--limit", type=int)
+    query_parser.add_argument("--output", help="write the records as CSV instead of printing them")
+    commands.add_parser("verify", help="check every frame's checksum")
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        bad = 0
+        for path in segment_paths(args.dir):
+            frames = records = 0
+            try:
+                for _, n, _ in iter_frames(path):
+                    frames += 1
+                    records += n
+                print(f"{path}: ok, {frames:,} frames, {records:,} records")
+            except CorruptSegment as e:
+                bad += 1
+                print(f"{e} (after {frames:,} intact frames, {records:,} records)")
+        if bad:
+            sys.exit(1)
+        return
+
+    since = _timestamp_ns(args.since) if args.since else None
+    until = _timestamp_ns(args.until) if args.until else None
+    started = time.perf_counter()
+    if args.command == "stats":
+        summary = summarize(args.dir, since, until)
+        print(f"{summary['records']:,} records in {summary['segments']} segment(s), "
+              f"{_format_ns(summary['first_ns'])} to {_format_ns(summary['last_ns'])}")
+        print("By risk level: " + ", ".join(f"{level}: {count:,}" for level, count in summary["levels"].items()))
+        for version, count in summary["model_versions"].items():
+            print(f"  model {version}: {count:,}")
+        for day, count in summary["days"].items():
+            print(f"  {day}: {count:,}")
+        for error in summary["errors"]:
+            print(f"warning: {error}", file=sys.stderr)
+    else:
+        records = query(args.dir, since, until, args.level, args.manufacturer, args.device_contains,
+                        args.model_version, args.limit)
+        if args.output:
+            records.to_csv(args.output, index=False)
+        else:
+            print(records.to_string(index=False))
+        print(f"{len(records):,} matching records", file=sys.stderr)
+    print(f"Scanned in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
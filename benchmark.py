@@ -0,0 +1,287 @@
+"""Offline benchmarks for the load, encode, predict and render paths
+
+Synthetic device/manufacturer pairs are drawn from the shipped encoders
+(with a share of unknown and whitespace-mangled names), so no dataset
+download is needed. Each benchmark is timed over several repeats and run
+once more under tracemalloc for its peak allocation. Results are written as
+JSON so two commits can be compared:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import compiled_model
+import encoder_store
+import lookup_table
+from data_cache import build_cache, load_cached_columns
+from encoder_store import load_encoder
+from prediction_cache import PREDICTION_CACHE
+from risk_engine import (MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, EncoderIndex, has_fast_path,
+                         load_artifacts, load_encoders, load_model, predict_pair, predict_risk_batch)
+from search_index import SearchIndex
+from vocabulary import load_vocabulary
+
+FORMAT_VERSION = 1
+DEFAULT_ROWS = 100_000
+DEFAULT_REPEATS = 5
+UNKNOWN_SHARE = 0.05
+REGRESSION_THRESHOLD = 1.5
+
+
+def synthetic_pairs(le_device, le_manuf, rows, seed=0):
+    """Random (device, manufacturer) name pairs from the encoders' classes, some unknown or re-spaced"""
+    rng = np.random.default_rng(seed)
+    devices = le_device.classes_[rng.integers(0, len(le_device), rows)].astype(object)
+    manufacturers = le_manuf.classes_[rng.integers(0, len(le_manuf), rows)].astype(object)
+    for names in (devices, manufacturers):
+        unknown = rng.random(rows) < UNKNOWN_SHARE
+        names[unknown] = [f"{name} (synthetic)" for name in names[unknown]]
+        spaced = rng.random(rows) < UNKNOWN_SHARE
+        names[spaced] = [f" {name}  " for name in names[spaced]]
+    return devices, manufacturers
+
+
+def write_synthetic_csv(path, devices, manufacturers):
+    import pandas as pd
+
+    pd.DataFrame({"name": devices, "name_manufacturer": manufacturers}).to_csv(path, index=False)
+
+
+def typed_queries(names, count, seed=0):
+    """What users type into the search boxes: prefixes of real names, some with a typo"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for name in rng.choice(np.asarray(names, dtype=object), count):
+        query = name[:int(rng.integers(2, max(3, len(name))))]
+        if len(query) > 3 and rng.random() < 0.3:
+            i = int(rng.integers(1, len(query) - 1))
+            query = query[:i] + query[i + 1] + query[i] + query[i + 2:]
+        queries.append(query)
+    return queries
+
+
+class BenchmarkRunner:
+    """Times callables over repeats and records their peak traced allocation"""
+
+    def __init__(self, repeats=DEFAULT_REPEATS, stream=sys.stdout):
+        self.repeats = repeats
+        self.stream = stream
+        self.results = {}
+
+    def run(self, name, fn, setup=None, repeats=None, ops=1):
+        """Time fn() after setup() on every repeat; ops is the number of operations one call performs"""
+        timings = []
+        for _ in range(repeats or self.repeats):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        median = statistics.median(timings)
+        self.results[name] = {
+            "repeats": len(timings),
+            "ops": ops,
+            "min_s": min(timings),
+            "median_s": median,
+            "mean_s": statistics.fmean(timings),
+            "max_s": max(timings),
+            "per_op_us": median / ops * 1e6,
+            "peak_alloc_kib": peak / 1024,
+        }
+        self.stream.write(f"{name:<32} median {_format_seconds(median):>10}  "
+                          f"per op {median / ops * 1e6:>10,.2f} us  peak {peak / 1024:>10,.0f} KiB\n")
+        return self.results[name]
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:,.2f} ms" if seconds < 1 else f"{seconds:,.2f} s"
+
+
+def _max_rss_kib():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform == "darwin" else rss
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(rows=DEFAULT_ROWS, repeats=DEFAULT_REPEATS, model_path=MODEL_PATH,
+                   device_encoder_path=DEVICE_ENCODER_PATH, manuf_encoder_path=MANUF_ENCODER_PATH,
+                   stream=sys.stdout):
+    runner = BenchmarkRunner(repeats, stream)
+    workdir = tempfile.mkdtemp(prefix="risk-bench-")
+    # Grids, lookup tables and compact encoders are read and written under workdir, not the apps' cache
+    cache_dirs = compiled_model.GRID_DIR, lookup_table.TABLE_DIR, encoder_store.ENCODER_DIR
+    compiled_model.GRID_DIR = os.path.join(workdir, "compiled")
+    lookup_table.TABLE_DIR = os.path.join(workdir, "lookup")
+    encoder_store.ENCODER_DIR = os.path.join(workdir, "encoders")
+    try:
+        # Model and encoders (load_model_and_encoders)
+        encoder_dir = encoder_store.ENCODER_DIR
+        runner.run("encoders.load_pickle", lambda: load_encoder(device_encoder_path, encoder_dir),
+                   setup=lambda: shutil.rmtree(encoder_dir, ignore_errors=True))
+        runner.run("encoders.load_compact", lambda: load_encoder(device_encoder_path, encoder_dir))
+        runner.run("encoders.index_build", lambda: EncoderIndex(load_encoder(device_encoder_path, encoder_dir)))
+        runner.run("model.load", lambda: load_model(model_path), setup=load_model.cache_clear)
+
+        def reset_artifacts():
+            load_artifacts.cache_clear()
+            load_encoders.cache_clear()
+            load_model.cache_clear()
+        # The grid is compiled once first, so every repeat times a start with a warm cache
+        load_artifacts(model_path, device_encoder_path, manuf_encoder_path)
+        runner.run("artifacts.load", lambda: load_artifacts(model_path, device_encoder_path, manuf_encoder_path),
+                   setup=reset_artifacts)
+        model, le_device, le_manuf = load_artifacts(model_path, device_encoder_path, manuf_encoder_path)
+
+        devices, manufacturers = synthetic_pairs(le_device, le_manuf, rows)
+        csv_path = os.path.join(workdir, "synthetic.csv")
+        write_synthetic_csv(csv_path, devices, manufacturers)
+
+        # Dataset (load_data)
+        data_dir = os.path.join(workdir, "data")
+        columns = ["name", "name_manufacturer"]
+        runner.run("data.build_cache", lambda: build_cache(csv_path, columns, data_dir),
+                   setup=lambda: shutil.rmtree(data_dir, ignore_errors=True), ops=rows)
+
+        def load_data():
+            cached = load_cached_columns(csv_path, columns, data_dir)
+            return cached.unique("name").tolist(), cached.unique("name_manufacturer").tolist()
+        runner.run("data.load_cached", load_data)
+
+        # Encoder lookups
+        sample = devices[:1000].tolist()
+        runner.run("encode.single", lambda: [le_device.code(name) for name in sample], ops=len(sample))
+        runner.run("encode.bulk", lambda: le_device.encode(devices), ops=rows)
+
+        # Predictions (predict_risk)
+        device_codes = le_device.encode(devices)
+        manuf_codes = le_manuf.encode(manufacturers)
+        pairs = list(zip(device_codes[:1000].tolist(), manuf_codes[:1000].tolist()))
+
+        def predict_each():
+            for device_code, manuf_code in pairs:
+                predict_pair(model, device_code, manuf_code)
+        runner.run("predict.single_miss", predict_each, setup=PREDICTION_CACHE.clear, ops=len(pairs))
+        runner.run("predict.single_hit", predict_each, ops=len(pairs))
+        runner.run("predict.bulk", lambda: predict_risk_batch(devices, manufacturers, model, le_device, le_manuf),
+                   ops=rows)
+        features = np.column_stack([device_codes, manuf_codes]).astype(np.float32)
+        runner.run("predict.xgboost_bulk", lambda: model.predict(features), ops=rows)
+        runner.run("predict.xgboost_single", lambda: [model.predict(features[i:i + 1]) for i in range(100)],
+                   ops=100)
+
+        # Search boxes and selectbox options (main)
+        vocab_dir = os.path.join(workdir, "vocab")
+        cached = load_cached_columns(csv_path, columns, data_dir)
+
+        def load_vocabularies():
+            return (load_vocabulary(cached, "name", le_device, vocab_dir),
+                    load_vocabulary(cached, "name_manufacturer", le_manuf, vocab_dir))
+        runner.run("render.vocabulary_build", load_vocabularies,
+                   setup=lambda: shutil.rmtree(vocab_dir, ignore_errors=True))
+        runner.run("render.vocabulary_load", load_vocabularies)
+        device_vocab, manuf_vocab = load_vocabularies()
+        runner.run("render.search_index_build", lambda: (SearchIndex(device_vocab.names),
+                                                         SearchIndex(manuf_vocab.names)))
+        device_index = SearchIndex(device_vocab.names)
+        queries = typed_queries(device_vocab.names, 200)
+        runner.run("render.selectbox_options", lambda: [[""] + device_index.search(q) for q in queries],
+                   ops=len(queries))
+    finally:
+        compiled_model.GRID_DIR, lookup_table.TABLE_DIR, encoder_store.ENCODER_DIR = cache_dirs
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "rows": rows,
+            "repeats": repeats,
+            "model_path": model_path,
+            "fast_path": has_fast_path(model),
+            "max_rss_kib": _max_rss_kib(),
+        },
+        "results": runner.results,
+    }
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD, stream=sys.stdout):
+    """Print median ratios against a baseline run; returns the names that regressed past threshold"""
+    regressions = []
+    stream.write(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:\n")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            stream.write(f"{name:<32} (new)\n")
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        stream.write(f"{name:<32} {ratio:>6.2f}x{flag}\n")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the load, encode, predict and render paths")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="synthetic pairs for bulk benchmarks")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--device-encoder", default=DEVICE_ENCODER_PATH)
+    parser.add_argument("--manuf-encoder", default=MANUF_ENCODER_PATH)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare medians against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="median ratio above which --compare exits non-zero")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.rows, args.repeats, args.model, args.device_encoder, args.manuf_encoder)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
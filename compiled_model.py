@@ -0,0 +1,163 @@
+"""Interval grid inference for the 2-feature XGBoost models
+
+With only two features, a tree's decision depends only on which interval
+between consecutive split thresholds each feature falls in. ``IntervalGrid``
+reads every split threshold from the booster's JSON dump and collapses the
+whole ensemble into a small grid of (device interval x manufacturer interval)
+cells. Each cell is filled by scoring one representative point with the
+booster itself, so grid outputs are bit-identical to
+``XGBClassifier.predict``/``predict_proba``. Serving is two ``searchsorted``
+calls and one index.
+
+Grids are cached on disk per model version. Set RISK_APP_COMPILED_MODEL=0 to
+serve every prediction through XGBoost instead.
+
+``CompiledModel`` wraps a grid in the predict/predict_proba interface, for
+processes that serve without loading the booster at all.
+"""
+import json
+import os
+
+import numpy as np
+
+from data_cache import CACHE_DIR
+
+COMPILED_ENABLED = os.environ.get("RISK_APP_COMPILED_MODEL", "1") != "0"
+GRID_DIR = os.path.join(CACHE_DIR, "compiled")
+FORMAT_VERSION = 1
+
+
+class FlatTrees:
+    """Split features and thresholds of every tree of a booster, as contiguous arrays"""
+
+    def __init__(self, booster):
+        raw = json.loads(booster.save_raw("json"))
+        learner = raw["learner"]
+        trees = learner["gradient_booster"]["model"]["trees"]
+        self.num_features = int(learner["learner_model_param"]["num_feature"])
+        self.is_leaf = np.concatenate([t["left_children"] for t in trees]) == -1
+        self.feature = np.concatenate([t["split_indices"] for t in trees]).astype(np.int32)
+        # For leaves split_conditions holds the leaf value, which thresholds() skips
+        self.threshold = np.concatenate([t["split_conditions"] for t in trees]).astype(np.float32)
+
+    def thresholds(self, feature):
+        """Sorted unique split thresholds used on one feature"""
+        mask = ~self.is_leaf & (self.feature == feature)
+        return np.unique(self.threshold[mask])
+
+
+class IntervalGrid:
+    """Risk levels and class probabilities for every (device, manufacturer) split interval"""
+
+    def __init__(self, device_thresholds, manuf_thresholds, levels, proba):
+        self.device_thresholds = np.asarray(device_thresholds, dtype=np.float32)
+        self.manuf_thresholds = np.asarray(manuf_thresholds, dtype=np.float32)
+        self.levels = np.asarray(levels, dtype=np.uint8)
+        self.proba = np.asarray(proba, dtype=np.float32)
+
+    @staticmethod
+    def _representatives(thresholds):
+        # Cell 0 is everything below the first threshold; cell k >= 1 starts at thresholds[k - 1]
+        return np.concatenate([[thresholds[0] - 1 if len(thresholds) else 0], thresholds]).astype(np.float32)
+
+    @classmethod
+    def compile(cls, model):
+        """Collapse a 2-feature model into its interval grid, scoring one point per cell"""
+        from risk_engine import RISK_LEVELS
+
+        flat = FlatTrees(model.get_booster())
+        if flat.num_features != 2:
+            raise ValueError(f"interval compilation needs a 2-feature model, got {flat.num_features}")
+        device_thresholds, manuf_thresholds = flat.thresholds(0), flat.thresholds(1)
+        device_points = cls._representatives(device_thresholds)
+        manuf_points = cls._representatives(manuf_thresholds)
+        X = np.empty((len(device_points) * len(manuf_points), 2), dtype=np.float32)
+        X[:, 0] = np.repeat(device_points, len(manuf_points))
+        X[:, 1] = np.tile(manuf_points, len(device_points))
+        proba = model.predict_proba(X)
+        shape = (len(device_points), len(manuf_points))
+        levels = RISK_LEVELS[np.argmax(proba, axis=1)].reshape(shape)
+        return cls(device_thresholds, manuf_thresholds, levels, proba.reshape(shape + (proba.shape[1],)))
+
+    def cells(self, device_codes, manuf_codes):
+        rows = np.searchsorted(self.device_thresholds, np.asarray(device_codes, dtype=np.float32), side="right")
+        cols = np.searchsorted(self.manuf_thresholds, np.asarray(manuf_codes, dtype=np.float32), side="right")
+        return rows, cols
+
+    def lookup(self, device_code, manuf_code):
+        """Risk level for one encoded pair"""
+        row = int(np.searchsorted(self.device_thresholds, np.float32(device_code), side="right"))
+        col = int(np.searchsorted(self.manuf_thresholds, np.float32(manuf_code), side="right"))
+        return int(self.levels[row, col])
+
+    def lookup_many(self, device_codes, manuf_codes):
+        """Risk levels for arrays of encoded pairs"""
+        return self.levels[self.cells(device_codes, manuf_codes)]
+
+    def proba_many(self, device_codes, manuf_codes):
+        """Class probabilities (same columns as predict_proba) for arrays of encoded pairs"""
+        return self.proba[self.cells(device_codes, manuf_codes)]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, format_version=FORMAT_VERSION, device_thresholds=self.device_thresholds,
+                 manuf_thresholds=self.manuf_thresholds, levels=self.levels, proba=self.proba)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"unsupported compiled grid format in {path}")
+            return cls(data["device_thresholds"], data["manuf_thresholds"], data["levels"], data["proba"])
+
+    _ARRAYS = ("device_thresholds", "manuf_thresholds", "levels", "proba")
+
+    def save_arrays(self, prefix):
+        """Write each array as its own .npy file, so it can be memory-mapped"""
+        for name in self._ARRAYS:
+            np.save(f"{prefix}.{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load_arrays(cls, prefix, mmap=True):
+        return cls(*(np.load(f"{prefix}.{name}.npy", mmap_mode="r" if mmap else None) for name in cls._ARRAYS))
+
+
+class CompiledModel:
+    """Booster-free stand-in for a compiled 2-feature XGBClassifier"""
+
+    n_features_in_ = 2
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return self.grid.proba_many(X[:, 0], X[:, 1])
+
+    def predict(self, X):
+        return np.argmax(self.predict_proba(X), axis=1)
+
+
+def grid_path(model_version, grid_dir=None):
+    return os.path.join(grid_dir or GRID_DIR, f"grid-{model_version}.npz")
+
+
+def load_or_compile(model, model_version, grid_dir=None):
+    """Cached interval grid for a model, or None if the model cannot be compiled"""
+    path = grid_path(model_version, grid_dir)
+    if os.path.exists(path):
+        try:
+            return IntervalGrid.load(path)
+        except (OSError, ValueError, KeyError):
+            pass
+    try:
+        grid = IntervalGrid.compile(model)
+    except ValueError:
+        return None
+    try:
+        grid.save(path)
+    except OSError:
+        pass  # a read-only cache directory only costs a recompile next start
+    return grid
@@ -1,8 +1,11 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import joblib
-from xgboost import XGBClassifier
+from risk_engine import freeze_loaded
+from model_registry import MODEL_SERVER
+from data_sources import sources_from_env
+from app_common import (assessment_panel, data_version, load_data, load_dataset_stats, load_label_encoders,
+                        load_search_indexes, risk_mix_rows, served_bundle_key)
+from admin_panel import (render_audit_log_stats, render_batching_stats, render_model_registry,
+                         render_prediction_cache_stats, render_stage_latencies, render_startup_timings)
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -58,74 +61,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """Load the dataset for autocomplete suggestions"""
-    try:
-        df = pd.read_csv("data csv/final_merged_dataset.csv", low_memory=False)
-        # Get unique device names and manufacturers
-        device_names = df['name'].dropna().unique().tolist()
-        manufacturers = df['name_manufacturer'].dropna().unique().tolist()
-        return device_names, manufacturers
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return [], []
-
-@st.cache_resource
-def load_model_and_encoders():
-    """Load the trained model and label encoders"""
-    try:
-        # Load the balanced 2-feature model (properly balanced predictions)
-        model = XGBClassifier()
-        model.load_model("xgbModel_balanced_2feat.model")
-        
-        # Load balanced label encoders
-        le_device = joblib.load("le_device_balanced.pkl")
-        le_manuf = joblib.load("le_manuf_balanced.pkl")
-        
-        return model, le_device, le_manuf
-    except Exception as e:
-        st.error(f"Error loading model: {e}")
-        return None, None, None
-
-def predict_risk(device_name, manufacturer_name, model, le_device, le_manuf):
-    """Predict risk level for given device and manufacturer"""
-    try:
-        # Encode inputs
-        if device_name in le_device.classes_:
-            device_code = le_device.transform([device_name])[0]
-        else:
-            device_code = -1  # Unknown device
-        
-        if manufacturer_name in le_manuf.classes_:
-            manuf_code = le_manuf.transform([manufacturer_name])[0]
-        else:
-            manuf_code = -1  # Unknown manufacturer
-        
-        # Create sample for prediction
-        sample = pd.DataFrame([[device_code, manuf_code]], 
-                            columns=['name', 'name_manufacturer'])
-        
-        # Predict
-        pred_encoded = model.predict(sample)[0]
-        
-        # Map back to original labels (0→1, 1→2, 2→3)
-        risk_mapping = {0: 1, 1: 2, 2: 3}
-        risk_level = risk_mapping[pred_encoded]
-        
-        return risk_level
-    except Exception as e:
-        st.error(f"Error in prediction: {e}")
-        return None
-
-def get_risk_display(risk_level):
-    """Get risk level display information"""
-    risk_info = {
-        1: {"label": "HIGH RISK", "color": "red", "icon": "🔴", "description": "High risk devices require immediate attention and careful monitoring."},
-        2: {"label": "MEDIUM RISK", "color": "orange", "icon": "🟡", "description": "Medium risk devices should be monitored regularly."},
-        3: {"label": "LOW RISK", "color": "green", "icon": "🟢", "description": "Low risk devices have minimal safety concerns."}
-    }
-    return risk_info.get(risk_level, {"label": "UNKNOWN", "color": "gray", "icon": "❓", "description": "Risk level could not be determined."})
+DATA_PATH = "data csv/final_merged_dataset.csv"
+DATA_SOURCES = tuple(sources_from_env([DATA_PATH]))
 
 def main():
     # Header
@@ -133,70 +70,32 @@ def main():
     
     # Load data and model
     with st.spinner("Loading data and model..."):
-        device_names, manufacturers = load_data()
-        model, le_device, le_manuf = load_model_and_encoders()
+        data_key = data_version(DATA_SOURCES)
+        device_names, manufacturers = load_data(DATA_SOURCES, data_key)
+        le_device, le_manuf = load_label_encoders()
+        device_index, manuf_index = load_search_indexes(DATA_SOURCES, data_key)
+        stats = load_dataset_stats(DATA_SOURCES, data_key)
     
-    if not device_names or not manufacturers or model is None:
+    if not device_names or not manufacturers or le_device is None or device_index is None:
         st.error("Failed to load required data or model. Please ensure all files are present.")
         return
+    # Keep what was just loaded out of the collection Streamlit runs after every rerun
+    freeze_loaded("startup")
     
     # Sidebar for input
     st.sidebar.header("📋 Device Information")
     st.sidebar.markdown("Enter the device details to assess risk level:")
     
-    # Device name input with autocomplete
-    device_name = st.sidebar.selectbox(
-        "Device Name",
-        options=[""] + sorted(device_names),
-        help="Select or type to search for a device name"
-    )
-    
-    # Manufacturer input with autocomplete
-    manufacturer_name = st.sidebar.selectbox(
-        "Manufacturer Name", 
-        options=[""] + sorted(manufacturers),
-        help="Select or type to search for a manufacturer"
-    )
-    
-    # Predict button
-    predict_button = st.sidebar.button("🔍 Assess Risk", type="primary", use_container_width=True)
-    
     # Main content area
     col1, col2 = st.columns([2, 1])
     
     with col1:
         st.header("🎯 Risk Assessment Results")
-        
-        if predict_button and device_name and manufacturer_name:
-            with st.spinner("Analyzing device risk..."):
-                risk_level = predict_risk(device_name, manufacturer_name, model, le_device, le_manuf)
-            
-            if risk_level:
-                risk_info = get_risk_display(risk_level)
-                
-                # Display risk result
-                st.markdown(f"""
-                <div class="risk-{risk_info['color']}">
-                    <h2>{risk_info['icon']} {risk_info['label']}</h2>
-                    <p><strong>Device:</strong> {device_name}</p>
-                    <p><strong>Manufacturer:</strong> {manufacturer_name}</p>
-                    <p><strong>Description:</strong> {risk_info['description']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Risk level indicator
-                st.markdown("### Risk Level Indicator")
-                risk_colors = {"red": "🔴", "orange": "🟡", "green": "🟢"}
-                risk_icons = {"red": "🔴", "orange": "🟡", "green": "🟢"}
-                
-                # Create a visual risk meter
-                risk_meter = st.progress(risk_level / 3)
-                st.caption(f"Risk Level: {risk_level}/3 ({risk_info['label']})")
-                
-        elif predict_button:
-            st.warning("⚠️ Please select both device name and manufacturer to assess risk.")
-        else:
-            st.info("👈 Please enter device information in the sidebar and click 'Assess Risk' to get started.")
+        # Filled by assessment_panel, which redraws only this slot on its own reruns
+        result_slot = st.empty()
+    
+    with st.sidebar:
+        assessment_panel(DATA_SOURCES, data_key, device_index, manuf_index, result_slot, "🔍 Assess Risk")
     
     with col2:
         st.header("📊 Dashboard Statistics")
@@ -209,18 +108,32 @@ def main():
             st.metric("Total Manufacturers", f"{len(manufacturers):,}")
         
         with col2_2:
-            st.metric("Model Accuracy", "90%")
-            st.metric("Data Points", "124,969")
+            st.metric("Model Accuracy", f"{stats.accuracy:.0%}" if stats and stats.accuracy is not None else "n/a")
+            st.metric("Data Points", f"{stats.n_rows:,}" if stats else "n/a")
+        if stats and not stats.has_labels:
+            st.caption("Accuracy unavailable (no label column)")
+        
+        if stats:
+            st.markdown("### Risk Mix by Manufacturer")
+            rows = risk_mix_rows(served_bundle_key(), stats.digest(), stats, manufacturers)
+            st.dataframe(rows, hide_index=True, use_container_width=True)
         
         # Sample devices for reference
         st.markdown("### 🔍 Sample Devices")
-        sample_devices = device_names[:10] if len(device_names) >= 10 else device_names
-        for device in sample_devices:
-            st.text(f"• {device}")
+        st.text("\n".join(f"• {device}" for device in device_names[:10]))
         
         if len(device_names) > 10:
             st.caption(f"... and {len(device_names) - 10} more devices")
     
+    # Cache and batching statistics
+    render_prediction_cache_stats()
+    deployment = MODEL_SERVER.loaded()
+    render_batching_stats(deployment.model if deployment else None)
+    render_model_registry(MODEL_SERVER.status())
+    render_startup_timings()
+    render_stage_latencies()
+    render_audit_log_stats()
+    
     # Footer
     st.markdown("---")
     st.markdown("""
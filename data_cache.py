@@ -0,0 +1,348 @@
+"""Local columnar cache for the merged recall dataset
+
+The CSV is parsed once and each cached column is stored dictionary-encoded:
+a string table of its unique values (first-seen order) plus one int32 code
+per row (-1 for missing). Later starts memory-map those files instead of
+downloading and parsing the CSV again, so they also work offline.
+
+Parsing streams the CSV in chunks of RISK_APP_INGEST_CHUNK_ROWS rows, reading
+only the cached columns. Each chunk's codes go straight to disk, so memory
+grows with the number of unique names rather than the number of rows.
+
+When a local CSV has only had rows appended since the cache was built (its
+old content is an unchanged prefix), just the new rows are parsed and added.
+
+Optional columns (the recorded risk class, RISK_APP_LABEL_COLUMN) are cached
+when the CSV has them and skipped otherwise.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from perf_metrics import stage_timer
+from string_table import StringTable, write_string_table
+
+CACHE_DIR = os.environ.get("RISK_APP_CACHE_DIR", ".cache")
+INGEST_CHUNK_ROWS = int(os.environ.get("RISK_APP_INGEST_CHUNK_ROWS", 200_000))
+DEFAULT_COLUMNS = ('name', 'name_manufacturer')
+LABEL_COLUMN = os.environ.get("RISK_APP_LABEL_COLUMN", "risk_class")
+OPTIONAL_COLUMNS = (LABEL_COLUMN,) if LABEL_COLUMN else ()
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+def is_url(source):
+    return str(source).startswith(("http://", "https://"))
+
+
+def file_checksum(path, block_size=1 << 20):
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path_for(source, cache_dir=CACHE_DIR):
+    """Cache directory for one data source"""
+    key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, "data", key)
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("format_version") == FORMAT_VERSION else None
+
+
+def _write_manifest(path, manifest):
+    tmp = os.path.join(path, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+
+def _download(url, dest):
+    with urllib.request.urlopen(url) as response, open(dest, "wb") as out:
+        shutil.copyfileobj(response, out)
+
+
+class _ColumnEncoder:
+    """Incremental dictionary encoding of one column, streaming its codes to a raw int32 file"""
+
+    def __init__(self, raw_path, known=()):
+        self.raw_path = raw_path
+        self.positions = {value: i for i, value in enumerate(known)}
+        self._out = open(raw_path, "wb")
+
+    def copy_codes(self, npy_path):
+        """Start with the codes already stored in a .npy file"""
+        with open(npy_path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                np.lib.format.read_array_header_1_0(f)
+            else:
+                np.lib.format.read_array_header_2_0(f)
+            shutil.copyfileobj(f, self._out)
+
+    def add(self, values):
+        import pandas as pd
+
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        # Chunk-local codes -> global first-seen codes, with -1 mapped to itself at the end
+        remap = np.empty(len(uniques) + 1, dtype=np.int32)
+        remap[-1] = -1
+        for i, value in enumerate(uniques):
+            remap[i] = self.positions.setdefault(str(value), len(self.positions))
+        self._out.write(remap[codes].astype("<i4", copy=False).tobytes())
+
+    @property
+    def uniques(self):
+        return list(self.positions)  # dicts keep insertion (first-seen) order
+
+    def close(self):
+        self._out.close()
+
+    def save(self, npy_path, n_rows):
+        """Wrap the raw codes in a .npy header without loading them"""
+        self.close()
+        with open(npy_path, "wb") as out, open(self.raw_path, "rb") as raw:
+            np.lib.format.write_array_header_1_0(
+                out, {"descr": "<i4", "fortran_order": False, "shape": (n_rows,)})
+            shutil.copyfileobj(raw, out)
+        os.remove(self.raw_path)
+
+
+def _csv_header(csv_path):
+    import pandas as pd
+
+    return pd.read_csv(csv_path, nrows=0).columns.tolist()
+
+
+def _encode_columns(csv_source, columns, out_dir, chunk_rows=INGEST_CHUNK_ROWS, encoders=None, n_rows=0,
+                    **read_options):
+    """Stream only the requested columns and dictionary-encode them into out_dir
+
+    ``encoders`` may already hold earlier rows' codes (appends); ``n_rows`` counts them.
+    Returns the total row count.
+    """
+    import pandas as pd
+
+    if encoders is None:
+        encoders = {column: _ColumnEncoder(os.path.join(out_dir, f"{column}.codes.raw")) for column in columns}
+    try:
+        for chunk in pd.read_csv(csv_source, usecols=list(columns), dtype=object, chunksize=chunk_rows,
+                                 **read_options):
+            for column, encoder in encoders.items():
+                encoder.add(chunk[column])
+            n_rows += len(chunk)
+    finally:
+        for encoder in encoders.values():
+            encoder.close()
+    for column, encoder in encoders.items():
+        encoder.save(os.path.join(out_dir, f"{column}.codes.npy"), n_rows)
+        write_string_table(os.path.join(out_dir, column), encoder.uniques)
+    return n_rows
+
+
+def build_cache(source, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR, optional_columns=OPTIONAL_COLUMNS,
+                csv_path=None, metadata=None):
+    """Convert the CSV at source (path or URL) into the columnar cache
+
+    ``csv_path`` parses an already downloaded copy of source instead, and
+    ``metadata`` is stored in the manifest (see data_sources).
+    """
+    path = cache_path_for(source, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Build into a scratch directory and swap it in, so readers never see a partial cache
+    staging = tempfile.mkdtemp(prefix=".building-", dir=os.path.dirname(path))
+    os.chmod(staging, 0o755)
+    try:
+        downloaded = csv_path is None and is_url(source)
+        if csv_path is not None:
+            stat = None if is_url(source) else _file_stat(source)
+        elif downloaded:
+            csv_path = os.path.join(staging, "source.csv")
+            with stage_timer("data.download"):
+                _download(source, csv_path)
+            stat = None
+        else:
+            csv_path = source
+            stat = _file_stat(source)
+        checksum = file_checksum(csv_path)
+        header = _csv_header(csv_path)
+        cached = list(columns) + [c for c in optional_columns if c in header and c not in columns]
+        with stage_timer("data.csv_parse"):
+            n_rows = _encode_columns(csv_path, cached, staging)
+        if downloaded:
+            os.remove(csv_path)
+        _write_manifest(staging, {
+            **(metadata or {}),
+            "format_version": FORMAT_VERSION,
+            "source": str(source),
+            "sha256": checksum,
+            "stat": stat,
+            "n_rows": n_rows,
+            "columns": cached,
+            "absent_columns": [c for c in optional_columns if c not in header],
+            "header": header,
+            "built_at": time.time(),
+        })
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return ColumnCache(path)
+
+
+def _covers(manifest, columns, optional_columns):
+    """Whether a cache holds every required column and knows about every optional one"""
+    cached = set(manifest["columns"])
+    return set(columns) <= cached and set(optional_columns) <= cached | set(manifest.get("absent_columns", ()))
+
+
+def _is_fresh(manifest, source, columns, optional_columns=OPTIONAL_COLUMNS):
+    """Whether a cached manifest still matches the source"""
+    if manifest is None or not _covers(manifest, columns, optional_columns):
+        return False
+    if is_url(source):
+        # Remote sources are fetched once; the cached copy is what lets us start offline
+        return True
+    if not os.path.exists(source):
+        return True
+    stat = _file_stat(source)
+    if stat == manifest.get("stat"):
+        return True
+    # Touched but possibly unchanged: only rebuild if the content differs
+    return stat["size"] == manifest["stat"]["size"] and file_checksum(source) == manifest["sha256"]
+
+
+def _appended_bytes(source, manifest, block_size=1 << 20):
+    """(offset, new sha256) if source only gained rows since the cache was built, else None"""
+    if is_url(source) or not manifest.get("stat") or "header" not in manifest or not os.path.exists(source):
+        return None
+    old_size = manifest["stat"]["size"]
+    if os.path.getsize(source) <= old_size:
+        return None
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        remaining = old_size
+        while remaining:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                return None
+            digest.update(block)
+            remaining -= len(block)
+            last = block[-1:]
+        if digest.hexdigest() != manifest["sha256"] or last != b"\n":
+            return None
+        # The old content is an unchanged prefix ending on a row boundary; finish the new checksum
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return old_size, digest.hexdigest()
+
+
+def append_to_cache(source, offset, checksum, cache_dir=CACHE_DIR):
+    """Parse only the rows after byte offset and add them to the existing cache"""
+    path = cache_path_for(source, cache_dir)
+    manifest = _read_manifest(path)
+    columns = manifest["columns"]
+    staging = tempfile.mkdtemp(prefix=".appending-", dir=os.path.dirname(path))
+    os.chmod(staging, 0o755)
+    try:
+        encoders = {}
+        for column in columns:
+            encoder = _ColumnEncoder(os.path.join(staging, f"{column}.codes.raw"),
+                                     known=StringTable(os.path.join(path, column)).tolist())
+            encoder.copy_codes(os.path.join(path, f"{column}.codes.npy"))
+            encoders[column] = encoder
+        with open(source, "rb") as f, stage_timer("data.csv_append"):
+            f.seek(offset)
+            n_rows = _encode_columns(f, columns, staging, encoders=encoders, n_rows=manifest["n_rows"],
+                                     header=None, names=manifest["header"])
+        # Anything else in the cache (e.g. statistics over earlier rows) is still valid for them
+        for name in os.listdir(path):
+            if name != MANIFEST and not os.path.exists(os.path.join(staging, name)):
+                shutil.copy2(os.path.join(path, name), staging)
+        _write_manifest(staging, dict(manifest, sha256=checksum, stat=_file_stat(source), n_rows=n_rows,
+                                      appends=manifest.get("appends", 0) + 1, appended_at=time.time()))
+        shutil.rmtree(path)
+        os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return ColumnCache(path)
+
+
+def load_cached_columns(source, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR, optional_columns=OPTIONAL_COLUMNS):
+    """Return a ColumnCache for source, building it on first use or when the source changed"""
+    path = cache_path_for(source, cache_dir)
+    manifest = _read_manifest(path)
+    if _is_fresh(manifest, source, columns, optional_columns):
+        if not is_url(source) and os.path.exists(source) and manifest.get("stat") != _file_stat(source):
+            manifest["stat"] = _file_stat(source)
+            _write_manifest(path, manifest)
+        return ColumnCache(path)
+    if manifest is not None and _covers(manifest, columns, optional_columns):
+        appended = _appended_bytes(source, manifest)
+        if appended is not None:
+            return append_to_cache(source, *appended, cache_dir=cache_dir)
+    return build_cache(source, columns, cache_dir, optional_columns)
+
+
+class ColumnCache:
+    """Memory-mapped, dictionary-encoded columns of a cached dataset"""
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = _read_manifest(path)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No data cache at {path}")
+
+    @property
+    def n_rows(self):
+        return self.manifest["n_rows"]
+
+    @property
+    def checksum(self):
+        return self.manifest["sha256"]
+
+    @property
+    def columns(self):
+        return self.manifest["columns"]
+
+    def has_column(self, column):
+        return column in self.manifest["columns"]
+
+    def covers(self, columns, optional_columns=OPTIONAL_COLUMNS):
+        return _covers(self.manifest, columns, optional_columns)
+
+    def update_manifest(self, **fields):
+        """Record extra fields (e.g. HTTP validators) in the manifest"""
+        self.manifest = dict(self.manifest, **fields)
+        _write_manifest(self.path, self.manifest)
+
+    def unique(self, column):
+        """Unique non-missing values of a column, in first-seen order"""
+        return StringTable(os.path.join(self.path, column))
+
+    def codes(self, column):
+        """Per-row codes into unique(column), -1 where the value is missing"""
+        return np.load(os.path.join(self.path, f"{column}.codes.npy"), mmap_mode="r")
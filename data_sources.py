@@ -0,0 +1,225 @@
+"""Where the apps get the recall dataset from
+
+A data source is a local CSV (LocalFileSource) or an http(s) URL
+(HttpSource). Either way the data is served from its columnar cache (see
+data_cache), and the network is kept off the startup path:
+
+* Sources are tried in order, and any one with a usable cached copy is
+  served at once, without a request.
+* An HTTP copy older than RISK_APP_DATA_REFRESH_SECONDS (an hour by
+  default) is revalidated in a background thread with a conditional GET
+  (If-None-Match / If-Modified-Since). A 304 only refreshes the timestamp,
+  and a changed file is downloaded and swapped in for the next load.
+* Only when no source has a cached copy is one fetched while the caller
+  waits. Downloads are retried with exponential backoff on connection
+  errors, timeouts, 429 and 5xx responses.
+
+RISK_APP_OFFLINE=1 never touches the network (for air-gapped installs). Set
+RISK_APP_DATA_SOURCES to a comma-separated list of paths/URLs to override an
+app's defaults.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from data_cache import (CACHE_DIR, DEFAULT_COLUMNS, OPTIONAL_COLUMNS, ColumnCache, build_cache, cache_path_for,
+                        file_checksum, is_url, load_cached_columns)
+from perf_metrics import stage_timer
+
+REFRESH_SECONDS = float(os.environ.get("RISK_APP_DATA_REFRESH_SECONDS", 3600))
+OFFLINE = os.environ.get("RISK_APP_OFFLINE", "0") == "1"
+RETRIES = int(os.environ.get("RISK_APP_DOWNLOAD_RETRIES", 3))
+TIMEOUT = 30
+BACKOFF = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class SourceUnavailable(Exception):
+    pass
+
+
+class LocalFileSource:
+    """A CSV on local disk, re-parsed only when it changes (appends are added incrementally)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f"LocalFileSource({self.path!r})"
+
+    def cached(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        """The cache for this file, or None when neither the file nor a cached copy exists"""
+        try:
+            return load_cached_columns(self.path, columns, cache_dir)
+        except FileNotFoundError:
+            return None
+
+    def load(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        cached = self.cached(columns, cache_dir)
+        if cached is None:
+            raise SourceUnavailable(f"{self.path} does not exist")
+        return cached
+
+    def refresh_async(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        pass  # local files are checked on every load
+
+
+class HttpSource:
+    """A CSV downloaded over HTTP, revalidated in the background with conditional GETs"""
+
+    _refreshing = set()
+    _lock = threading.Lock()
+
+    def __init__(self, url, retries=RETRIES, timeout=TIMEOUT, refresh_seconds=REFRESH_SECONDS, offline=OFFLINE,
+                 backoff=BACKOFF):
+        self.url = url
+        self.retries = retries
+        self.timeout = timeout
+        self.refresh_seconds = refresh_seconds
+        self.offline = offline
+        self.backoff = backoff
+
+    def __repr__(self):
+        return f"HttpSource({self.url!r})"
+
+    def _cache(self, columns, cache_dir):
+        try:
+            cached = ColumnCache(cache_path_for(self.url, cache_dir))
+        except FileNotFoundError:
+            return None
+        return cached if cached.covers(columns) else None
+
+    def _due(self, cached):
+        checked_at = (cached.manifest.get("http") or {}).get("checked_at") or cached.manifest.get("built_at", 0)
+        return time.time() - checked_at >= self.refresh_seconds
+
+    def cached(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        """The cached copy (no request), starting a background revalidation when it is due"""
+        cached = self._cache(columns, cache_dir)
+        if cached is not None and self._due(cached):
+            self.refresh_async(columns, cache_dir)
+        return cached
+
+    def load(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        cached = self.cached(columns, cache_dir)
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise SourceUnavailable(f"{self.url} is not cached and RISK_APP_OFFLINE=1")
+        return self.fetch(columns, cache_dir)
+
+    def _open(self, validators):
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return urllib.request.urlopen(urllib.request.Request(self.url, headers=headers), timeout=self.timeout)
+
+    def _with_retries(self, attempt_fn):
+        for attempt in range(self.retries + 1):
+            try:
+                return attempt_fn()
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    raise
+                if (e.code < 500 and e.code != 429) or attempt == self.retries:
+                    raise SourceUnavailable(f"{self.url}: HTTP {e.code}") from e
+            except OSError as e:  # URLError, timeouts, dropped connections
+                if attempt == self.retries:
+                    raise SourceUnavailable(f"{self.url}: {e}") from e
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        """Download (conditionally, when a copy is cached) and return the up-to-date cache"""
+        current = self._cache(columns, cache_dir)
+        validators = (current.manifest.get("http") or {}) if current is not None else {}
+        parent = os.path.dirname(cache_path_for(self.url, cache_dir))
+        os.makedirs(parent, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".download-", suffix=".csv", dir=parent)
+        os.close(fd)
+
+        def download():
+            with self._open(validators) as response, open(tmp, "wb") as out:
+                shutil.copyfileobj(response, out)
+                return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+        try:
+            try:
+                with stage_timer("data.download"):
+                    http = self._with_retries(download)
+            except urllib.error.HTTPError:  # 304 Not Modified
+                current.update_manifest(http=dict(validators, checked_at=time.time()))
+                return current
+            http["checked_at"] = time.time()
+            if current is not None and file_checksum(tmp) == current.checksum:
+                current.update_manifest(http=http)
+                return current
+            cached_columns = list(dict.fromkeys(list(columns) + (current.columns if current is not None else [])))
+            return build_cache(self.url, cached_columns, cache_dir, OPTIONAL_COLUMNS, csv_path=tmp,
+                               metadata={"http": http})
+        finally:
+            os.remove(tmp)
+
+    def refresh_async(self, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+        """Fetch in a background thread (one at a time per URL and cache)"""
+        if self.offline:
+            return
+        key = (self.url, os.path.abspath(cache_dir))
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.fetch(columns, cache_dir)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", self.url, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="data-refresh", daemon=True).start()
+
+
+def as_source(spec):
+    """A data source for a path or URL (sources pass through)"""
+    if hasattr(spec, "load"):
+        return spec
+    return HttpSource(spec) if is_url(spec) else LocalFileSource(spec)
+
+
+def sources_from_env(default):
+    """RISK_APP_DATA_SOURCES (comma-separated) if set, else default"""
+    configured = os.environ.get("RISK_APP_DATA_SOURCES")
+    if configured:
+        return [s.strip() for s in configured.split(",") if s.strip()]
+    return default
+
+
+def load_columns(sources, columns=DEFAULT_COLUMNS, cache_dir=CACHE_DIR):
+    """ColumnCache from the first source with a cached copy, fetching one only if none has"""
+    if isinstance(sources, (str, os.PathLike)) or hasattr(sources, "load"):
+        sources = [sources]
+    sources = [as_source(s) for s in sources]
+    for i, source in enumerate(sources):
+        cached = source.cached(columns, cache_dir)
+        if cached is not None:
+            # Preferred sources without a copy yet are fetched behind this one
+            for earlier in sources[:i]:
+                earlier.refresh_async(columns, cache_dir)
+            return cached
+    errors = []
+    for source in sources:
+        try:
+            return source.load(columns, cache_dir)
+        except SourceUnavailable as e:
+            errors.append(str(e))
+    raise SourceUnavailable("no data source is available: " + "; ".join(errors))
@@ -0,0 +1,185 @@
+"""Dashboard statistics computed from the cached dataset and the serving model
+
+One vectorized pass over the cached columns produces additive counts: rows,
+rows per risk level, how often the model agrees with the recorded class, and
+a manufacturer x risk level matrix. A row's risk level is its recorded class
+(RISK_APP_LABEL_COLUMN) when the dataset has a valid one, and the model's
+prediction otherwise. The label column is optional: without it (for example
+the synthetic benchmark and load-test datasets) every row counts its
+prediction, and has_labels tells the apps that no accuracy can be measured.
+
+The counts are computed with the model and encoders being served and saved
+inside the data cache directory, keyed by the content of that bundle's
+files, together with the number of rows they cover. Loading saved counts
+therefore needs no model; it is only loaded when there are rows to add. Appending rows to the dataset keeps that file
+(see data_cache.append_to_cache), so the next load only aggregates the new
+rows and adds them.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from data_cache import LABEL_COLUMN
+from risk_engine import RISK_LEVELS, as_index, predict_codes
+
+FORMAT_VERSION = 2
+CHUNK_ROWS = 1_000_000
+N_LEVELS = len(RISK_LEVELS) + 1  # counts are indexed by risk level, slot 0 stays empty
+
+
+class DatasetStats:
+    """Additive counts over the first n_rows rows of a cached dataset"""
+
+    def __init__(self, n_rows=0, risk_counts=None, n_labeled=0, n_agree=0, manufacturer_counts=None,
+                 has_labels=False):
+        self.n_rows = int(n_rows)
+        self.risk_counts = np.zeros(N_LEVELS, dtype=np.int64) if risk_counts is None else np.asarray(risk_counts)
+        self.n_labeled = int(n_labeled)
+        self.n_agree = int(n_agree)
+        self.manufacturer_counts = (np.zeros((0, N_LEVELS), dtype=np.int64) if manufacturer_counts is None
+                                    else np.asarray(manufacturer_counts))
+        self.has_labels = bool(has_labels)  # whether the dataset has the label column at all
+
+    @property
+    def accuracy(self):
+        """Share of rows with a recorded class where the model predicts that class, None without labels"""
+        return self.n_agree / self.n_labeled if self.n_labeled else None
+
+    def digest(self):
+        """Content hash of the counts, for caches of values derived from them"""
+        h = hashlib.sha1(f"{self.n_rows},{self.n_labeled},{self.n_agree},{self.has_labels}".encode("ascii"))
+        for counts in (self.risk_counts, self.manufacturer_counts):
+            h.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+        return h.hexdigest()[:16]
+
+    def risk_distribution(self):
+        """Share of rows at each risk level, keyed 1-3"""
+        total = self.risk_counts.sum()
+        return {int(level): float(self.risk_counts[level] / total) if total else 0.0 for level in RISK_LEVELS}
+
+    def top_manufacturers(self, names, limit=10):
+        """(name, rows, {level: share}) for the manufacturers with the most rows"""
+        totals = self.manufacturer_counts.sum(axis=1)
+        top = np.argsort(-totals, kind="stable")[:limit]
+        return [(names[i], int(totals[i]),
+                 {int(level): float(self.manufacturer_counts[i, level] / totals[i]) for level in RISK_LEVELS})
+                for i in top if totals[i]]
+
+    def add(self, other):
+        self.n_rows += other.n_rows
+        self.risk_counts = self.risk_counts + other.risk_counts
+        self.n_labeled += other.n_labeled
+        self.n_agree += other.n_agree
+        size = max(len(self.manufacturer_counts), len(other.manufacturer_counts))
+        merged = np.zeros((size, N_LEVELS), dtype=np.int64)
+        merged[:len(self.manufacturer_counts)] += self.manufacturer_counts
+        merged[:len(other.manufacturer_counts)] += other.manufacturer_counts
+        self.manufacturer_counts = merged
+        self.has_labels = self.has_labels or other.has_labels
+        return self
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, format_version=FORMAT_VERSION, n_rows=self.n_rows, risk_counts=self.risk_counts,
+                 n_labeled=self.n_labeled, n_agree=self.n_agree, manufacturer_counts=self.manufacturer_counts,
+                 has_labels=self.has_labels)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"unsupported statistics format in {path}")
+            return cls(data["n_rows"], data["risk_counts"], data["n_labeled"], data["n_agree"],
+                       data["manufacturer_counts"], bool(data["has_labels"]))
+
+
+def _parse_levels(values):
+    """Recorded classes as risk levels, 0 where a value is not one of them"""
+    levels = np.zeros(len(values) + 1, dtype=np.int64)  # the extra slot serves missing (-1) codes
+    for i, value in enumerate(values):
+        try:
+            level = int(float(value))
+        except (ValueError, OverflowError):
+            continue
+        if level in RISK_LEVELS:
+            levels[i] = level
+    return levels
+
+
+def _with_missing(codes):
+    """Append -1 so that indexing with a -1 code yields -1"""
+    return np.append(np.asarray(codes, dtype=np.int32), np.int32(-1))
+
+
+def aggregate(column_cache, model, le_device, le_manuf, start=0, stop=None, label_column=LABEL_COLUMN,
+              chunk_rows=CHUNK_ROWS):
+    """Counts over rows [start, stop) of a cached dataset, predictions only when it has no label_column"""
+    has_labels = bool(label_column) and column_cache.has_column(label_column)
+    stop = column_cache.n_rows if stop is None else stop
+    device_codes = column_cache.codes("name")
+    manuf_codes = column_cache.codes("name_manufacturer")
+    manufacturers = column_cache.unique("name_manufacturer").tolist()
+    # Dataset unique value -> encoder code, so rows are encoded with one gather
+    device_map = _with_missing(as_index(le_device).encode(column_cache.unique("name").tolist()))
+    manuf_map = _with_missing(as_index(le_manuf).encode(manufacturers))
+    if has_labels:
+        label_codes = column_cache.codes(label_column)
+        label_map = _parse_levels(column_cache.unique(label_column).tolist())
+
+    stats = DatasetStats(manufacturer_counts=np.zeros((len(manufacturers), N_LEVELS), dtype=np.int64),
+                         has_labels=has_labels)
+    for lo in range(start, stop, chunk_rows):
+        hi = min(lo + chunk_rows, stop)
+        dataset_manuf = np.asarray(manuf_codes[lo:hi])
+        predicted = predict_codes(model, device_map[np.asarray(device_codes[lo:hi])], manuf_map[dataset_manuf])
+        levels = predicted.astype(np.int64)
+        if has_labels:
+            labels = label_map[np.asarray(label_codes[lo:hi])]
+            labeled = labels > 0
+            stats.n_labeled += int(labeled.sum())
+            stats.n_agree += int((labels[labeled] == levels[labeled]).sum())
+            levels = np.where(labeled, labels, levels)
+        stats.risk_counts += np.bincount(levels, minlength=N_LEVELS)
+        known = dataset_manuf >= 0
+        stats.manufacturer_counts += np.bincount(dataset_manuf[known] * N_LEVELS + levels[known],
+                                                 minlength=len(manufacturers) * N_LEVELS
+                                                 ).reshape(len(manufacturers), N_LEVELS)
+        stats.n_rows += hi - lo
+    return stats
+
+
+def stats_path(column_cache, bundle_key, label_column=LABEL_COLUMN):
+    """Saved statistics of one model bundle"""
+    return os.path.join(column_cache.path, f"stats-{bundle_key}-{label_column or 'unlabeled'}.npz")
+
+
+def load_stats(column_cache, bundle_key, load_model, label_column=LABEL_COLUMN):
+    """Statistics for the whole cached dataset, aggregating only rows not covered by the saved file
+
+    bundle_key identifies the model and encoders being served (see
+    risk_engine.bundle_version), so the counts and accuracy describe the model
+    that answers the assessments. load_model returns that (model, le_device,
+    le_manuf) and is only called when there are rows to aggregate.
+    """
+    path = stats_path(column_cache, bundle_key, label_column)
+    stats = None
+    if os.path.exists(path):
+        try:
+            stats = DatasetStats.load(path)
+        except (OSError, ValueError, KeyError):
+            stats = None
+    if stats is not None and stats.n_rows > column_cache.n_rows:
+        stats = None  # saved for a different dataset; start over
+    if stats is None:
+        stats = DatasetStats()
+    if stats.n_rows < column_cache.n_rows:
+        model, le_device, le_manuf = load_model()
+        stats.add(aggregate(column_cache, model, le_device, le_manuf, start=stats.n_rows,
+                            label_column=label_column))
+        try:
+            stats.save(path)
+        except OSError:
+            pass  # a read-only cache only costs a rescan next start
+    return stats
@@ -0,0 +1,108 @@
+"""Pickle-free, memory-mappable copies of the label encoders
+
+Unpickling ``le_device_balanced.pkl`` imports scikit-learn and rebuilds a
+LabelEncoder around an object array, which dominates a cold start. The only
+state a fitted LabelEncoder has is its sorted ``classes_``, so the first load
+writes them to a string table under the cache directory (keyed on the
+pickle's content hash). Later starts read that table without joblib or
+sklearn.
+
+Convert the shipped encoders ahead of time and compare load times with:
+
+    python encoder_store.py le_device_balanced.pkl le_manuf_balanced.pkl
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from data_cache import CACHE_DIR, file_checksum
+from perf_metrics import stage_timer
+from string_table import StringTable, string_table_exists, write_string_table
+
+ENCODER_DIR = os.path.join(CACHE_DIR, "encoders")
+FORMAT_VERSION = 1
+
+
+class CompactLabelEncoder:
+    """The parts of a fitted LabelEncoder the apps use, backed by its classes_ alone"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    def transform(self, names):
+        names = np.asarray(names, dtype=object)
+        codes = np.searchsorted(self.classes_, names)
+        found = (codes < len(self.classes_)) & (self.classes_[np.minimum(codes, len(self.classes_) - 1)] == names)
+        if not found.all():
+            raise ValueError(f"y contains previously unseen labels: {names[~found].tolist()}")
+        return codes
+
+    def inverse_transform(self, codes):
+        codes = np.asarray(codes)
+        unseen = (codes < 0) | (codes >= len(self.classes_))
+        if unseen.any():
+            raise ValueError(f"y contains previously unseen labels: {codes[unseen].tolist()}")
+        return self.classes_[codes]
+
+
+def compact_prefix(pickle_path, encoder_dir=None):
+    """String table prefix for the compact copy of one pickled encoder"""
+    return os.path.join(encoder_dir or ENCODER_DIR, f"v{FORMAT_VERSION}-{file_checksum(pickle_path)[:16]}", "classes")
+
+
+def convert_encoder(pickle_path, encoder_dir=None):
+    """Unpickle an encoder and write its compact copy; returns the unpickled encoder"""
+    import joblib
+
+    with stage_timer("encoders.unpickle"):
+        encoder = joblib.load(pickle_path)
+    classes = encoder.classes_.tolist()
+    # Only string classes round-trip through a string table
+    if all(isinstance(name, str) for name in classes):
+        prefix = compact_prefix(pickle_path, encoder_dir)
+        staging = f"{os.path.dirname(prefix)}.tmp-{os.getpid()}"
+        try:
+            # Written aside and renamed into place, so readers never see half a table
+            write_string_table(os.path.join(staging, os.path.basename(prefix)), classes)
+            os.replace(staging, os.path.dirname(prefix))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)  # read-only cache: unpickle again next start
+    return encoder
+
+
+def load_encoder(pickle_path, encoder_dir=None):
+    """Load an encoder from its compact copy, falling back to (and converting) the pickle"""
+    prefix = compact_prefix(pickle_path, encoder_dir)
+    if string_table_exists(prefix):
+        with stage_timer("encoders.compact_load"):
+            return CompactLabelEncoder(StringTable(prefix).tolist())
+    return convert_encoder(pickle_path, encoder_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write compact copies of pickled label encoders")
+    parser.add_argument("pickles", nargs="+")
+    parser.add_argument("--encoder-dir", default=ENCODER_DIR)
+    args = parser.parse_args(argv)
+
+    for path in args.pickles:
+        started = time.perf_counter()
+        encoder = convert_encoder(path, args.encoder_dir)
+        pickle_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        compact = load_encoder(path, args.encoder_dir)
+        compact_seconds = time.perf_counter() - started
+        if not isinstance(compact, CompactLabelEncoder):
+            print(f"{path}: classes are not all strings, keeping the pickle")
+            continue
+        if compact.classes_.tolist() != encoder.classes_.tolist():
+            raise SystemExit(f"{path}: compact classes differ from the pickle")
+        print(f"{path}: {len(compact.classes_):,} classes, unpickle and convert {pickle_seconds * 1000:.0f} ms "
+              f"(incl. sklearn import), compact {compact_seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
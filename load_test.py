@@ -0,0 +1,518 @@
+"""Load test: how many concurrent dashboard users one app instance can take
+
+Virtual users repeat the interactions of the assessment panel: typing into
+the device/manufacturer search boxes ("search"), assessing a new pair
+("assess") or one they assessed before ("repeat"), in a configurable mix.
+Each user runs closed-loop (the next interaction starts when the previous
+one has finished, after an optional think time). Two drivers:
+
+* engine - threads in this process make the same calls as one fragment
+           rerun (search both boxes, encode, predict_pair_proba), with no
+           Streamlit in the way
+* server - a headless ``streamlit run`` subprocess driven over its
+           websocket, one session per user, rerunning only the fragment as
+           the browser does (needs the ``websockets`` package)
+
+AppTest is not offered as a driver: its sessions share one process-wide
+Streamlit runtime and cannot run concurrently.
+
+For each concurrency level it reports throughput, latency percentiles per
+interaction and overall, and the RSS of the serving process at the start,
+its peak and its growth. Everything runs offline against the shipped model
+files. Without the bundled dataset, a synthetic one is generated from the
+encoders under the cache directory. Assessments are audited as in the app,
+but to a separate log under the same directory.
+
+    python load_test.py --driver engine --users 1 8 32 64
+    python load_test.py --driver server --users 4 16 --duration 20 --mix search=1,assess=1
+    python load_test.py --driver server --users 8 16 32 --p95-target-ms 250 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from audit_log import AuditLog
+from benchmark import synthetic_pairs, typed_queries, write_synthetic_csv
+from data_cache import CACHE_DIR
+
+FORMAT_VERSION = 1
+OPS = ("search", "assess", "repeat")
+DEFAULT_MIX = "search=2,assess=1,repeat=1"
+DEFAULT_USERS = (1, 4, 16)
+DEFAULT_DURATION = 10.0
+PERCENTILES = (50, 90, 95, 99)
+BUNDLED_DATA = "data csv/final_merged_dataset.csv"
+SYNTHETIC_DATA = os.path.join(CACHE_DIR, "load_test", "synthetic_dataset.csv")
+SYNTHETIC_ROWS = 50_000
+# Assessments made by virtual users are audited here, not in the real audit log
+AUDIT_DIR = os.path.join(CACHE_DIR, "load_test", "audit")
+RSS_INTERVAL = 0.2
+DEVICE_LABEL = "Device Name"
+MANUF_LABEL = "Manufacturer Name"
+
+# One interaction: the text in both search boxes and whether the assess button is clicked
+Interaction = namedtuple("Interaction", ["op", "device_query", "manuf_query", "click"])
+
+
+def parse_mix(spec):
+    """{op: weight} from "search=2,assess=1,repeat=1" (weights are normalized)"""
+    mix = {}
+    for part in spec.split(","):
+        op, sep, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPS or not sep:
+            raise ValueError(f"bad mix entry {part!r}: use op=weight with op in {', '.join(OPS)}")
+        mix[op] = float(weight)
+    total = sum(mix.values())
+    if total <= 0 or any(w < 0 for w in mix.values()):
+        raise ValueError(f"mix {spec!r} needs non-negative weights with a positive sum")
+    return {op: w / total for op, w in mix.items()}
+
+
+class UserScript:
+    """Endless stream of interactions for one virtual user"""
+
+    def __init__(self, device_names, manuf_names, mix, seed):
+        self.rng = np.random.default_rng(seed)
+        self.device_names = device_names
+        self.manuf_names = manuf_names
+        self.ops = list(mix)
+        self.weights = list(mix.values())
+        self.assessed = []
+        self.device_query = self.manuf_query = ""
+
+    def _pair(self):
+        return (self.device_names[self.rng.integers(len(self.device_names))],
+                self.manuf_names[self.rng.integers(len(self.manuf_names))])
+
+    def next(self):
+        op = self.ops[self.rng.choice(len(self.ops), p=self.weights)]
+        if op == "repeat" and not self.assessed:
+            op = "assess"
+        if op == "search":
+            # Type part of a name into one of the boxes; the other keeps its text
+            device = self.rng.random() < 0.5
+            names = self.device_names if device else self.manuf_names
+            name = names[self.rng.integers(len(names))]
+            query = typed_queries([name], 1, seed=int(self.rng.integers(1 << 31)))[0]
+            if device:
+                self.device_query = query
+            else:
+                self.manuf_query = query
+            return Interaction(op, self.device_query, self.manuf_query, False)
+        if op == "repeat":
+            self.device_query, self.manuf_query = self.assessed[self.rng.integers(len(self.assessed))]
+        else:
+            self.device_query, self.manuf_query = self._pair()
+            self.assessed.append((self.device_query, self.manuf_query))
+        return Interaction(op, self.device_query, self.manuf_query, True)
+
+
+def rss_kib(pid="self"):
+    """Resident set size of a process in KiB (None where /proc is not available)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class RssSampler:
+    """Peak RSS of a process, sampled in a background thread"""
+
+    def __init__(self, pid="self", interval=RSS_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.start = self.peak = rss_kib(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = rss_kib(self.pid)
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return rss
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self._sample()
+
+
+def summarize(samples, seconds):
+    """Throughput and latency percentiles (ms) for [(op, latency_s, ok), ...]"""
+    def stats(latencies):
+        if not latencies:
+            return {"count": 0}
+        ms = np.asarray(latencies) * 1000
+        result = {"count": len(ms), "mean_ms": float(ms.mean()), "max_ms": float(ms.max())}
+        result.update({f"p{p}_ms": float(v) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))})
+        return result
+
+    summary = {"seconds": seconds, "interactions": len(samples),
+               "errors": sum(1 for _, _, ok in samples if not ok),
+               "throughput_per_s": len(samples) / seconds if seconds else 0.0,
+               "overall": stats([latency for _, latency, _ in samples])}
+    summary["ops"] = {op: stats([latency for o, latency, _ in samples if o == op]) for op in OPS}
+    return summary
+
+
+def dataset_path(data=None):
+    """The dataset the app instance serves: --data, the bundled CSV, or a synthetic one"""
+    if data:
+        return data
+    if os.path.exists(BUNDLED_DATA):
+        return BUNDLED_DATA
+    if not os.path.exists(SYNTHETIC_DATA):
+        from risk_engine import load_encoders
+
+        le_device, le_manuf = load_encoders()
+        os.makedirs(os.path.dirname(SYNTHETIC_DATA), exist_ok=True)
+        write_synthetic_csv(SYNTHETIC_DATA, *synthetic_pairs(le_device, le_manuf, SYNTHETIC_ROWS))
+    return SYNTHETIC_DATA
+
+
+def user_vocabulary(data):
+    """Device and manufacturer names users pick from: the names the app searches"""
+    from data_sources import load_columns
+
+    columns = load_columns(data, ['name', 'name_manufacturer'])
+    return columns.unique('name').tolist(), columns.unique('name_manufacturer').tolist()
+
+
+class EngineDriver:
+    """Each user is a thread making the calls of one assessment panel rerun"""
+
+    pid = "self"
+
+    def __init__(self, data, app=None):
+        from data_sources import load_columns
+        from model_registry import MODEL_SERVER
+        from search_index import SearchIndex
+        from vocabulary import load_vocabulary
+
+        columns = load_columns(data, ['name', 'name_manufacturer'])
+        deployment = MODEL_SERVER.current()
+        # Display names resolve through these vocabularies, as in the apps' predict_risk
+        self.device_vocab = load_vocabulary(columns, 'name', deployment.le_device)
+        self.manuf_vocab = load_vocabulary(columns, 'name_manufacturer', deployment.le_manuf)
+        self.device_index = SearchIndex(self.device_vocab.names)
+        self.manuf_index = SearchIndex(self.manuf_vocab.names)
+        self.server = MODEL_SERVER
+        self.audit_log = AuditLog(AUDIT_DIR)
+
+    def open_session(self):
+        return None
+
+    def interact(self, session, interaction):
+        from risk_engine import model_version, predict_pair_proba
+
+        device_matches = self.device_index.search(interaction.device_query)
+        manuf_matches = self.manuf_index.search(interaction.manuf_query)
+        if not (interaction.click and interaction.device_query.strip() and device_matches
+                and interaction.manuf_query.strip() and manuf_matches):
+            return True  # no assessment (or the app's "select both" warning)
+        deployment = self.server.current()
+        device_code = self.device_vocab.code(device_matches[0])
+        manuf_code = self.manuf_vocab.code(manuf_matches[0])
+        prediction = predict_pair_proba(deployment.model, device_code, manuf_code)
+        self.audit_log.record(device_matches[0], manuf_matches[0], device_code, manuf_code, prediction.risk_level,
+                              model_version(deployment.model))
+        return prediction is not None
+
+    def run_level(self, scripts, duration, think):
+        samples = []
+        lock = threading.Lock()
+        ready = threading.Barrier(len(scripts) + 1)
+        deadline = float("inf")  # set once every user is warm
+
+        def user(script):
+            session = self.open_session()
+            self.interact(session, script.next())  # warm-up, not counted
+            ready.wait()
+            local = []
+            while time.perf_counter() < deadline:
+                interaction = script.next()
+                started = time.perf_counter()
+                try:
+                    ok = self.interact(session, interaction)
+                except Exception:
+                    ok = False
+                local.append((interaction.op, time.perf_counter() - started, ok))
+                if think:
+                    time.sleep(think)
+            with lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=user, args=(script,), daemon=True) for script in scripts]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        sampler = RssSampler(self.pid)
+        started = time.perf_counter()
+        deadline = started + duration
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started, sampler
+
+    def close(self):
+        self.audit_log.close()
+
+
+class ServerDriver:
+    """A headless Streamlit server subprocess, one websocket session per user"""
+
+    def __init__(self, data, app, port=None):
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            raise RuntimeError("the server driver needs the websockets package (pip install websockets)")
+        self.port = port or _free_port()
+        env = dict(os.environ, RISK_APP_DATA_SOURCES=data, RISK_APP_OFFLINE="1", RISK_APP_AUDIT_DIR=AUDIT_DIR)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", app, "--server.port", str(self.port),
+             "--server.headless", "true", "--browser.gatherUsageStats", "false",
+             "--server.fileWatcherType", "none"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.pid = self.proc.pid
+        self._wait_healthy()
+
+    def _wait_healthy(self, timeout=60):
+        import urllib.request
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"streamlit exited with code {self.proc.returncode}")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1)
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"streamlit did not become healthy on port {self.port}")
+
+    def run_level(self, scripts, duration, think):
+        return asyncio.run(self._run_level(scripts, duration, think))
+
+    async def _run_level(self, scripts, duration, think):
+        sessions = [_ServerSession(self.port) for _ in scripts]
+        try:
+            await asyncio.gather(*(session.open() for session in sessions))
+            # Warm-up: one assessment per session (the first one loads the model)
+            await asyncio.gather(*(session.interact(Interaction("assess", *script._pair(), True))
+                                   for session, script in zip(sessions, scripts)))
+            sampler = RssSampler(self.pid)
+            started = time.perf_counter()
+            deadline = started + duration
+            per_user = await asyncio.gather(*(self._user(session, script, deadline, think)
+                                              for session, script in zip(sessions, scripts)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+        return [sample for samples in per_user for sample in samples], elapsed, sampler
+
+    @staticmethod
+    async def _user(session, script, deadline, think):
+        samples = []
+        while time.perf_counter() < deadline:
+            interaction = script.next()
+            started = time.perf_counter()
+            try:
+                ok = await session.interact(interaction)
+            except Exception:
+                ok = False
+            samples.append((interaction.op, time.perf_counter() - started, ok))
+            if think:
+                await asyncio.sleep(think)
+        return samples
+
+    def close(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class _ServerSession:
+    """One browser tab: a websocket session sending rerun requests with widget states"""
+
+    def __init__(self, port):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.widgets = {}  # label -> (widget id, fragment id)
+        self.button = None
+
+    async def open(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        await self._rerun([])  # the initial page load
+        missing = {DEVICE_LABEL, MANUF_LABEL} - set(self.widgets)
+        if missing or self.button is None:
+            raise RuntimeError(f"app page has no {', '.join(sorted(missing)) or 'button'} widget")
+
+    async def _rerun(self, states, fragment_id=""):
+        """Send one rerun and wait for it to finish; False if the script raised"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.fragment_id = fragment_id
+        for widget_id, value in states:
+            widget = msg.rerun_script.widget_states.widgets.add()
+            widget.id = widget_id
+            if isinstance(value, bool):
+                widget.trigger_value = value
+            else:
+                widget.string_value = value
+        await self.ws.send(msg.SerializeToString())
+        ok = True
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                return ok
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "text_input":
+                    self.widgets[element.text_input.label] = (element.text_input.id, forward.delta.fragment_id)
+                elif element_type == "button" and self.button is None:
+                    self.button = (element.button.id, forward.delta.fragment_id)
+                elif element_type == "exception":
+                    ok = False
+
+    async def interact(self, interaction):
+        device_id, fragment_id = self.widgets[DEVICE_LABEL]
+        states = [(device_id, interaction.device_query),
+                  (self.widgets[MANUF_LABEL][0], interaction.manuf_query),
+                  (self.button[0], interaction.click)]
+        return await self._rerun(states, fragment_id)
+
+    async def close(self):
+        await self.ws.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+DRIVERS = {"engine": EngineDriver, "server": ServerDriver}
+
+
+def run_load_test(driver_name="engine", users=DEFAULT_USERS, duration=DEFAULT_DURATION, mix=DEFAULT_MIX,
+                  think_ms=0.0, app="streamlit_app.py", data=None, seed=0, stream=sys.stdout):
+    mix = parse_mix(mix) if isinstance(mix, str) else mix
+    data = dataset_path(data)
+    device_names, manuf_names = user_vocabulary(data)
+    driver = DRIVERS[driver_name](data, app)
+    levels = []
+    try:
+        baseline_rss = rss_kib(driver.pid)
+        for n_users in users:
+            scripts = [UserScript(device_names, manuf_names, mix, seed=(seed, n_users, i)) for i in range(n_users)]
+            samples, elapsed, sampler = driver.run_level(scripts, duration, think_ms / 1000)
+            end_rss = sampler.stop()
+            level = dict(summarize(samples, elapsed), users=n_users,
+                         rss_kib={"baseline": baseline_rss, "start": sampler.start, "peak": sampler.peak,
+                                  "end": end_rss})
+            levels.append(level)
+            print_level(level, stream)
+    finally:
+        driver.close()
+    return {
+        "format_version": FORMAT_VERSION,
+        "meta": {"driver": driver_name, "app": app, "data": data, "duration_s": duration, "mix": mix,
+                 "think_ms": think_ms, "created_at": time.time(), "python": platform.python_version(),
+                 "platform": platform.platform()},
+        "levels": levels,
+    }
+
+
+def _mib(kib):
+    return f"{kib / 1024:,.0f} MiB" if kib is not None else "n/a"
+
+
+def print_level(level, stream=sys.stdout):
+    overall = level["overall"]
+    rss = level["rss_kib"]
+    growth = (f"{(rss['end'] - rss['start']) / 1024:+,.1f} MiB" if rss["end"] is not None
+              and rss["start"] is not None else "n/a")
+    stream.write(f"\n{level['users']} user(s): {level['interactions']:,} interactions in {level['seconds']:.1f}s, "
+                 f"{level['throughput_per_s']:,.1f}/s, {level['errors']} error(s)\n")
+    stream.write(f"  RSS start {_mib(rss['start'])}, peak {_mib(rss['peak'])}, end {_mib(rss['end'])} "
+                 f"(growth {growth})\n")
+    for name, stats in [("overall", overall)] + list(level["ops"].items()):
+        if not stats["count"]:
+            continue
+        stream.write(f"  {name:<8} n={stats['count']:<7,} "
+                     + "  ".join(f"p{p} {stats[f'p{p}_ms']:8.2f} ms" for p in PERCENTILES)
+                     + f"  max {stats['max_ms']:8.2f} ms\n")
+
+
+def capacity(levels, p95_target_ms):
+    """Largest user count whose overall p95 stays within the target (None if none does)"""
+    passing = [level["users"] for level in levels
+               if level["overall"]["count"] and level["overall"]["p95_ms"] <= p95_target_ms]
+    return max(passing) if passing else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent virtual users")
+    parser.add_argument("--driver", choices=sorted(DRIVERS), default="engine")
+    parser.add_argument("--users", type=int, nargs="+", default=list(DEFAULT_USERS),
+                        help="concurrency levels to run, one after the other")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"interaction weights over {', '.join(OPS)}")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's interactions")
+    parser.add_argument("--app", default="streamlit_app.py", help="app script for the server driver")
+    parser.add_argument("--data", help=f"dataset CSV (default: {BUNDLED_DATA}, else a synthetic one)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--p95-target-ms", type=float, help="report the largest level within this p95; "
+                                                            "exit non-zero if none is")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        results = run_load_test(args.driver, args.users, args.duration, mix, args.think_ms, args.app, args.data,
+                                args.seed)
+    except (RuntimeError, ValueError) as e:
+        parser.exit(1, f"error: {e}\n")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.p95_target_ms is not None:
+        users = capacity(results["levels"], args.p95_target_ms)
+        if users is None:
+            print(f"\nNo level kept p95 within {args.p95_target_ms:g} ms")
+            sys.exit(1)
+        print(f"\nCapacity: {users} concurrent user(s) with p95 within {args.p95_target_ms:g} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Precomputed risk levels for every known device x manufacturer code pair
+
+The model only ever sees two integer codes, so the whole input space can be
+scored offline. The table is a uint8 matrix of risk levels (1-3) indexed by
+``[device_code + 1, manuf_code + 1]``, where row/column 0 hold the unknown (-1)
+code. At serve time it is memory-mapped and a prediction is one array index.
+
+Build it with:
+
+    python lookup_table.py build --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from data_cache import CACHE_DIR
+
+TABLE_DIR = os.path.join(CACHE_DIR, "lookup")
+DEFAULT_CHUNK_ROWS = 64
+
+
+def table_path(model_version, device_digest, manuf_digest, table_dir=None):
+    """Where the table for one model + encoder combination lives"""
+    name = f"risk_table-{model_version}-{device_digest[:8]}-{manuf_digest[:8]}.npy"
+    return os.path.join(table_dir or TABLE_DIR, name)
+
+
+class RiskLookupTable:
+    """Memory-mapped risk level matrix"""
+
+    def __init__(self, path):
+        self.path = path
+        self.table = np.load(path, mmap_mode="r")
+        with open(path + ".json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+    @property
+    def shape(self):
+        return self.table.shape
+
+    def lookup(self, device_code, manuf_code):
+        """Risk level for one encoded pair"""
+        return int(self.table[device_code + 1, manuf_code + 1])
+
+    def lookup_many(self, device_codes, manuf_codes):
+        """Risk levels for arrays of encoded pairs"""
+        rows = np.asarray(device_codes, dtype=np.intp) + 1
+        cols = np.asarray(manuf_codes, dtype=np.intp) + 1
+        return self.table[rows, cols]
+
+
+def find_table(model_version, device_digest, manuf_digest, table_dir=None):
+    """Load the table for this model/encoder combination if it has been built"""
+    path = table_path(model_version, device_digest, manuf_digest, table_dir)
+    if os.path.exists(path) and os.path.exists(path + ".json"):
+        return RiskLookupTable(path)
+    return None
+
+
+# Worker state for parallel builds (one model per process)
+_worker = {}
+
+
+def _init_worker(model_path, output_path):
+    from xgboost import XGBClassifier
+
+    model = XGBClassifier()
+    model.load_model(model_path)
+    _worker["model"] = model
+    _worker["table"] = np.load(output_path, mmap_mode="r+")
+
+
+def _score_rows(bounds):
+    """Score every manufacturer code for device rows [start, stop) into the shared table"""
+    from risk_engine import predict_codes
+
+    start, stop = bounds
+    table = _worker["table"]
+    n_manuf = table.shape[1]
+    device_codes = np.repeat(np.arange(start, stop, dtype=np.int32) - 1, n_manuf)
+    manuf_codes = np.tile(np.arange(n_manuf, dtype=np.int32) - 1, stop - start)
+    table[start:stop] = predict_codes(_worker["model"], device_codes, manuf_codes,
+                                      chunk_size=len(device_codes)).reshape(stop - start, n_manuf)
+    table.flush()
+    return stop - start
+
+
+def _report(done, total, started, stream):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    eta = (total - done) / rate if rate else float("inf")
+    stream.write(f"\r  {done:,}/{total:,} device rows ({done / total:.1%}) "
+                 f"{rate:,.1f} rows/s, ETA {eta:,.0f}s ")
+    stream.flush()
+
+
+def build_table(model_path, device_encoder_path, manuf_encoder_path, output=None, workers=1,
+                chunk_rows=DEFAULT_CHUNK_ROWS, table_dir=None, progress=sys.stderr):
+    """Score the full code cross product and write the memory-mappable table"""
+    from risk_engine import load_artifacts, model_version
+
+    model, le_device, le_manuf = load_artifacts(model_path, device_encoder_path, manuf_encoder_path)
+    version = model_version(model)
+    output = output or table_path(version, le_device.digest, le_manuf.digest, table_dir)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    shape = (len(le_device) + 1, len(le_manuf) + 1)
+    partial = output + ".partial.npy"
+    np.lib.format.open_memmap(partial, mode="w+", dtype=np.uint8, shape=shape).flush()
+
+    chunks = [(start, min(start + chunk_rows, shape[0])) for start in range(0, shape[0], chunk_rows)]
+    started = time.perf_counter()
+    done = 0
+    if progress:
+        progress.write(f"Scoring {shape[0] * shape[1]:,} pairs ({shape[0]:,} x {shape[1]:,}) "
+                       f"with {workers} worker(s)\n")
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_path, partial)) as pool:
+            for rows in pool.imap_unordered(_score_rows, chunks):
+                done += rows
+                if progress:
+                    _report(done, shape[0], started, progress)
+    else:
+        _init_worker(model_path, partial)
+        for bounds in chunks:
+            done += _score_rows(bounds)
+            if progress:
+                _report(done, shape[0], started, progress)
+        _worker.clear()
+    if progress:
+        progress.write("\n")
+
+    os.replace(partial, output)
+    with open(output + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model_path": model_path,
+            "model_version": version,
+            "device_encoder_digest": le_device.digest,
+            "manuf_encoder_digest": le_manuf.digest,
+            "shape": list(shape),
+            "build_seconds": round(time.perf_counter() - started, 2),
+            "workers": workers,
+            "built_at": time.time(),
+        }, f, indent=2)
+    return RiskLookupTable(output)
+
+
+def main(argv=None):
+    from risk_engine import MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH
+
+    parser = argparse.ArgumentParser(description="Build or inspect the precomputed risk lookup table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="score every device x manufacturer code pair")
+    build.add_argument("--model", default=MODEL_PATH)
+    build.add_argument("--device-encoder", default=DEVICE_ENCODER_PATH)
+    build.add_argument("--manuf-encoder", default=MANUF_ENCODER_PATH)
+    build.add_argument("--output", help="table path (default: derived from the model/encoder versions)")
+    build.add_argument("--workers", type=int, default=1, help="parallel scoring processes")
+    build.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                       help="device rows scored per chunk")
+    info = sub.add_parser("info", help="show a built table's manifest")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        table = build_table(args.model, args.device_encoder, args.manuf_encoder, output=args.output,
+                            workers=args.workers, chunk_rows=args.chunk_rows)
+        print(f"Wrote {table.path} ({os.path.getsize(table.path) / 1e6:.1f} MB)")
+    else:
+        table = RiskLookupTable(args.path)
+        print(json.dumps(table.manifest, indent=2))
+        levels, counts = np.unique(table.table, return_counts=True)
+        print("risk level counts:", {int(level): int(count) for level, count in zip(levels, counts)})
+
+
+if __name__ == "__main__":
+    main()
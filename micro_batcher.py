@@ -0,0 +1,146 @@
+"""Shared in-process request batching in front of the model
+
+Every Streamlit session runs on its own thread. Without batching, each one
+calls ``model.predict`` on a single row and they all contend for the same
+booster. A MicroBatcher collects requests from concurrent callers for up to
+``max_wait_ms`` (or until ``max_batch`` rows are waiting), runs one vectorized
+prediction, and hands each caller its own result.
+
+Batching only applies when no fast path serves the model, i.e. the interval
+grid is disabled (RISK_APP_COMPILED_MODEL=0) or unavailable and no lookup
+table was built. risk_engine.batching_applies is the one rule both the apps
+and the scoring service use; with a fast path every miss is answered
+directly.
+
+Configure with RISK_APP_BATCH_MAX_SIZE, RISK_APP_BATCH_MAX_WAIT_MS and
+RISK_APP_BATCHING=0 to turn it off.
+"""
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import numpy as np
+
+BATCHING_ENABLED = os.environ.get("RISK_APP_BATCHING", "1") != "0"
+DEFAULT_MAX_BATCH = int(os.environ.get("RISK_APP_BATCH_MAX_SIZE", 256))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("RISK_APP_BATCH_MAX_WAIT_MS", 2.0))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Background thread that merges concurrent single-row predictions"""
+
+    def __init__(self, predict_fn, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self.batches = self.rows = self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name="risk-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, device_code, manuf_code):
+        """Queue one encoded pair and return a Future for its result"""
+        future = Future()
+        self._queue.put((device_code, manuf_code, future))
+        return future
+
+    def predict(self, device_code, manuf_code, timeout=None):
+        """Blocking helper: submit one pair and wait for its result"""
+        return self.submit(device_code, manuf_code).result(timeout)
+
+    def close(self):
+        """Stop the batching thread once the requests already queued are served"""
+        self._queue.put(_STOP)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            device_codes = np.fromiter((b[0] for b in batch), dtype=np.int32, count=len(batch))
+            manuf_codes = np.fromiter((b[1] for b in batch), dtype=np.int32, count=len(batch))
+            try:
+                results = self.predict_fn(device_codes, manuf_codes)
+                if isinstance(results, np.ndarray):
+                    results = results.tolist()
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.rows += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+
+_BATCHERS = weakref.WeakKeyDictionary()
+_BATCHERS_LOCK = threading.Lock()
+
+
+def batcher_for(model, predict_codes, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """The process-wide batcher for a model, created on first use
+
+    ``predict_codes(model, device_codes, manuf_codes)`` does the actual scoring
+    and returns one result per row.
+    The batcher only holds a weak reference to the model, and its thread
+    stops once the model is garbage collected. After a hot swap that is when
+    the last request holding the old deployment finishes (registry versions
+    are loaded uncached, see model_registry.prepare_deployment). Models
+    from the cached load_model / load_artifacts live, and keep their batcher,
+    for the whole process.
+    """
+    batcher = _BATCHERS.get(model)
+    if batcher is None:
+        with _BATCHERS_LOCK:
+            batcher = _BATCHERS.get(model)
+            if batcher is None:
+                model_ref = weakref.ref(model)
+                batcher = MicroBatcher(lambda d, m: predict_codes(model_ref(), d, m), max_batch, max_wait_ms)
+                weakref.finalize(model, batcher.close)
+                _BATCHERS[model] = batcher
+    return batcher
+
+
+def batcher_stats(model):
+    """Statistics of the model's batcher, or None if it has not been used"""
+    batcher = _BATCHERS.get(model)
+    return batcher.stats() if batcher is not None else None
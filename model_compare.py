@@ -0,0 +1,275 @@
+"""Score several model generations side by side and report where they disagree
+
+Every bundle (model + its two encoders) is loaded once. Each input batch is
+encoded once per distinct encoder pair with the vectorized index lookups,
+and all models score it in parallel threads (XGBoost and the compiled grids
+release the GIL). The comparison keeps running counts of disagreeing rows,
+overall and per pair of models, and the time each model spent scoring.
+
+    python model_compare.py                                # shipped models on the dataset
+    python model_compare.py --csv inventory.csv --output compared.csv
+    python model_compare.py --bundle current=artifacts/<version> --bundle balanced
+
+A bundle is a name from DEFAULT_BUNDLES, a bundle directory written by
+train_model.py, or ``name=model,device_encoder,manuf_encoder``. ShadowScorer
+runs the same comparison on live traffic in a background thread (see
+``scoring_service.py --shadow``).
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import numpy as np
+
+from perf_metrics import observe
+from risk_engine import bundle_paths, load_artifacts, predict_proba_codes
+
+# xgbModel3.model is not listed: it takes the full 32-column recall record, not a name pair
+DEFAULT_BUNDLES = {
+    "2feat": ("xgbModel_2feat.model", "le_device.pkl", "le_manuf.pkl"),
+    "balanced": ("xgbModel_balanced_2feat.model", "le_device_balanced.pkl", "le_manuf_balanced.pkl"),
+}
+DEFAULT_DATA = "data csv/final_merged_dataset.csv"
+CHUNK_ROWS = 100_000
+
+ModelBundle = namedtuple("ModelBundle", ["name", "model", "le_device", "le_manuf"])
+Comparison = namedtuple("Comparison", ["levels", "probabilities", "seconds", "disagree"])
+
+
+def parse_bundle(spec):
+    """(name, (model, device encoder, manuf encoder) paths) for a bundle spec"""
+    name, sep, paths = spec.partition("=")
+    if not sep:
+        name, paths = os.path.basename(os.path.normpath(spec)), spec
+    if paths in DEFAULT_BUNDLES:
+        return name, DEFAULT_BUNDLES[paths]
+    if os.path.isdir(paths):
+        return name, bundle_paths(paths)
+    parts = tuple(paths.split(","))
+    if len(parts) != 3:
+        raise ValueError(f"bundle {spec!r} is not a known name, a bundle directory or model,device,manuf paths")
+    return name, parts
+
+
+def load_bundle(name, paths):
+    """Load one bundle, rejecting models that do not score (device, manufacturer) pairs"""
+    model, le_device, le_manuf = load_artifacts(*paths)
+    n_features = getattr(model, "n_features_in_", 2)
+    if n_features != 2:
+        raise ValueError(f"{name}: {paths[0]} takes {n_features} features, not a device/manufacturer pair")
+    return ModelBundle(name, model, le_device, le_manuf)
+
+
+def load_bundles(specs=None):
+    """ModelBundles for {name: paths} (the shipped 2-feature models by default)"""
+    specs = DEFAULT_BUNDLES if specs is None else specs
+    return [load_bundle(name, paths) for name, paths in specs.items()]
+
+
+class ModelComparison:
+    """Scores every bundle on the same inputs in parallel and tracks their disagreement"""
+
+    def __init__(self, bundles, workers=None):
+        self.bundles = list(bundles)
+        names = [b.name for b in self.bundles]
+        if len(self.bundles) < 2 or len(set(names)) != len(names):
+            raise ValueError("a comparison needs at least two bundles with distinct names")
+        self.executor = ThreadPoolExecutor(max_workers=workers or len(self.bundles),
+                                           thread_name_prefix="model-compare")
+        self._lock = threading.Lock()
+        self.rows = self.batches = self.disagreements = 0
+        self.pair_disagreements = {pair: 0 for pair in combinations(names, 2)}
+        self.seconds = dict.fromkeys(names, 0.0)
+
+    def _encode(self, device_names, manufacturer_names):
+        """Codes per bundle, encoding once for bundles that share encoders"""
+        by_encoders = {}
+        for bundle in self.bundles:
+            by_encoders.setdefault((bundle.le_device.digest, bundle.le_manuf.digest), bundle)
+        futures = {key: (self.executor.submit(b.le_device.encode, device_names),
+                         self.executor.submit(b.le_manuf.encode, manufacturer_names))
+                   for key, b in by_encoders.items()}
+        return {b.name: tuple(f.result() for f in futures[(b.le_device.digest, b.le_manuf.digest)])
+                for b in self.bundles}
+
+    @staticmethod
+    def _score_one(bundle, device_codes, manuf_codes):
+        started = time.perf_counter()
+        levels, proba = predict_proba_codes(bundle.model, device_codes, manuf_codes)
+        return levels, proba, time.perf_counter() - started
+
+    def score(self, device_names, manufacturer_names):
+        """Comparison of every bundle's levels and probabilities for the given name pairs"""
+        device_names = np.asarray(device_names, dtype=object)
+        manufacturer_names = np.asarray(manufacturer_names, dtype=object)
+        codes = self._encode(device_names, manufacturer_names)
+        futures = {b.name: self.executor.submit(self._score_one, b, *codes[b.name]) for b in self.bundles}
+        results = {name: f.result() for name, f in futures.items()}
+        levels = {name: r[0] for name, r in results.items()}
+        seconds = {name: r[2] for name, r in results.items()}
+
+        stacked = np.stack(list(levels.values()))
+        disagree = (stacked != stacked[0]).any(axis=0)
+        pairs = {(a, b): int(np.count_nonzero(levels[a] != levels[b])) for a, b in self.pair_disagreements}
+        with self._lock:
+            self.rows += len(device_names)
+            self.batches += 1
+            self.disagreements += int(disagree.sum())
+            for pair, count in pairs.items():
+                self.pair_disagreements[pair] += count
+            for name, elapsed in seconds.items():
+                self.seconds[name] += elapsed
+        for name, elapsed in seconds.items():
+            observe(f"compare.{name}", elapsed)
+        return Comparison(levels, {name: r[1] for name, r in results.items()}, seconds, disagree)
+
+    def score_frame(self, df, device_col='name', manuf_col='name_manufacturer'):
+        """Copy of df with risk_level_<name> and confidence_<name> per bundle and a models_agree column"""
+        scored = df.copy()
+        result = self.score(df[device_col].to_numpy(), df[manuf_col].to_numpy())
+        for name in result.levels:
+            scored[f'risk_level_{name}'] = result.levels[name]
+            scored[f'confidence_{name}'] = result.probabilities[name].max(axis=1)
+        scored['models_agree'] = ~result.disagree
+        return scored
+
+    def report(self):
+        """Disagreement rates and per-model scoring time so far"""
+        with self._lock:
+            rows = self.rows
+            return {
+                "models": [b.name for b in self.bundles],
+                "rows": rows,
+                "batches": self.batches,
+                "disagreement_rate": self.disagreements / rows if rows else 0.0,
+                "pairwise_disagreement": {f"{a} vs {b}": count / rows if rows else 0.0
+                                          for (a, b), count in self.pair_disagreements.items()},
+                "latency": {name: {"seconds": total, "us_per_row": total / rows * 1e6 if rows else 0.0,
+                                   "ms_per_batch": total / self.batches * 1000 if self.batches else 0.0}
+                            for name, total in self.seconds.items()},
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class ShadowScorer:
+    """Runs a ModelComparison on live traffic in a background thread, off the request path
+
+    Requests are queued and scored in merged batches of up to ``max_batch``
+    rows. When more than ``max_pending`` rows are waiting, new rows are
+    dropped (and counted) rather than slowing the service down.
+    """
+
+    def __init__(self, comparison, max_batch=4096, max_pending=100_000):
+        self.comparison = comparison
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    def submit(self, device_names, manufacturer_names):
+        with self._lock:
+            if self._pending + len(device_names) > self.max_pending:
+                self.dropped += len(device_names)
+                return
+            self._pending += len(device_names)
+        self._queue.put((device_names, manufacturer_names))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0][0])
+            while rows < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            devices = [name for names, _ in batch for name in names]
+            manufacturers = [name for _, names in batch for name in names]
+            try:
+                self.comparison.score(devices, manufacturers)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self._pending -= rows
+
+    def report(self):
+        return dict(self.comparison.report(), dropped=self.dropped, pending=self._pending,
+                    last_error=self.last_error)
+
+
+def dataset_names(column_cache, column):
+    """Per-row names of a cached column, None where the value is missing"""
+    names = np.array(column_cache.unique(column).tolist() + [None], dtype=object)
+    return names[np.asarray(column_cache.codes(column))]  # code -1 picks the trailing None
+
+
+def print_report(report):
+    print(f"{report['rows']:,} rows, {report['batches']} batch(es)")
+    print(f"Any disagreement: {report['disagreement_rate']:.2%}")
+    for pair, rate in report["pairwise_disagreement"].items():
+        print(f"  {pair}: {rate:.2%}")
+    for name, latency in report["latency"].items():
+        print(f"{name}: {latency['seconds'] * 1000:,.1f} ms total, {latency['us_per_row']:.2f} us/row")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare risk model generations on the same inputs")
+    parser.add_argument("--bundle", action="append", metavar="SPEC",
+                        help="shipped name, bundle directory or name=model,device_encoder,manuf_encoder "
+                             f"(default: {', '.join(DEFAULT_BUNDLES)})")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", help="CSV of device/manufacturer pairs to score")
+    source.add_argument("--data", default=DEFAULT_DATA, help="dataset (path or URL) to score through the data cache")
+    parser.add_argument("--device-col", default="name")
+    parser.add_argument("--manuf-col", default="name_manufacturer")
+    parser.add_argument("--output", help="write the per-row comparison of --csv here")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    try:
+        specs = dict(parse_bundle(spec) for spec in args.bundle) if args.bundle else None
+        comparison = ModelComparison(load_bundles(specs))
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"error: {e}\n")
+
+    if args.csv:
+        import pandas as pd
+
+        header = True
+        for chunk in pd.read_csv(args.csv, chunksize=args.chunk_rows,
+                                 dtype={args.device_col: object, args.manuf_col: object}):
+            scored = comparison.score_frame(chunk, args.device_col, args.manuf_col)
+            if args.output:
+                scored.to_csv(args.output, mode="w" if header else "a", header=header, index=False)
+                header = False
+    else:
+        from data_sources import SourceUnavailable, load_columns
+
+        try:
+            cached = load_columns(args.data, [args.device_col, args.manuf_col])
+        except SourceUnavailable as e:
+            parser.exit(1, f"error: {e}\n")
+        devices = dataset_names(cached, args.device_col)
+        manufacturers = dataset_names(cached, args.manuf_col)
+        for lo in range(0, len(devices), args.chunk_rows):
+            comparison.score(devices[lo:lo + args.chunk_rows], manufacturers[lo:lo + args.chunk_rows])
+    print_report(comparison.report())
+    comparison.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""On-disk model registry and hot-swapping of the serving model
+
+The registry is a directory of artifact bundles (as written by train_model.py)
+plus ``registry.json``, which records each registered version with the
+sha256 of its files and names the active one:
+
+    artifacts/registry.json
+    artifacts/<version>/model.ubj, le_device.pkl, le_manuf.pkl, manifest.json
+
+Manage it from the command line:
+
+    python model_registry.py register artifacts/<version> --activate
+    python model_registry.py activate <version>
+    python model_registry.py list
+
+ModelServer holds the serving Deployment. Once a model has been served, a
+background thread polls registry.json; when the active version changes it
+verifies the checksums, loads the bundle, builds its fast path and runs a
+warm-up prediction, all off the request path, and then replaces the
+Deployment in one assignment. Callers take one Deployment per request, so
+predictions already running finish on the version they started with.
+
+Without a registry (or an active version) the shipped model is served, or
+the RISK_APP_BUNDLE bundle when that is set.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+
+from risk_engine import (BUNDLE_FILES, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, MODEL_PATH, bundle_paths,
+                         model_version, predict_pairs, read_artifacts)
+
+REGISTRY_DIR = os.environ.get("RISK_APP_REGISTRY_DIR", "artifacts")
+POLL_SECONDS = float(os.environ.get("RISK_APP_REGISTRY_POLL", 5))
+REGISTRY_FILE = "registry.json"
+FORMAT_VERSION = 1
+
+Deployment = namedtuple("Deployment", ["version", "model", "le_device", "le_manuf", "paths", "loaded_at"])
+
+
+class RegistryError(Exception):
+    pass
+
+
+def _sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Registered bundle versions and the active one, stored in <root>/registry.json"""
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self.path = os.path.join(root, REGISTRY_FILE)
+
+    def read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"format_version": FORMAT_VERSION, "active": None, "versions": {}}
+        except (OSError, ValueError) as e:
+            raise RegistryError(f"unreadable registry {self.path}: {e}")
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise RegistryError(f"unsupported registry format in {self.path}")
+        return manifest
+
+    def _write(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def stamp(self):
+        """Cheap change marker for registry.json (None when there is no registry)"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def active_version(self):
+        return self.read()["active"]
+
+    def versions(self):
+        return self.read()["versions"]
+
+    def paths(self, version):
+        """(model, device encoder, manufacturer encoder) paths of a registered version"""
+        return bundle_paths(os.path.join(self.root, version))
+
+    def register(self, bundle_dir, activate=False):
+        """Add a bundle (copied under the registry root if it lives elsewhere) and return its version"""
+        try:
+            with open(os.path.join(bundle_dir, "manifest.json"), encoding="utf-8") as f:
+                bundle = json.load(f)
+        except (OSError, ValueError):
+            bundle = {}
+        version = bundle.get("version") or os.path.basename(os.path.normpath(bundle_dir))
+        target = os.path.join(self.root, version)
+        if os.path.abspath(bundle_dir) != os.path.abspath(target):
+            if os.path.exists(target):
+                raise RegistryError(f"{target} already exists")
+            shutil.copytree(bundle_dir, target)
+        missing = [name for name in BUNDLE_FILES.values() if not os.path.exists(os.path.join(target, name))]
+        if missing:
+            raise RegistryError(f"bundle {version} is missing {', '.join(missing)}")
+        manifest = self.read()
+        manifest["versions"][version] = {
+            "registered_at": time.time(),
+            "model_version": bundle.get("model_version"),
+            "cv_accuracy": bundle.get("cv_accuracy"),
+            "sha256": {name: _sha256(os.path.join(target, name)) for name in BUNDLE_FILES.values()},
+        }
+        if activate:
+            manifest["active"] = version
+        self._write(manifest)
+        return version
+
+    def verify(self, version):
+        """Check a version's files against their recorded checksums and return its paths"""
+        entry = self.versions().get(version)
+        if entry is None:
+            raise RegistryError(f"unknown model version {version!r}")
+        for name, expected in entry["sha256"].items():
+            path = os.path.join(self.root, version, name)
+            try:
+                actual = _sha256(path)
+            except OSError as e:
+                raise RegistryError(f"{version}: cannot read {name}: {e}")
+            if actual != expected:
+                raise RegistryError(f"{version}: checksum mismatch for {name}")
+        return self.paths(version)
+
+    def activate(self, version):
+        self.verify(version)
+        manifest = self.read()
+        manifest["active"] = version
+        self._write(manifest)
+
+
+def prepare_deployment(version, paths):
+    """Load a bundle, build its fast path and warm it up with one prediction (levels and probabilities)
+
+    Registry versions are loaded uncached, so once a swap drops the last
+    reference their model, encoders, fast path and micro-batcher are freed.
+    The shipped fallback (version None) shares the process-wide load_artifacts.
+    """
+    model, le_device, le_manuf = read_artifacts(*paths, cached=version is None)
+    le_device.encode(list(le_device.classes_[:1]))  # builds the vectorized encode index
+    le_manuf.encode(list(le_manuf.classes_[:1]))
+    predict_pairs(model, [0, -1], [0, -1])
+    return Deployment(version, model, le_device, le_manuf, paths, time.time())
+
+
+class ModelServer:
+    """The serving Deployment, swapped in the background when the registry's active version changes"""
+
+    def __init__(self, registry=None, fallback_paths=(MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH),
+                 poll_seconds=POLL_SECONDS):
+        self.registry = registry or ModelRegistry()
+        self.fallback_paths = tuple(fallback_paths)
+        self.poll_seconds = poll_seconds
+        self._deployment = None
+        self._stamp = None
+        self._lock = threading.Lock()  # serializes loads; readers never take it once a model is served
+        self._watcher = None
+        self._stop = threading.Event()
+        self.swaps = 0
+        self.last_error = None
+        self.last_checked = None
+
+    def _target(self):
+        """(version, paths) the registry asks for, falling back to the shipped model"""
+        version = self.registry.active_version()
+        if version is None:
+            return None, self.fallback_paths
+        return version, self.registry.verify(version)
+
+    def current(self):
+        """The Deployment to serve this request with, loading it on first use"""
+        deployment = self._deployment
+        if deployment is None:
+            with self._lock:
+                if self._deployment is None:
+                    self._stamp = self.registry.stamp()
+                    try:
+                        version, paths = self._target()
+                    except RegistryError as e:
+                        self.last_error = str(e)
+                        version, paths = None, self.fallback_paths
+                    self._deployment = prepare_deployment(version, paths)
+                deployment = self._deployment
+            if self.poll_seconds > 0:
+                self.start_watcher()
+        return deployment
+
+    def loaded(self):
+        """The Deployment being served, or None before the first request"""
+        return self._deployment
+
+    def paths(self):
+        """Bundle paths being served, or those the first request will load (verified only then)"""
+        deployment = self._deployment
+        if deployment is not None:
+            return deployment.paths
+        try:
+            version = self.registry.active_version()
+        except RegistryError:
+            return self.fallback_paths
+        return self.fallback_paths if version is None else self.registry.paths(version)
+
+    def refresh(self):
+        """Swap in the registry's active version if it changed; returns True after a swap"""
+        self.last_checked = time.time()
+        stamp = self.registry.stamp()
+        if stamp == self._stamp or self._deployment is None:
+            return False
+        with self._lock:
+            try:
+                version, paths = self._target()
+                if version == self._deployment.version and paths == self._deployment.paths:
+                    self._stamp = stamp
+                    return False
+                deployment = prepare_deployment(version, paths)
+            except Exception as e:
+                # Keep serving the current version; the next change of registry.json retries
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._stamp = stamp
+                return False
+            self._deployment = deployment
+            self._stamp = stamp
+            self.swaps += 1
+            self.last_error = None
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.refresh()
+
+    def start_watcher(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            with self._lock:
+                if self._watcher is None or not self._watcher.is_alive():
+                    self._stop.clear()
+                    self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher",
+                                                     daemon=True)
+                    self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def status(self):
+        deployment = self._deployment
+        return {
+            "version": deployment.version if deployment else None,
+            "model_version": model_version(deployment.model) if deployment else None,
+            "loaded_at": deployment.loaded_at if deployment else None,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "poll_seconds": self.poll_seconds,
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+
+MODEL_SERVER = ModelServer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the on-disk model registry")
+    parser.add_argument("--root", default=REGISTRY_DIR, help="registry directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    register = commands.add_parser("register", help="add a bundle directory")
+    register.add_argument("bundle")
+    register.add_argument("--activate", action="store_true", help="also make it the serving version")
+    activate = commands.add_parser("activate", help="make a registered version the serving one")
+    activate.add_argument("version")
+    commands.add_parser("verify", help="check every registered version's checksums")
+    commands.add_parser("list", help="show registered versions")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    try:
+        if args.command == "register":
+            version = registry.register(args.bundle, activate=args.activate)
+            print(f"Registered {version}" + (" (active)" if args.activate else ""))
+        elif args.command == "activate":
+            registry.activate(args.version)
+            print(f"Activated {args.version}; running apps swap to it within {POLL_SECONDS:g}s")
+        elif args.command == "verify":
+            for version in registry.versions():
+                registry.verify(version)
+                print(f"{version}: ok")
+        else:
+            manifest = registry.read()
+            for version, entry in sorted(manifest["versions"].items()):
+                marker = "*" if version == manifest["active"] else " "
+                print(f"{marker} {version}  cv_accuracy={entry.get('cv_accuracy')}")
+    except RegistryError as e:
+        parser.exit(1, f"error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
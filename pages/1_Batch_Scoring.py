@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+import weakref
+
+import streamlit as st
+import pandas as pd
+from risk_engine import iter_scored_chunks, DEFAULT_CHUNK_SIZE
+from app_common import load_model_and_encoders
+import warnings
+warnings.filterwarnings('ignore')
+
+# Page configuration
+st.set_page_config(
+    page_title="Batch Risk Scoring",
+    page_icon="📦",
+    layout="wide"
+)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class ScoredFile:
+    """Scored CSV written to a temporary file, removed once the session lets go of it"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="scored-", suffix=".csv")
+        self.file = os.fdopen(fd, "w", encoding="utf-8", newline="")
+        weakref.finalize(self, _remove, self.path)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+def main():
+    st.title("📦 Batch Risk Scoring")
+    st.markdown(
+        "Upload a CSV of device/manufacturer pairs to score every row in one pass. "
+        "Unknown device or manufacturer names are encoded as -1, exactly as in the single assessment."
+    )
+
+    uploaded = st.file_uploader("Device inventory (CSV)", type=["csv"])
+    if uploaded is None:
+        st.info("The CSV needs one column with device names and one with manufacturer names.")
+        return
+
+    # Only read the header to offer column choices
+    columns = pd.read_csv(uploaded, nrows=0).columns.tolist()
+    uploaded.seek(0)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        device_col = st.selectbox("Device name column", columns,
+                                  index=columns.index('name') if 'name' in columns else 0)
+    with col2:
+        manuf_col = st.selectbox("Manufacturer name column", columns,
+                                 index=columns.index('name_manufacturer') if 'name_manufacturer' in columns else min(1, len(columns) - 1))
+    with col3:
+        chunk_size = st.number_input("Rows per chunk", min_value=1_000, max_value=1_000_000,
+                                     value=DEFAULT_CHUNK_SIZE, step=10_000)
+    with_probabilities = st.checkbox("Include class probabilities and confidence", value=True,
+                                     help="Adds p_high, p_medium, p_low and confidence columns from the same model pass")
+
+    if not st.button("Score File", type="primary"):
+        return
+
+    # The model is only loaded once there is something to score, and the whole file
+    # is scored with the deployment current when scoring started
+    with st.spinner("Loading model..."):
+        model, le_device, le_manuf = load_model_and_encoders()
+    if model is None:
+        st.error("Failed to load the model. Please ensure all files are present.")
+        return
+
+    start = time.perf_counter()
+    # Chunks go straight to disk, so scoring holds one chunk in memory whatever the file size.
+    # Replacing the session's previous file lets its finalizer delete it.
+    output = st.session_state["scored_file"] = ScoredFile()
+    preview = None
+    n_rows = 0
+    try:
+        with st.spinner("Scoring uploaded file..."), output.file:
+            for scored in iter_scored_chunks(uploaded, model, le_device, le_manuf, device_col=device_col,
+                                             manuf_col=manuf_col, chunk_size=int(chunk_size),
+                                             probabilities=with_probabilities):
+                if preview is None:
+                    preview = scored.head(100)
+                scored.to_csv(output.file, index=False, header=n_rows == 0)
+                n_rows += len(scored)
+    except Exception as e:
+        st.error(f"Error in batch scoring: {e}")
+        return
+    elapsed = time.perf_counter() - start
+
+    st.success(f"Scored {n_rows:,} rows in {elapsed:.2f}s")
+    # Read from the temporary file only when clicked; the server then holds that one copy while serving it
+    st.download_button("Download scored CSV", data=output.read, file_name="scored_devices.csv",
+                       mime="text/csv", type="primary", on_click="ignore")
+    st.caption(f"{os.path.getsize(output.path) / 1e6:,.1f} MB. The scored file is kept on the server's disk "
+               "and only loaded into its memory when you download it.")
+
+    if preview is not None:
+        st.markdown("### Preview")
+        st.dataframe(preview, use_container_width=True)
+
+if __name__ == "__main__":
+    main()
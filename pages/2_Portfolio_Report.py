@@ -0,0 +1,55 @@
+import time
+
+import streamlit as st
+from app_common import load_model_and_encoders
+from portfolio_report import display_table, portfolio_report
+import warnings
+warnings.filterwarnings('ignore')
+
+# Page configuration
+st.set_page_config(
+    page_title="Portfolio Risk Report",
+    page_icon="📊",
+    layout="wide"
+)
+
+def main():
+    st.title("📊 Portfolio Risk Report")
+    st.markdown(
+        "Ranks manufacturers by the risk mix of their devices: every manufacturer is scored against "
+        "every device the model knows, and the predictions are counted per risk level."
+    )
+
+    names = st.text_area("Manufacturers (one per line, leave empty for all)", height=120)
+    manufacturers = [line.strip() for line in names.splitlines() if line.strip()] or None
+
+    if not st.button("Build Report", type="primary"):
+        return
+
+    with st.spinner("Loading model..."):
+        model, le_device, le_manuf = load_model_and_encoders()
+    if model is None:
+        st.error("Failed to load the model. Please ensure all files are present.")
+        return
+
+    start = time.perf_counter()
+    try:
+        with st.spinner("Scoring portfolio..."):
+            report = portfolio_report(model, le_device, le_manuf, manufacturers)
+    except Exception as e:
+        st.error(f"Error building the report: {e}")
+        return
+    elapsed = time.perf_counter() - start
+
+    n_devices = int(report['devices'].iloc[0]) if len(report) else 0
+    st.success(f"Scored {len(report) * n_devices:,} device/manufacturer pairs "
+               f"for {len(report):,} manufacturers in {elapsed:.2f}s")
+    st.download_button("Download report CSV", data=report.to_csv(index=False).encode("utf-8"),
+                       file_name="portfolio_risk_report.csv", mime="text/csv", type="primary")
+    # Click a column header to re-sort
+    st.dataframe(display_table(report), use_container_width=True, hide_index=True,
+                 column_config={f"{label} %": st.column_config.NumberColumn(format="%.1f%%")
+                                for label in ("HIGH RISK", "MEDIUM RISK", "LOW RISK")})
+
+if __name__ == "__main__":
+    main()
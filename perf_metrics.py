@@ -0,0 +1,116 @@
+"""Per-stage latency metrics for the apps and the scoring service
+
+Wrap a stage in ``stage_timer("predict")`` and its duration lands in a
+rolling window (the last ``RISK_APP_TIMINGS_WINDOW`` samples) from which
+p50/p95/p99 are read. Lifetime counts and sums are kept as well, and
+everything can be exported in the Prometheus text format as summaries.
+
+Set RISK_APP_TIMINGS=0 to turn the hooks off; ``stage_timer`` then hands
+back one shared no-op context manager.
+"""
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+TIMINGS_ENABLED = os.environ.get("RISK_APP_TIMINGS", "1") != "0"
+DEFAULT_WINDOW = int(os.environ.get("RISK_APP_TIMINGS_WINDOW", 1024))
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "risk_app_stage_seconds"
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class LatencyWindow:
+    """Most recent durations of one stage, plus lifetime count and sum"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.samples:
+            return {q: None for q in quantiles}
+        values = np.quantile(np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)), quantiles)
+        return dict(zip(quantiles, values.tolist()))
+
+
+class StageMetrics:
+    """Thread-safe registry of LatencyWindows keyed on stage name"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            latency = self._stages.get(stage)
+            if latency is None:
+                latency = self._stages[stage] = LatencyWindow(self.window)
+            latency.observe(seconds)
+
+    def snapshot(self):
+        """Per-stage count, mean and rolling quantiles in seconds, in first-seen order"""
+        with self._lock:
+            stages = [(stage, latency.count, latency.total, latency.quantiles())
+                      for stage, latency in self._stages.items()]
+        return {stage: {"count": count, "mean": total / count, "p50": q[0.5], "p95": q[0.95], "p99": q[0.99]}
+                for stage, count, total, q in stages}
+
+    def prometheus_text(self):
+        """All stages as Prometheus summaries"""
+        lines = [f"# HELP {METRIC_NAME} Duration of app stages (quantiles over the last {self.window} samples)",
+                 f"# TYPE {METRIC_NAME} summary"]
+        with self._lock:
+            stages = [(stage, latency.count, latency.total, latency.quantiles())
+                      for stage, latency in self._stages.items()]
+        for stage, count, total, quantiles in stages:
+            label = stage.replace("\\", "\\\\").replace('"', '\\"')
+            for q, value in quantiles.items():
+                lines.append(f'{METRIC_NAME}{{stage="{label}",quantile="{q:g}"}} {value if value is not None else "NaN"}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{label}"}} {total}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+STAGE_METRICS = StageMetrics()
+
+
+class _StageTimer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_METRICS.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def stage_timer(stage):
+    """Context manager recording how long its block took under stage"""
+    return _StageTimer(stage) if TIMINGS_ENABLED else _NULL_TIMER
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere"""
+    if TIMINGS_ENABLED:
+        STAGE_METRICS.observe(stage, seconds)
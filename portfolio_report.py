@@ -0,0 +1,103 @@
+"""Portfolio risk report: the risk mix of every device per manufacturer
+
+Each manufacturer is paired with every device (the whole device encoder
+vocabulary by default) and the pairs are scored in vectorized chunks. The
+risk levels are then grouped per manufacturer with a bincount. With the
+lookup table or the compiled grid, the full vocabulary (22k devices x 2.8k
+manufacturers) takes about a second (see risk_engine.cross_level_counts).
+
+    python portfolio_report.py --output portfolio.csv
+    python portfolio_report.py --manufacturers "Medtronic" "Baxter Healthcare Corp" --top 10
+
+The "Portfolio Report" page shows the same table, sortable, with a CSV download.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from risk_engine import RISK_LEVELS, as_index, cross_level_counts, load_artifacts
+
+# Same labels as the apps' get_risk_display
+RISK_LABELS = {1: "HIGH RISK", 2: "MEDIUM RISK", 3: "LOW RISK"}
+COUNT_COLUMNS = ['high', 'medium', 'low']  # RISK_LEVELS order
+SHARE_COLUMNS = [f'{column}_share' for column in COUNT_COLUMNS]
+
+
+def portfolio_report(model, le_device, le_manuf, manufacturers=None, devices=None):
+    """One row per manufacturer with its device count, risk level counts and shares
+
+    manufacturers and devices default to every class of the encoders. Unknown
+    names are scored with code -1, as in the single assessment. Rows are
+    sorted riskiest first (by high, then medium share).
+    """
+    import pandas as pd
+
+    le_device, le_manuf = as_index(le_device), as_index(le_manuf)
+    if manufacturers is None:
+        manufacturers = le_manuf.classes_
+        manuf_codes = np.arange(len(le_manuf), dtype=np.int32)
+    else:
+        manufacturers = np.asarray(manufacturers, dtype=object)
+        manuf_codes = le_manuf.encode(manufacturers)
+    device_codes = (np.arange(len(le_device), dtype=np.int32) if devices is None
+                    else le_device.encode(devices))
+
+    counts = cross_level_counts(model, device_codes, manuf_codes)
+    report = pd.DataFrame({'manufacturer': manufacturers, 'manufacturer_code': manuf_codes,
+                           'devices': np.full(len(manuf_codes), len(device_codes), dtype=np.int64)})
+    for i, column in enumerate(COUNT_COLUMNS):
+        report[column] = counts[:, i]
+    shares = counts / max(len(device_codes), 1)
+    for i, column in enumerate(SHARE_COLUMNS):
+        report[column] = shares[:, i]
+    # Mean risk level: 1 when every device is high risk, 3 when every one is low risk
+    report['mean_level'] = shares @ RISK_LEVELS.astype(np.float64) if len(device_codes) else np.nan
+    return report.sort_values(['high_share', 'medium_share'], ascending=False, kind='stable',
+                              ignore_index=True)
+
+
+def display_table(report):
+    """The report with the apps' risk labels as column names, shares in percent"""
+    table = report.rename(columns={'manufacturer': 'Manufacturer', 'devices': 'Devices',
+                                   'mean_level': 'Mean Level'}).drop(columns=['manufacturer_code'])
+    for level, count, share in zip(RISK_LEVELS.tolist(), COUNT_COLUMNS, SHARE_COLUMNS):
+        table = table.rename(columns={count: RISK_LABELS[level], share: f"{RISK_LABELS[level]} %"})
+        table[f"{RISK_LABELS[level]} %"] *= 100
+    return table
+
+
+def _read_names(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Risk mix of every device per manufacturer")
+    parser.add_argument("--manufacturers", nargs="+", help="manufacturer names (default: all encoder classes)")
+    parser.add_argument("--manufacturers-file", help="file with one manufacturer name per line")
+    parser.add_argument("--devices-file", help="file with one device name per line (default: all encoder classes)")
+    parser.add_argument("--output", help="write the full report as CSV")
+    parser.add_argument("--top", type=int, default=20, help="print the N riskiest manufacturers")
+    args = parser.parse_args(argv)
+
+    manufacturers = args.manufacturers
+    if args.manufacturers_file:
+        manufacturers = (manufacturers or []) + _read_names(args.manufacturers_file)
+    devices = _read_names(args.devices_file) if args.devices_file else None
+
+    model, le_device, le_manuf = load_artifacts()
+    started = time.perf_counter()
+    report = portfolio_report(model, le_device, le_manuf, manufacturers, devices)
+    elapsed = time.perf_counter() - started
+    pairs = len(report) * (int(report['devices'].iloc[0]) if len(report) else 0)
+    print(f"Scored {pairs:,} pairs for {len(report):,} manufacturers in {elapsed:.2f}s", file=sys.stderr)
+    if args.output:
+        report.to_csv(args.output, index=False)
+    if args.top:
+        print(display_table(report).head(args.top).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+
+
+if __name__ == "__main__":
+    main()
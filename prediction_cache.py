@@ -0,0 +1,75 @@
+"""Process-wide LRU/TTL cache of predictions keyed on (model version, device code, manufacturer code)
+
+The model version is part of every key, so a hot swap needs no
+invalidation: the new version misses and fills its own entries, and those
+of the old version age out of the LRU. Deployments serving different
+versions at the same time share the cache without clearing each other's
+entries.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = int(os.environ.get("RISK_APP_PREDICTION_CACHE_SIZE", 100_000))
+DEFAULT_TTL = float(os.environ.get("RISK_APP_PREDICTION_CACHE_TTL", 0)) or None
+
+
+class PredictionCache:
+    """Bounded LRU cache with optional TTL"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+PREDICTION_CACHE = PredictionCache()
@@ -0,0 +1,513 @@
+"""Shared scoring logic for the risk assessment apps (no Streamlit dependency)
+
+pandas and xgboost are imported on first use, so pages can show their inputs
+before the model is needed.
+"""
+import functools
+import gc
+import hashlib
+import io
+import os
+import time
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+from audit_log import AUDIT_LOG
+from compiled_model import COMPILED_ENABLED, load_or_compile
+from encoder_store import load_encoder
+from lookup_table import find_table
+from micro_batcher import BATCHING_ENABLED, batcher_for
+from perf_metrics import observe, stage_timer
+from prediction_cache import PREDICTION_CACHE
+
+# File names inside an artifact bundle written by train_model.py
+BUNDLE_FILES = {"model": "model.ubj", "device_encoder": "le_device.pkl", "manuf_encoder": "le_manuf.pkl"}
+
+
+def bundle_paths(bundle_dir):
+    """(model, device encoder, manufacturer encoder) paths inside a bundle, in load_artifacts order"""
+    return tuple(os.path.join(bundle_dir, BUNDLE_FILES[key]) for key in ("model", "device_encoder", "manuf_encoder"))
+
+
+# RISK_APP_BUNDLE serves a trained bundle instead of the shipped balanced model
+SERVING_BUNDLE = os.environ.get("RISK_APP_BUNDLE")
+if SERVING_BUNDLE:
+    MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH = bundle_paths(SERVING_BUNDLE)
+else:
+    MODEL_PATH = "xgbModel_balanced_2feat.model"
+    DEVICE_ENCODER_PATH = "le_device_balanced.pkl"
+    MANUF_ENCODER_PATH = "le_manuf_balanced.pkl"
+
+# Column names the 2-feature models were trained with
+FEATURE_COLUMNS = ['name', 'name_manufacturer']
+
+# Map model classes back to original labels (0→1, 1→2, 2→3)
+RISK_MAPPING = {0: 1, 1: 2, 2: 3}
+RISK_LEVELS = np.array([RISK_MAPPING[c] for c in sorted(RISK_MAPPING)], dtype=np.uint8)
+
+UNKNOWN_CODE = -1
+# Probability columns, in RISK_LEVELS order
+PROBABILITY_COLUMNS = ['p_high', 'p_medium', 'p_low']
+DEFAULT_CHUNK_SIZE = 100_000
+# RISK_APP_SHARED_ARTIFACTS=1 maps published encoders and model files instead (see shared_artifacts.py)
+SHARED_ARTIFACTS = os.environ.get("RISK_APP_SHARED_ARTIFACTS", "0") == "1"
+# RISK_APP_GC_FREEZE=0 keeps loaded artifacts in the garbage collector's scans (see freeze_loaded)
+GC_FREEZE = os.environ.get("RISK_APP_GC_FREEZE", "1") != "0"
+
+# Content hash of the file each loaded model came from
+_MODEL_VERSIONS = weakref.WeakKeyDictionary()
+# Precomputed lookup tables (see lookup_table.py) that replace XGBoost calls for a model
+_LOOKUP_TABLES = weakref.WeakKeyDictionary()
+# Interval grids (see compiled_model.py) used when no lookup table has been built
+_COMPILED_GRIDS = weakref.WeakKeyDictionary()
+# Seconds spent in each loading stage of this process, in the order they ran
+STARTUP_TIMINGS = {}
+# (model, le_device, le_manuf) per load_artifacts arguments, once loaded
+_LOADED = {}
+# Keys freeze_loaded has already frozen the heap for
+_FROZEN = set()
+
+
+def _record_startup(stage, started):
+    elapsed = time.perf_counter() - started
+    STARTUP_TIMINGS[stage] = STARTUP_TIMINGS.get(stage, 0.0) + elapsed
+    observe(f"load.{stage.replace(' ', '_')}", elapsed)
+
+
+def read_encoders(device_encoder_path=DEVICE_ENCODER_PATH, manuf_encoder_path=MANUF_ENCODER_PATH):
+    """Load the label encoders from their compact copies (uncached, see load_encoders)"""
+    started = time.perf_counter()
+    if SHARED_ARTIFACTS:
+        from shared_artifacts import attach_encoders
+
+        le_device, le_manuf = attach_encoders(device_encoder_path, manuf_encoder_path)
+    else:
+        le_device = EncoderIndex(load_encoder(device_encoder_path))
+        le_manuf = EncoderIndex(load_encoder(manuf_encoder_path))
+    _record_startup("encoders", started)
+    return le_device, le_manuf
+
+
+@functools.lru_cache(maxsize=None)
+def load_encoders(device_encoder_path=DEVICE_ENCODER_PATH, manuf_encoder_path=MANUF_ENCODER_PATH):
+    """Load the label encoders from their compact copies (once per process)"""
+    return read_encoders(device_encoder_path, manuf_encoder_path)
+
+
+def read_model(model_path=MODEL_PATH):
+    """Load an XGBoost model from disk (uncached, see load_model)"""
+    started = time.perf_counter()
+    from xgboost import XGBClassifier
+
+    model = XGBClassifier()
+    model.load_model(model_path)
+    _MODEL_VERSIONS[model] = file_version(model_path)
+    _record_startup("model", started)
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def load_model(model_path=MODEL_PATH):
+    """Load an XGBoost model from disk (once per process)"""
+    return read_model(model_path)
+
+
+def read_artifacts(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                   manuf_encoder_path=MANUF_ENCODER_PATH, cached=False):
+    """Load a model and its label encoders from disk and register their fast path
+
+    Nothing is cached unless ``cached`` (load_artifacts) is set, so the
+    objects are freed with their last reference, e.g. a swapped-out
+    deployment (see model_registry.prepare_deployment).
+    """
+    if SHARED_ARTIFACTS:
+        from shared_artifacts import attach_artifacts
+
+        started = time.perf_counter()
+        model, le_device, le_manuf = attach_artifacts(model_path, device_encoder_path, manuf_encoder_path)
+        _record_startup("shared artifacts", started)
+        return model, le_device, le_manuf
+    if cached:
+        le_device, le_manuf = load_encoders(device_encoder_path, manuf_encoder_path)
+        model = load_model(model_path)
+    else:
+        le_device, le_manuf = read_encoders(device_encoder_path, manuf_encoder_path)
+        model = read_model(model_path)
+    started = time.perf_counter()
+    version = _MODEL_VERSIONS[model]
+    table = find_table(version, le_device.digest, le_manuf.digest)
+    register_fast_path(model, version, table=table,
+                       grid=load_or_compile(model, version) if table is None and COMPILED_ENABLED else None)
+    _record_startup("fast path", started)
+    return model, le_device, le_manuf
+
+
+@functools.lru_cache(maxsize=None)
+def load_artifacts(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                   manuf_encoder_path=MANUF_ENCODER_PATH):
+    """Load a model and its label encoders from disk (once per process)"""
+    loaded = read_artifacts(model_path, device_encoder_path, manuf_encoder_path, cached=True)
+    _LOADED[(model_path, device_encoder_path, manuf_encoder_path)] = loaded
+    return loaded
+
+
+def loaded_artifacts(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                     manuf_encoder_path=MANUF_ENCODER_PATH):
+    """What load_artifacts returned for these paths, or None if it has not run yet"""
+    return _LOADED.get((model_path, device_encoder_path, manuf_encoder_path))
+
+
+def freeze_loaded(key):
+    """Move every object alive now out of the garbage collector's scans, once per key
+
+    Streamlit runs a full gc.collect() after each script and fragment run, and
+    that walks every tracked object in the process: the imported libraries,
+    encoders, vocabularies and search indexes. Freezing them once they are
+    loaded leaves each collection with only what the run itself allocated.
+    A new key unfreezes the heap before collecting, so the cycles of a
+    swapped-out deployment are not kept in the frozen generation for good.
+    """
+    if not GC_FREEZE or key in _FROZEN:
+        return
+    _FROZEN.add(key)
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def register_fast_path(model, version, table=None, grid=None):
+    """Record a model's version and the lookup table or interval grid that serves it"""
+    _MODEL_VERSIONS[model] = version
+    if table is not None:
+        _LOOKUP_TABLES[model] = table
+    if grid is not None:
+        _COMPILED_GRIDS[model] = grid
+
+
+def file_version(model_path):
+    """Content hash of a model file; model_version reports the same value once it is loaded"""
+    with open(model_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+@functools.lru_cache(maxsize=32)
+def _file_version(path, mtime_ns, size):
+    return file_version(path)
+
+
+def bundle_version(paths):
+    """Content key of a (model, device encoder, manufacturer encoder) bundle, read without loading it
+
+    Each file is hashed once per size and modification time.
+    """
+    parts = []
+    for path in paths:
+        st = os.stat(path)
+        parts.append(_file_version(path, st.st_mtime_ns, st.st_size)[:8])
+    return "-".join(parts)
+
+
+def model_version(model):
+    """Identifier of the model file a model was loaded from"""
+    return _MODEL_VERSIONS.get(model) or f"id-{id(model):x}"
+
+
+def has_fast_path(model):
+    """Whether predictions for a model are array lookups rather than XGBoost calls"""
+    return model in _LOOKUP_TABLES or model in _COMPILED_GRIDS
+
+
+def batching_applies(model):
+    """Whether misses for a model go through its micro-batcher
+
+    Only without a fast path: a lookup table or interval grid answers a row in
+    microseconds, so queueing it for a batch would only add the wait.
+    """
+    return BATCHING_ENABLED and not has_fast_path(model)
+
+
+def normalize_name(name):
+    """Collapse repeated and surrounding whitespace in a device or manufacturer name"""
+    return " ".join(name.split())
+
+
+class EncoderIndex:
+    """LabelEncoder wrapper with a precomputed name → code hash index
+
+    Looking a name up in ``classes_`` scans the whole array and ``transform``
+    then searches it again. The index is built once at load time, and gives the
+    same codes as ``transform`` with -1 for unknown names. Matching is exact:
+    the whitespace-normalized names shown in the autocomplete lists are
+    resolved by their Vocabulary, not here.
+    """
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.classes_ = encoder.classes_
+        # classes_ is sorted and unique, so a name's position is its transform() code
+        names = self.classes_.tolist()
+        self._codes = {name: code for code, name in enumerate(names)}
+        self._index = None  # pandas hash index, built on the first vectorized encode
+        self._digest = None
+
+    @property
+    def digest(self):
+        """Content hash of classes_, used to key artifacts derived from this encoder"""
+        if self._digest is None:
+            digest = hashlib.sha1()
+            for name in self.classes_.tolist():
+                digest.update(str(name).encode("utf-8") + b"\0")
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def __len__(self):
+        return len(self.classes_)
+
+    def __contains__(self, name):
+        return self.code(name) != UNKNOWN_CODE
+
+    def code(self, name):
+        """Encode a single name, returning -1 when it is unknown"""
+        try:
+            return self._codes.get(name, UNKNOWN_CODE)
+        except TypeError:  # unhashable input can never be a known class
+            return UNKNOWN_CODE
+
+    def encode(self, names):
+        """Encode many names at once, returning -1 for unknown ones"""
+        import pandas as pd
+
+        if self._index is None:
+            self._index = pd.Index(self.classes_, dtype=object)
+        names = np.asarray(names, dtype=object)
+        return self._index.get_indexer(pd.Index(names, dtype=object)).astype(np.int32, copy=False)
+
+    def transform(self, names):
+        return self.encoder.transform(names)
+
+    def inverse_transform(self, codes):
+        return self.encoder.inverse_transform(codes)
+
+
+def as_index(encoder):
+    """Return encoder as an EncoderIndex, wrapping raw LabelEncoders"""
+    return encoder if isinstance(encoder, EncoderIndex) else EncoderIndex(encoder)
+
+
+def encode_column(values, encoder):
+    """Encode a whole column of names at once, mapping unknown names to -1"""
+    return as_index(encoder).encode(values)
+
+
+def predict_codes(model, device_codes, manuf_codes, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Predict risk levels (1-3) for arrays of encoded device/manufacturer codes"""
+    device_codes = np.asarray(device_codes)
+    manuf_codes = np.asarray(manuf_codes)
+    table = _LOOKUP_TABLES.get(model)
+    if table is not None:
+        # Every pair was scored offline: one array index per row, no XGBoost call
+        with stage_timer("predict.lookup_table"):
+            return np.asarray(table.lookup_many(device_codes, manuf_codes), dtype=np.uint8)
+    grid = _COMPILED_GRIDS.get(model)
+    if grid is not None:
+        # Two searchsorted calls into the compiled split intervals, same classes as the booster
+        with stage_timer("predict.compiled_grid"):
+            return grid.lookup_many(device_codes, manuf_codes)
+    n_rows = len(device_codes)
+    levels = np.empty(n_rows, dtype=np.uint8)
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        # One contiguous float32 block per chunk avoids the DataFrame→DMatrix conversion
+        features = np.empty((stop - start, 2), dtype=np.float32)
+        features[:, 0] = device_codes[start:stop]
+        features[:, 1] = manuf_codes[start:stop]
+        with stage_timer("predict.xgboost"):
+            levels[start:stop] = RISK_LEVELS[model.predict(features)]
+    return levels
+
+
+class Prediction(namedtuple("Prediction", ["risk_level", "probabilities"])):
+    """Risk level (1-3) and class probabilities (in RISK_LEVELS order) for one pair"""
+    __slots__ = ()
+
+    @property
+    def confidence(self):
+        """Probability of the predicted risk level"""
+        return max(self.probabilities)
+
+
+def _proba_grid(model):
+    """The interval grid that serves a model's probabilities, compiled on first use behind a lookup table"""
+    grid = _COMPILED_GRIDS.get(model)
+    if grid is None and model in _LOOKUP_TABLES and COMPILED_ENABLED:
+        # Tables only store levels; the grid is cached on disk, so this is paid once per model
+        grid = load_or_compile(model, model_version(model))
+        if grid is not None:
+            _COMPILED_GRIDS[model] = grid
+    return grid
+
+
+def predict_proba_codes(model, device_codes, manuf_codes, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Risk levels and class probabilities (one column per RISK_LEVELS entry) from one model pass"""
+    device_codes = np.asarray(device_codes)
+    manuf_codes = np.asarray(manuf_codes)
+    grid = _proba_grid(model)
+    if grid is not None:
+        with stage_timer("predict_proba.compiled_grid"):
+            cells = grid.cells(device_codes, manuf_codes)
+            return grid.levels[cells], grid.proba[cells]
+    n_rows = len(device_codes)
+    levels = np.empty(n_rows, dtype=np.uint8)
+    proba = np.empty((n_rows, len(RISK_LEVELS)), dtype=np.float32)
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        features = np.empty((stop - start, 2), dtype=np.float32)
+        features[:, 0] = device_codes[start:stop]
+        features[:, 1] = manuf_codes[start:stop]
+        with stage_timer("predict_proba.xgboost"):
+            proba[start:stop] = model.predict_proba(features)
+        # argmax of the probabilities is exactly what model.predict returns
+        levels[start:stop] = RISK_LEVELS[np.argmax(proba[start:stop], axis=1)]
+    return levels, proba
+
+
+def predict_pairs(model, device_codes, manuf_codes):
+    """Prediction tuples for arrays of encoded pairs"""
+    levels, proba = predict_proba_codes(model, device_codes, manuf_codes)
+    return [Prediction(level, tuple(p)) for level, p in zip(levels.tolist(), proba.tolist())]
+
+
+def predict_pair_proba(model, device_code, manuf_code):
+    """Prediction (risk level and probabilities) for one encoded pair, memoized per model version"""
+    # The version is read from the model that scores a miss, so an entry always matches its key
+    key = (model_version(model), int(device_code), int(manuf_code))
+    prediction = PREDICTION_CACHE.get(key)
+    if prediction is None:
+        if batching_applies(model):
+            # Merge with concurrent sessions' requests into one vectorized model call
+            prediction = batcher_for(model, predict_pairs).predict(key[1], key[2])
+        else:
+            prediction = predict_pairs(model, [key[1]], [key[2]])[0]
+        PREDICTION_CACHE.put(key, prediction)
+    return prediction
+
+
+def assess_pair(model, device_name, manufacturer_name, device_code, manuf_code):
+    """One assessment: the memoized prediction for an encoded pair, recorded in the audit log
+
+    The apps' predict_risk and the scoring service's /predict both go through here.
+    """
+    prediction = predict_pair_proba(model, device_code, manuf_code)
+    # Queued for the audit log's background writer; nothing is written on this path
+    AUDIT_LOG.record(device_name, manufacturer_name, device_code, manuf_code, prediction.risk_level,
+                     model_version(model))
+    return prediction
+
+
+def predict_pair(model, device_code, manuf_code):
+    """Predict the risk level for one encoded pair, memoized per model version"""
+    return predict_pair_proba(model, device_code, manuf_code).risk_level
+
+
+def _grouped_level_counts(levels, n_groups):
+    """(n_groups, len(RISK_LEVELS)) counts from a (rows, n_groups) block of risk levels"""
+    slots = np.asarray(levels, dtype=np.intp) - 1 + len(RISK_LEVELS) * np.arange(n_groups, dtype=np.intp)
+    return np.bincount(slots.ravel(), minlength=n_groups * len(RISK_LEVELS)).reshape(n_groups, len(RISK_LEVELS))
+
+
+def cross_level_counts(model, device_codes, manuf_codes, chunk_size=DEFAULT_CHUNK_SIZE * 40):
+    """Risk level counts (columns in RISK_LEVELS order) per manufacturer over every device x manufacturer pair
+
+    Row i counts the levels of all device_codes paired with manuf_codes[i],
+    exactly as predict_codes would score them, without materializing the
+    cross product when a fast path serves the model.
+    """
+    device_codes = np.asarray(device_codes, dtype=np.int64)
+    manuf_codes = np.asarray(manuf_codes, dtype=np.int64)
+    n_devices, n_manuf = len(device_codes), len(manuf_codes)
+    counts = np.zeros((n_manuf, len(RISK_LEVELS)), dtype=np.int64)
+    if n_devices == 0 or n_manuf == 0:
+        return counts
+    block = max(1, chunk_size // n_devices)
+    table = _LOOKUP_TABLES.get(model)
+    if table is not None:
+        with stage_timer("cross_counts.lookup_table"):
+            rows = (device_codes + 1)[:, None]
+            for start in range(0, n_manuf, block):
+                cols = manuf_codes[start:start + block] + 1
+                counts[start:start + len(cols)] = _grouped_level_counts(table.table[rows, cols[None, :]], len(cols))
+        return counts
+    grid = _COMPILED_GRIDS.get(model)
+    if grid is not None:
+        # Devices only matter through their grid row: count them per row once, then weigh each row's levels
+        with stage_timer("cross_counts.compiled_grid"):
+            rows, cols = grid.cells(device_codes, manuf_codes)
+            row_counts = np.bincount(rows, minlength=grid.levels.shape[0])
+            levels = grid.levels[:, cols]
+            for i, level in enumerate(RISK_LEVELS):
+                counts[:, i] = row_counts @ (levels == level)
+        return counts
+    for start in range(0, n_manuf, block):
+        manuf_block = manuf_codes[start:start + block]
+        levels = predict_codes(model, np.tile(device_codes, len(manuf_block)), np.repeat(manuf_block, n_devices))
+        counts[start:start + len(manuf_block)] = _grouped_level_counts(
+            levels.reshape(len(manuf_block), n_devices).T, len(manuf_block))
+    return counts
+
+
+def predict_risk_batch(device_names, manufacturer_names, model, le_device, le_manuf,
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+    """Predict risk levels for many device/manufacturer pairs in one pass"""
+    device_codes = encode_column(device_names, le_device)
+    manuf_codes = encode_column(manufacturer_names, le_manuf)
+    return predict_codes(model, device_codes, manuf_codes, chunk_size=chunk_size)
+
+
+def score_frame(df, model, le_device, le_manuf, device_col='name', manuf_col='name_manufacturer',
+                chunk_size=DEFAULT_CHUNK_SIZE, probabilities=False):
+    """Return a copy of df with encoded codes and a predicted risk_level column
+
+    With probabilities=True the same model pass also fills PROBABILITY_COLUMNS
+    and a confidence column (the probability of the predicted level).
+    """
+    scored = df.copy()
+    scored['device_code'] = encode_column(df[device_col], le_device)
+    scored['manufacturer_code'] = encode_column(df[manuf_col], le_manuf)
+    device_codes = scored['device_code'].to_numpy()
+    manuf_codes = scored['manufacturer_code'].to_numpy()
+    if not probabilities:
+        scored['risk_level'] = predict_codes(model, device_codes, manuf_codes, chunk_size=chunk_size)
+        return scored
+    levels, proba = predict_proba_codes(model, device_codes, manuf_codes, chunk_size=chunk_size)
+    scored['risk_level'] = levels
+    for i, column in enumerate(PROBABILITY_COLUMNS):
+        scored[column] = proba[:, i]
+    scored['confidence'] = proba.max(axis=1)
+    return scored
+
+
+def iter_scored_chunks(source, model, le_device, le_manuf, device_col='name', manuf_col='name_manufacturer',
+                       chunk_size=DEFAULT_CHUNK_SIZE, probabilities=False):
+    """Read a CSV of device/manufacturer pairs chunk by chunk, yielding scored DataFrames"""
+    import pandas as pd
+
+    reader = pd.read_csv(source, chunksize=chunk_size, dtype={device_col: object, manuf_col: object})
+    for chunk in reader:
+        missing = {device_col, manuf_col} - set(chunk.columns)
+        if missing:
+            raise ValueError(f"CSV is missing required column(s): {', '.join(sorted(missing))}")
+        yield score_frame(chunk, model, le_device, le_manuf, device_col, manuf_col, chunk_size, probabilities)
+
+
+def score_csv(source, model, le_device, le_manuf, device_col='name', manuf_col='name_manufacturer',
+              chunk_size=DEFAULT_CHUNK_SIZE, probabilities=False):
+    """Score a CSV of device/manufacturer pairs chunk by chunk, yielding scored CSV text"""
+    header = True
+    for scored in iter_scored_chunks(source, model, le_device, le_manuf, device_col, manuf_col, chunk_size,
+                                     probabilities):
+        buffer = io.StringIO()
+        scored.to_csv(buffer, index=False, header=header)
+        header = False
+        yield buffer.getvalue()
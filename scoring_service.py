@@ -0,0 +1,276 @@
+"""Headless HTTP/JSON scoring service
+
+Serves the same model, encoders and prediction logic as the Streamlit apps
+without a browser session:
+
+    python scoring_service.py --port 8000 --workers 4
+
+Routes:
+
+    GET  /health            model version and batching/cache statistics
+    GET  /metrics           per-stage latencies in the Prometheus text format
+    POST /predict           {"device_name": ..., "manufacturer_name": ...}
+    POST /predict/batch     {"device_names": [...], "manufacturer_names": [...]}
+                            or {"items": [{"device_name": ..., "manufacturer_name": ...}, ...]}
+
+Both prediction routes return the risk level together with the class
+probabilities (high, medium, low) and the confidence of the predicted level,
+all from one predict_proba pass.
+
+/predict goes through the same prediction cache and audit log as the apps
+(risk_engine.assess_pair). When a fast path serves the model it is answered
+on the event loop. Otherwise it runs on the worker pool, where concurrent
+misses are micro-batched (micro_batcher.py): queued for at most
+``--max-wait-ms``, or until ``--max-batch`` rows are waiting, and scored
+with one vectorized model call.
+
+``--shadow BUNDLE`` (repeatable, see model_compare.py) also scores all
+traffic with candidate models in a background thread; /health reports how
+often they disagree with the serving model and what they cost.
+
+The service serves the model files it was started with. Unlike the apps
+it does not follow the model registry's active version (model_registry.py),
+so it has to be restarted with the new bundle's paths to pick one up.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from micro_batcher import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT_MS, batcher_for, batcher_stats
+from perf_metrics import STAGE_METRICS
+from prediction_cache import PREDICTION_CACHE
+from risk_engine import (MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, assess_pair, batching_applies,
+                         has_fast_path, load_artifacts, model_version, predict_pairs, predict_proba_codes)
+
+logger = logging.getLogger("scoring_service")
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+RISK_LABELS = {1: "HIGH RISK", 2: "MEDIUM RISK", 3: "LOW RISK"}
+PROBABILITY_KEYS = ("high", "medium", "low")  # RISK_LEVELS order
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class TextResponse(str):
+    """A plain-text response body instead of JSON"""
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ScoringService:
+    """Request handling on top of a loaded model and encoders"""
+
+    def __init__(self, model, le_device, le_manuf, workers=4, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, shadow=None):
+        self.model = model
+        self.le_device = le_device
+        self.le_manuf = le_manuf
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scoring")
+        if batching_applies(model):
+            # Created with the service's settings; assess_pair then finds this batcher for the model
+            batcher_for(model, predict_pairs, max_batch, max_wait_ms)
+        self.shadow = shadow  # model_compare.ShadowScorer, fed every scored request
+        self.started = time.time()
+
+    async def predict_one(self, payload):
+        try:
+            device_name = payload["device_name"]
+            manufacturer_name = payload["manufacturer_name"]
+        except (KeyError, TypeError):
+            raise HTTPError(400, "expected device_name and manufacturer_name")
+        if not isinstance(device_name, str) or not isinstance(manufacturer_name, str):
+            raise HTTPError(400, "device_name and manufacturer_name must be strings")
+        device_code = self.le_device.code(device_name)
+        manuf_code = self.le_manuf.code(manufacturer_name)
+
+        if has_fast_path(self.model):
+            prediction = assess_pair(self.model, device_name, manufacturer_name, device_code, manuf_code)
+        else:
+            # A model call (batched with concurrent misses) must not block the event loop
+            prediction = await asyncio.get_running_loop().run_in_executor(
+                self.executor, assess_pair, self.model, device_name, manufacturer_name, device_code, manuf_code)
+        if self.shadow is not None:
+            self.shadow.submit([device_name], [manufacturer_name])
+        return {"device_name": device_name, "manufacturer_name": manufacturer_name,
+                "device_code": device_code, "manufacturer_code": manuf_code,
+                "risk_level": prediction.risk_level, "label": RISK_LABELS[prediction.risk_level],
+                "probabilities": dict(zip(PROBABILITY_KEYS, prediction.probabilities)),
+                "confidence": prediction.confidence}
+
+    async def predict_batch(self, payload):
+        if isinstance(payload, dict) and "items" in payload:
+            try:
+                device_names = [item["device_name"] for item in payload["items"]]
+                manufacturer_names = [item["manufacturer_name"] for item in payload["items"]]
+            except (KeyError, TypeError):
+                raise HTTPError(400, "every item needs device_name and manufacturer_name")
+        else:
+            try:
+                device_names = payload["device_names"]
+                manufacturer_names = payload["manufacturer_names"]
+            except (KeyError, TypeError):
+                raise HTTPError(400, "expected items or device_names/manufacturer_names")
+        if not isinstance(device_names, list) or not isinstance(manufacturer_names, list) \
+                or len(device_names) != len(manufacturer_names):
+            raise HTTPError(400, "device_names and manufacturer_names must be lists of the same length")
+        if not all(isinstance(name, str) for names in (device_names, manufacturer_names) for name in names):
+            raise HTTPError(400, "device and manufacturer names must be strings")
+
+        loop = asyncio.get_running_loop()
+        levels, proba = await loop.run_in_executor(self.executor, self._score_names, device_names,
+                                                   manufacturer_names)
+        if self.shadow is not None:
+            self.shadow.submit(device_names, manufacturer_names)
+        return {"count": len(levels), "risk_levels": levels.tolist(),
+                "probabilities": {key: proba[:, i].tolist() for i, key in enumerate(PROBABILITY_KEYS)},
+                "confidences": proba.max(axis=1).tolist()}
+
+    def _score_names(self, device_names, manufacturer_names):
+        device_codes = self.le_device.encode(device_names)
+        manuf_codes = self.le_manuf.encode(manufacturer_names)
+        return predict_proba_codes(self.model, device_codes, manuf_codes)
+
+    def health(self):
+        health = {"status": "ok", "model_version": model_version(self.model),
+                  "uptime_seconds": round(time.time() - self.started, 1),
+                  "batching": batcher_stats(self.model), "prediction_cache": PREDICTION_CACHE.stats()}
+        if self.shadow is not None:
+            health["shadow"] = self.shadow.report()
+        return health
+
+    async def dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            return self.health()
+        if path == "/metrics":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            return TextResponse(STAGE_METRICS.prometheus_text())
+        if path in ("/predict", "/predict/batch"):
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise HTTPError(400, "body is not valid JSON")
+            if path == "/predict":
+                return await self.predict_one(payload)
+            return await self.predict_batch(payload)
+        raise HTTPError(404, f"no route for {path}")
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection, keeping it alive between requests"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, {"error": "headers too large"}, keep_alive=False)
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    return
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+
+                try:
+                    status, result = 200, await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, result = e.status, {"error": str(e)}
+                except Exception as e:
+                    logger.exception("Error handling %s %s", method, target)
+                    status, result = 500, {"error": f"Error in prediction: {e}"}
+                await self._respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, result, keep_alive=True):
+        if isinstance(result, TextResponse):
+            body, content_type = result.encode("utf-8"), result.content_type
+        else:
+            body, content_type = json.dumps(result).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host, port, service):
+    server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                        reuse_address=True)
+    addresses = ", ".join(str(s.getsockname()) for s in server.sockets)
+    logger.info("Scoring service (model %s) listening on %s", model_version(service.model), addresses)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON scoring service for the risk model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4, help="threads running model calls")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="rows per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="longest a request waits for its batch")
+    parser.add_argument("--model", default=MODEL_PATH, help="served as-is; the registry is not followed")
+    parser.add_argument("--device-encoder", default=DEVICE_ENCODER_PATH)
+    parser.add_argument("--manuf-encoder", default=MANUF_ENCODER_PATH)
+    parser.add_argument("--shadow", action="append", metavar="BUNDLE",
+                        help="also score traffic with this bundle in the background (see model_compare.py)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    model, le_device, le_manuf = load_artifacts(args.model, args.device_encoder, args.manuf_encoder)
+    shadow = None
+    if args.shadow:
+        from model_compare import ModelBundle, ModelComparison, ShadowScorer, load_bundle, parse_bundle
+
+        bundles = [ModelBundle("serving", model, le_device, le_manuf)]
+        bundles += [load_bundle(*parse_bundle(spec)) for spec in args.shadow]
+        shadow = ShadowScorer(ModelComparison(bundles))
+    service = ScoringService(model, le_device, le_manuf, workers=args.workers,
+                             max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, shadow=shadow)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Server-side search over device and manufacturer names
+
+Prefix matches come from a bisect over the sorted, case-folded names. When
+there are not enough of them, a trigram inverted index adds fuzzy matches
+ranked by Jaccard similarity, which also catches typos and substrings.
+
+An index can be saved as string tables and flat arrays and loaded back
+memory-mapped, so several processes share one copy (see shared_artifacts).
+"""
+import bisect
+
+import numpy as np
+
+from risk_engine import normalize_name
+from string_table import StringTable, write_string_table
+
+DEFAULT_LIMIT = 25
+MIN_SIMILARITY = 0.2
+
+
+def _search_key(text):
+    return normalize_name(text).casefold()
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Postings:
+    """Read-only gram -> positions mapping over memory-mapped CSR arrays"""
+
+    def __init__(self, grams, offsets, ids):
+        self.grams = grams  # sorted StringTable
+        self.offsets = offsets
+        self.ids = ids
+
+    def _find(self, gram):
+        i = bisect.bisect_left(self.grams, gram)
+        return i if i < len(self.grams) and self.grams[i] == gram else None
+
+    def __contains__(self, gram):
+        return self._find(gram) is not None
+
+    def __getitem__(self, gram):
+        i = self._find(gram)
+        if i is None:
+            raise KeyError(gram)
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+
+class SearchIndex:
+    """Top-k prefix and fuzzy lookup over a fixed list of names"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        keys = [_search_key(n) for n in self.names]
+        # Sorted keys for prefix bisects, mapped back to positions in names
+        self._order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._sorted_keys = [keys[i] for i in self._order]
+
+        postings = {}
+        self._gram_counts = np.empty(len(keys), dtype=np.int32)
+        for i, key in enumerate(keys):
+            grams = _trigrams(key)
+            self._gram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix(self, query, limit=DEFAULT_LIMIT):
+        """Positions of names starting with query, in sorted order"""
+        key = _search_key(query)
+        lo = bisect.bisect_left(self._sorted_keys, key)
+        hi = bisect.bisect_left(self._sorted_keys, key + "\U0010ffff", lo)
+        return self._order[lo:min(hi, lo + limit)]
+
+    def fuzzy(self, query, limit=DEFAULT_LIMIT, min_similarity=MIN_SIMILARITY):
+        """Positions of names sharing the most trigrams with query, best first"""
+        grams = _trigrams(_search_key(query))
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(grams) + self._gram_counts[candidates] - shared[candidates])
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            candidates, similarity = candidates[top], similarity[top]
+        # Best similarity first, ties in name order
+        order = np.lexsort((candidates, -similarity))
+        return candidates[order].tolist()
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Top matching names for a partially typed query: prefix matches, then fuzzy ones"""
+        if not query or not query.strip():
+            return self.names[:limit]
+        positions = list(self.prefix(query, limit))
+        if len(positions) < limit:
+            seen = set(positions)
+            positions += [p for p in self.fuzzy(query, limit) if p not in seen][:limit - len(positions)]
+        return [self.names[p] for p in positions]
+
+    def save(self, prefix):
+        """Write the index as string tables and .npy arrays under prefix"""
+        write_string_table(prefix + ".names", list(self.names))
+        write_string_table(prefix + ".keys", list(self._sorted_keys))
+        grams = sorted(self._postings)
+        write_string_table(prefix + ".grams", grams)
+        lengths = [len(self._postings[g]) for g in grams]
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.concatenate([self._postings[g] for g in grams]) if grams else np.empty(0, dtype=np.int32)
+        np.save(prefix + ".postings.npy", ids.astype(np.int32, copy=False))
+        np.save(prefix + ".posting_offsets.npy", offsets)
+        np.save(prefix + ".gram_counts.npy", self._gram_counts)
+        np.save(prefix + ".order.npy", np.asarray(self._order, dtype=np.int32))
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        """Load a saved index; with mmap, its arrays and strings stay in the shared page cache"""
+        mode = "r" if mmap else None
+        index = cls.__new__(cls)
+        index.names = StringTable(prefix + ".names", mmap)
+        index._sorted_keys = StringTable(prefix + ".keys", mmap)
+        index._order = np.load(prefix + ".order.npy", mmap_mode=mode)
+        index._gram_counts = np.load(prefix + ".gram_counts.npy", mmap_mode=mode)
+        index._postings = _Postings(StringTable(prefix + ".grams", mmap),
+                                    np.load(prefix + ".posting_offsets.npy", mmap_mode=mode),
+                                    np.load(prefix + ".postings.npy", mmap_mode=mode))
+        return index
@@ -0,0 +1,253 @@
+"""Artifacts shared zero-copy between several app processes
+
+With RISK_APP_SHARED_ARTIFACTS=1, every Streamlit worker behind a load
+balancer maps the same files instead of holding its own copy of the
+encoders, the model and the search indexes. One loader publishes them once:
+
+    python shared_artifacts.py publish --data "data csv/final_merged_dataset.csv"
+
+(the first worker publishes whatever is missing too). Everything is written
+as .npy arrays and string tables under ``.cache/shared/`` and swapped in
+atomically, and the workers memory-map it read-only. The pages live in the
+OS page cache once, however many workers attach, and attaching takes a few
+file opens instead of unpickling and rebuilding.
+
+Published per model and encoder pair:
+
+* the encoder classes plus a sorted 128-bit fingerprint index (two pandas
+  hashes with different keys) for exact names, replacing the per-process
+  dict and pandas index of EncoderIndex;
+* the compiled interval grid, served through CompiledModel, so workers
+  never import XGBoost or load the booster (a precomputed lookup table is
+  still used first when one exists).
+
+Published per dataset: the search index over each autocomplete vocabulary.
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from compiled_model import CompiledModel, IntervalGrid
+from data_cache import CACHE_DIR, file_checksum, load_cached_columns
+from encoder_store import load_encoder
+from lookup_table import find_table
+from risk_engine import (DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, MODEL_PATH, UNKNOWN_CODE, EncoderIndex,
+                         file_version, load_model, register_fast_path)
+from search_index import SearchIndex
+from string_table import StringTable, write_string_table
+from vocabulary import load_vocabulary
+
+SHARED_DIR = os.path.join(CACHE_DIR, "shared")
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+_HASH_KEYS = ("risk-app-key-one", "risk-app-key-two")  # pandas wants 16-byte keys
+
+
+def _fingerprints(names):
+    """Two independent 64-bit hashes per string, stable across processes"""
+    import pandas as pd
+
+    values = np.asarray(names, dtype=object)
+    return tuple(pd.util.hash_array(values, encoding="utf8", hash_key=key, categorize=False) for key in _HASH_KEYS)
+
+
+def _write_fingerprint_index(prefix, names, codes):
+    """Sort (hash1, hash2, code) by hash1; refuses a hash1 collision, which bisecting could not resolve"""
+    first, second = _fingerprints(names)
+    order = np.argsort(first, kind="stable")
+    first = first[order]
+    if len(first) > 1 and (first[1:] == first[:-1]).any():
+        raise ValueError("fingerprint collision between encoder classes")
+    np.save(prefix + ".h1.npy", first)
+    np.save(prefix + ".h2.npy", second[order])
+    np.save(prefix + ".codes.npy", np.asarray(codes, dtype=np.int32)[order])
+
+
+class _FingerprintIndex:
+    """Memory-mapped name fingerprint -> code lookup"""
+
+    def __init__(self, prefix):
+        self.first = np.load(prefix + ".h1.npy", mmap_mode="r")
+        self.second = np.load(prefix + ".h2.npy", mmap_mode="r")
+        self.codes = np.load(prefix + ".codes.npy", mmap_mode="r")
+
+    def lookup(self, names):
+        if not len(self.first) or not len(names):
+            return np.full(len(names), UNKNOWN_CODE, dtype=np.int32)
+        first, second = _fingerprints(names)
+        pos = np.minimum(np.searchsorted(self.first, first), len(self.first) - 1)
+        hit = (self.first[pos] == first) & (self.second[pos] == second)
+        return np.where(hit, self.codes[pos], UNKNOWN_CODE).astype(np.int32)
+
+
+class SharedEncoderIndex(EncoderIndex):
+    """EncoderIndex over published, memory-mapped files (same codes, no per-process index)"""
+
+    def __init__(self, prefix, digest):
+        self.classes_ = StringTable(prefix + ".classes")
+        self.encoder = self
+        self._exact = _FingerprintIndex(prefix + ".exact")
+        self._digest = digest
+
+    def code(self, name):
+        """Encode a single name by bisecting the sorted classes (cheaper than hashing one name)"""
+        if not isinstance(name, str):
+            return UNKNOWN_CODE
+        i = bisect.bisect_left(self.classes_, name)
+        return i if i < len(self.classes_) and self.classes_[i] == name else UNKNOWN_CODE
+
+    def encode(self, names):
+        names = np.asarray(names, dtype=object)
+        codes = np.full(len(names), UNKNOWN_CODE, dtype=np.int32)
+        strings = np.flatnonzero([isinstance(n, str) for n in names])
+        if not len(strings):
+            return codes
+        codes[strings] = self._exact.lookup(names[strings])
+        return codes
+
+    def transform(self, names):
+        codes = self.encode(names)
+        if (codes == UNKNOWN_CODE).any():
+            unseen = np.asarray(names, dtype=object)[codes == UNKNOWN_CODE]
+            raise ValueError(f"y contains previously unseen labels: {unseen.tolist()}")
+        return codes
+
+    def inverse_transform(self, codes):
+        codes = np.asarray(codes)
+        unseen = (codes < 0) | (codes >= len(self.classes_))
+        if unseen.any():
+            raise ValueError(f"y contains previously unseen labels: {codes[unseen].tolist()}")
+        return np.array([self.classes_[c] for c in codes], dtype=object)
+
+
+def _publish_dir(path, write):
+    """Run write(staging_dir) and move the result to path; if another process won the race, keep theirs"""
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".publishing-", dir=os.path.dirname(path))
+    os.chmod(staging, 0o755)
+    try:
+        manifest = write(staging)
+        with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(dict(manifest, format_version=FORMAT_VERSION, published_at=time.time()), f, indent=2)
+        os.replace(staging, path)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            raise
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return path
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported shared artifact format in {path}")
+    return manifest
+
+
+def artifacts_path(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                   manuf_encoder_path=MANUF_ENCODER_PATH, shared_dir=SHARED_DIR):
+    key = hashlib.sha1(json.dumps([FORMAT_VERSION, file_checksum(model_path), file_checksum(device_encoder_path),
+                                   file_checksum(manuf_encoder_path)]).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(shared_dir, "model", key)
+
+
+def _write_encoder(prefix, encoder):
+    names = encoder.classes_.tolist()
+    write_string_table(prefix + ".classes", names)
+    _write_fingerprint_index(prefix + ".exact", names, np.arange(len(names)))
+
+
+def publish_artifacts(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                      manuf_encoder_path=MANUF_ENCODER_PATH, shared_dir=SHARED_DIR):
+    """Publish the encoders and the compiled model (loads the booster, once)"""
+    def write(staging):
+        le_device = EncoderIndex(load_encoder(device_encoder_path))
+        le_manuf = EncoderIndex(load_encoder(manuf_encoder_path))
+        grid = IntervalGrid.compile(load_model(model_path))
+        _write_encoder(os.path.join(staging, "device"), le_device)
+        _write_encoder(os.path.join(staging, "manuf"), le_manuf)
+        grid.save_arrays(os.path.join(staging, "grid"))
+        return {"model_version": file_version(model_path), "device_digest": le_device.digest,
+                "manuf_digest": le_manuf.digest}
+
+    return _publish_dir(artifacts_path(model_path, device_encoder_path, manuf_encoder_path, shared_dir), write)
+
+
+def attach_encoders(device_encoder_path=DEVICE_ENCODER_PATH, manuf_encoder_path=MANUF_ENCODER_PATH,
+                    model_path=MODEL_PATH, shared_dir=SHARED_DIR):
+    """Published encoders, publishing them first if needed"""
+    path = publish_artifacts(model_path, device_encoder_path, manuf_encoder_path, shared_dir)
+    manifest = _read_manifest(path)
+    return (SharedEncoderIndex(os.path.join(path, "device"), manifest["device_digest"]),
+            SharedEncoderIndex(os.path.join(path, "manuf"), manifest["manuf_digest"]))
+
+
+def attach_artifacts(model_path=MODEL_PATH, device_encoder_path=DEVICE_ENCODER_PATH,
+                     manuf_encoder_path=MANUF_ENCODER_PATH, shared_dir=SHARED_DIR):
+    """(model, le_device, le_manuf) served from published files, publishing them first if needed"""
+    path = publish_artifacts(model_path, device_encoder_path, manuf_encoder_path, shared_dir)
+    manifest = _read_manifest(path)
+    le_device = SharedEncoderIndex(os.path.join(path, "device"), manifest["device_digest"])
+    le_manuf = SharedEncoderIndex(os.path.join(path, "manuf"), manifest["manuf_digest"])
+    grid = IntervalGrid.load_arrays(os.path.join(path, "grid"))
+    model = CompiledModel(grid)
+    version = manifest["model_version"]
+    register_fast_path(model, version, table=find_table(version, le_device.digest, le_manuf.digest), grid=grid)
+    return model, le_device, le_manuf
+
+
+def search_index_path(column_cache, column, encoder, shared_dir=SHARED_DIR):
+    key = hashlib.sha1(json.dumps([FORMAT_VERSION, column_cache.checksum, column, encoder.digest])
+                       .encode("utf-8")).hexdigest()[:16]
+    return os.path.join(shared_dir, "search", key)
+
+
+def attach_search_index(column_cache, column, encoder, shared_dir=SHARED_DIR):
+    """Memory-mapped search index over a column's vocabulary, publishing it first if needed"""
+    def write(staging):
+        vocabulary = load_vocabulary(column_cache, column, encoder)
+        SearchIndex(vocabulary.names).save(os.path.join(staging, "index"))
+        return {"data_sha256": column_cache.checksum, "column": column, "names": len(vocabulary)}
+
+    path = _publish_dir(search_index_path(column_cache, column, encoder, shared_dir), write)
+    return SearchIndex.load(os.path.join(path, "index"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish shared artifacts for multi-process serving")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="write everything the workers attach to")
+    publish.add_argument("--model", default=MODEL_PATH)
+    publish.add_argument("--device-encoder", default=DEVICE_ENCODER_PATH)
+    publish.add_argument("--manuf-encoder", default=MANUF_ENCODER_PATH)
+    publish.add_argument("--data", action="append", default=[],
+                         help="dataset path or URL whose search indexes to publish (repeatable)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    path = publish_artifacts(args.model, args.device_encoder, args.manuf_encoder)
+    print(f"Model and encoders: {path}")
+    le_device, le_manuf = attach_encoders(args.device_encoder, args.manuf_encoder, args.model)
+    for source in args.data:
+        columns = load_cached_columns(source, ['name', 'name_manufacturer'])
+        for column, encoder in (("name", le_device), ("name_manufacturer", le_manuf)):
+            attach_search_index(columns, column, encoder)
+            print(f"Search index for {column}: {search_index_path(columns, column, encoder)}")
+    print(f"Published in {time.perf_counter() - started:.2f}s; start the workers with RISK_APP_SHARED_ARTIFACTS=1")
+
+
+if __name__ == "__main__":
+    main()
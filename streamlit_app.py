@@ -1,8 +1,11 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import joblib
-from xgboost import XGBClassifier
+from risk_engine import freeze_loaded
+from model_registry import MODEL_SERVER
+from data_sources import sources_from_env
+from app_common import (assessment_panel, data_version, load_data, load_dataset_stats, load_label_encoders,
+                        load_search_indexes, risk_mix_rows, served_bundle_key)
+from admin_panel import (render_audit_log_stats, render_batching_stats, render_model_registry,
+                         render_prediction_cache_stats, render_stage_latencies, render_startup_timings)
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -190,74 +193,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 DATA_URL = 'https://github.com/thrishi0610/medical-device-risk-app/releases/download/v1/final_merged_dataset.csv'
-@st.cache_data
-def load_data():
-    """Load the dataset for autocomplete suggestions"""
-    try:
-        df = pd.read_csv(DATA_URL, low_memory=False)
-        # Get unique device names and manufacturers
-        device_names = df['name'].dropna().unique().tolist()
-        manufacturers = df['name_manufacturer'].dropna().unique().tolist()
-        return device_names, manufacturers
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return [], []
-
-@st.cache_resource
-def load_model_and_encoders():
-    """Load the trained model and label encoders"""
-    try:
-        # Load the balanced 2-feature model (properly balanced predictions)
-        model = XGBClassifier()
-        model.load_model("xgbModel_balanced_2feat.model")
-        
-        # Load balanced label encoders
-        le_device = joblib.load("le_device_balanced.pkl")
-        le_manuf = joblib.load("le_manuf_balanced.pkl")
-        
-        return model, le_device, le_manuf
-    except Exception as e:
-        st.error(f"Error loading model: {e}")
-        return None, None, None
-
-def predict_risk(device_name, manufacturer_name, model, le_device, le_manuf):
-    """Predict risk level for given device and manufacturer"""
-    try:
-        # Encode inputs
-        if device_name in le_device.classes_:
-            device_code = le_device.transform([device_name])[0]
-        else:
-            device_code = -1  # Unknown device
-        
-        if manufacturer_name in le_manuf.classes_:
-            manuf_code = le_manuf.transform([manufacturer_name])[0]
-        else:
-            manuf_code = -1  # Unknown manufacturer
-        
-        # Create sample for prediction
-        sample = pd.DataFrame([[device_code, manuf_code]], 
-                              columns=['name', 'name_manufacturer'])
-        
-        # Predict
-        pred_encoded = model.predict(sample)[0]
-        
-        # Map back to original labels (0→1, 1→2, 2→3)
-        risk_mapping = {0: 1, 1: 2, 2: 3}
-        risk_level = risk_mapping[pred_encoded]
-        
-        return risk_level
-    except Exception as e:
-        st.error(f"Error in prediction: {e}")
-        return None
-
-def get_risk_display(risk_level):
-    """Get risk level display information"""
-    risk_info = {
-        1: {"label": "HIGH RISK", "color": "red", "icon": "🔴", "description": "High risk devices require immediate attention and careful monitoring."},
-        2: {"label": "MEDIUM RISK", "color": "orange", "icon": "🟡", "description": "Medium risk devices should be monitored regularly."},
-        3: {"label": "LOW RISK", "color": "green", "icon": "🟢", "description": "Low risk devices have minimal safety concerns."}
-    }
-    return risk_info.get(risk_level, {"label": "UNKNOWN", "color": "gray", "icon": "❓", "description": "Risk level could not be determined."})
+# The bundled CSV backs the download up when there is no network and no cached copy yet
+DATA_SOURCES = tuple(sources_from_env([DATA_URL, "data csv/final_merged_dataset.csv"]))
 
 def main():
     # Professional Header
@@ -266,12 +203,23 @@ def main():
     
     # Load data and model
     with st.spinner("Loading data and model..."):
-        device_names, manufacturers = load_data()
-        model, le_device, le_manuf = load_model_and_encoders()
+        data_key = data_version(DATA_SOURCES)
+        device_names, manufacturers = load_data(DATA_SOURCES, data_key)
+        le_device, le_manuf = load_label_encoders()
+        device_index, manuf_index = load_search_indexes(DATA_SOURCES, data_key)
+        stats = load_dataset_stats(DATA_SOURCES, data_key)
     
-    if not device_names or not manufacturers or model is None:
+    if not device_names or not manufacturers or le_device is None or device_index is None:
         st.error("Failed to load required data or model. Please ensure all files are present.")
         return
+    # Keep what was just loaded out of the collection Streamlit runs after every rerun
+    freeze_loaded("startup")
+    
+    data_points = f"{stats.n_rows:,}" if stats else "n/a"
+    accuracy = f"{stats.accuracy:.0%}" if stats and stats.accuracy is not None else "n/a"
+    # Without statistics there is no mix to show, rather than a 0% one
+    distribution = ({level: f"{share:.1%}" for level, share in stats.risk_distribution().items()} if stats
+                    else dict.fromkeys((1, 2, 3), "n/a"))
     
     # Professional Sidebar Header
     st.sidebar.markdown("""
@@ -283,83 +231,32 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Professional form inputs
-    device_name = st.sidebar.selectbox(
-        "Device Name",
-        options=[""] + sorted(device_names),
-        help="Select or type to search for a device name",
-        key="device_select"
-    )
+    # Main content area
+    col1, col2 = st.columns([2, 1])
     
-    manufacturer_name = st.sidebar.selectbox(
-        "Manufacturer Name", 
-        options=[""] + sorted(manufacturers),
-        help="Select or type to search for a manufacturer",
-        key="manufacturer_select"
-    )
+    with col1:
+        st.header("Risk Assessment Results")
+        # Filled by assessment_panel, which redraws only this slot on its own reruns
+        result_slot = st.empty()
     
-    # Professional assess button
-    predict_button = st.sidebar.button("Assess Risk Level", type="primary", use_container_width=True)
+    with st.sidebar:
+        assessment_panel(DATA_SOURCES, data_key, device_index, manuf_index, result_slot)
     
     # Professional information panel
     st.sidebar.markdown("---")
-    st.sidebar.markdown("""
+    st.sidebar.markdown(f"""
     <div class="info-card">
         <h4 style="color: #1a365d; margin: 0 0 1rem 0; font-size: 1.1rem;">Platform Information</h4>
         <ul style="color: #4a5568; font-size: 0.9rem; margin: 0; padding-left: 1.2rem; line-height: 1.6;">
             <li>Start typing to search devices</li>
             <li>Use exact manufacturer names</li>
-            <li>Analysis based on 34,744+ records</li>
-            <li>90% model accuracy</li>
+            <li>Analysis based on {data_points} records</li>
+            <li>{accuracy} model accuracy</li>
             <li>FDA-compliant risk assessment</li>
         </ul>
     </div>
     """, unsafe_allow_html=True)
     
-    # Main content area
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        st.header("Risk Assessment Results")
-        
-        if predict_button and device_name and manufacturer_name:
-            with st.spinner("Analyzing device risk level..."):
-                risk_level = predict_risk(device_name, manufacturer_name, model, le_device, le_manuf)
-            
-            if risk_level:
-                risk_info = get_risk_display(risk_level)
-                
-                # Professional risk result display
-                st.markdown(f"""
-                <div class="risk-{risk_info['color']}">
-                    <h2 style="margin: 0 0 1rem 0; font-size: 1.8rem;">{risk_info['icon']} {risk_info['label']}</h2>
-                    <div style="margin: 1rem 0;">
-                        <p style="margin: 0.5rem 0; font-size: 1.1rem;"><strong>Device:</strong> {device_name}</p>
-                        <p style="margin: 0.5rem 0; font-size: 1.1rem;"><strong>Manufacturer:</strong> {manufacturer_name}</p>
-                    </div>
-                    <p style="margin: 1rem 0 0 0; font-size: 1rem; opacity: 0.95;">{risk_info['description']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Professional risk level indicator
-                st.markdown("### Risk Level Assessment")
-                
-                # Create a professional risk meter
-                risk_meter = st.progress(risk_level / 3)
-                st.markdown(f"""
-                <div style="text-align: center; margin: 1rem 0; padding: 1rem;
-                            background: #2b2b40; border-radius: 8px; border: 1px solid #333;">
-                    <p style="margin: 0; font-size: 1.1rem; color: #f5f5f5; font-weight: 600;">
-                        Risk Level: {risk_level}/3 ({risk_info['label']})
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-        elif predict_button:
-            st.warning("Please select both device name and manufacturer to assess risk level.")
-        else:
-            st.info("Enter device information in the sidebar and click 'Assess Risk Level' to begin analysis.")
-    
     with col2:
         st.header("Platform Statistics")
         
@@ -385,35 +282,51 @@ def main():
             st.markdown("""
             <div class="metric-card">
                 <h3 style="color: #99aaff; margin: 0; font-size: 1rem;">Model Accuracy</h3>
-                <h2 style="color: #ffffff; margin: 0.5rem 0; font-size: 2rem;">90%</h2>
+                <h2 style="color: #ffffff; margin: 0.5rem 0; font-size: 2rem;">{}</h2>
             </div>
-            """, unsafe_allow_html=True)
+            """.format(accuracy), unsafe_allow_html=True)
+            if stats and not stats.has_labels:
+                st.caption("Accuracy unavailable (no label column)")
             
             st.markdown("""
             <div class="metric-card">
                 <h3 style="color: #99aaff; margin: 0; font-size: 1rem;">Data Points</h3>
-                <h2 style="color: #ffffff; margin: 0.5rem 0; font-size: 2rem;">124,969</h2>
+                <h2 style="color: #ffffff; margin: 0.5rem 0; font-size: 2rem;">{}</h2>
             </div>
-            """, unsafe_allow_html=True)
+            """.format(data_points), unsafe_allow_html=True)
         
         # Professional risk level distribution
         st.markdown("### Risk Level Distribution")
-        st.markdown("""
+        st.markdown(f"""
         <div class="info-card">
             <div style="display: flex; justify-content: space-between; align-items: center; margin: 0.75rem 0; padding: 0.5rem 0; border-bottom: 1px solid #444;">
                 <span style="color: #dc2626; font-weight: 600;">High Risk</span>
-                <span style="font-weight: 700; color: #f5f5f5;">17.2%</span>
+                <span style="font-weight: 700; color: #f5f5f5;">{distribution[1]}</span>
             </div>
             <div style="display: flex; justify-content: space-between; align-items: center; margin: 0.75rem 0; padding: 0.5rem 0; border-bottom: 1px solid #444;">
                 <span style="color: #d97706; font-weight: 600;">Medium Risk</span>
-                <span style="font-weight: 700; color: #f5f5f5;">75.9%</span>
+                <span style="font-weight: 700; color: #f5f5f5;">{distribution[2]}</span>
             </div>
             <div style="display: flex; justify-content: space-between; align-items: center; margin: 0.75rem 0; padding: 0.5rem 0;">
                 <span style="color: #059669; font-weight: 600;">Low Risk</span>
-                <span style="font-weight: 700; color: #f5f5f5;">6.9%</span>
+                <span style="font-weight: 700; color: #f5f5f5;">{distribution[3]}</span>
             </div>
         </div>
         """, unsafe_allow_html=True)
+        
+        if stats:
+            st.markdown("### Risk Mix by Manufacturer")
+            rows = risk_mix_rows(served_bundle_key(), stats.digest(), stats, manufacturers)
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+    
+    # Cache and batching statistics
+    render_prediction_cache_stats()
+    deployment = MODEL_SERVER.loaded()
+    render_batching_stats(deployment.model if deployment else None)
+    render_model_registry(MODEL_SERVER.status())
+    render_startup_timings()
+    render_stage_latencies()
+    render_audit_log_stats()
     
     # Professional footer
     st.markdown("""
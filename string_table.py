@@ -0,0 +1,58 @@
+"""Flat UTF-8 string tables stored as two .npy files (blob + offsets) that can be memory-mapped"""
+import os
+
+import numpy as np
+
+
+def _paths(prefix):
+    return prefix + ".strings.npy", prefix + ".offsets.npy"
+
+
+def write_string_table(prefix, strings):
+    """Write strings as one UTF-8 blob plus an offsets array"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    blob_path, offsets_path = _paths(prefix)
+    os.makedirs(os.path.dirname(blob_path) or ".", exist_ok=True)
+    np.save(blob_path, blob)
+    np.save(offsets_path, offsets)
+
+
+def string_table_exists(prefix):
+    return all(os.path.exists(p) for p in _paths(prefix))
+
+
+class StringTable:
+    """Read-only, memory-mapped view over a string table written by write_string_table"""
+
+    def __init__(self, prefix, mmap=True):
+        blob_path, offsets_path = _paths(prefix)
+        mode = "r" if mmap else None
+        # Plain ndarray views over the mapping: indexing np.memmap itself is several times slower
+        self.blob = np.load(blob_path, mmap_mode=mode).view(np.ndarray)
+        self.offsets = np.load(offsets_path, mmap_mode=mode).view(np.ndarray)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:stop].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        """Decode every string in one pass over the blob"""
+        data = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def to_array(self):
+        return np.array(self.tolist(), dtype=object)
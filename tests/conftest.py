@@ -0,0 +1,33 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    # The shipped model and encoder paths are relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def booster_model():
+    """The shipped balanced model, loaded uncached so no fast path serves it"""
+    from risk_engine import MODEL_PATH, read_model
+
+    os.chdir(ROOT)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # XGBoost guesses the format of the ".model" file
+        return read_model(MODEL_PATH)
+
+
+@pytest.fixture(scope="session")
+def encoders():
+    from risk_engine import DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, read_encoders
+
+    os.chdir(ROOT)
+    return read_encoders(DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH)
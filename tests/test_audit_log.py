@@ -0,0 +1,103 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import audit_log
+from audit_log import AuditLog, CorruptSegment, decode_frame, encode_frame, iter_frames, query, segment_paths, summarize
+
+
+def records(n, start_ns=1_700_000_000 * 10**9):
+    return [(start_ns + i, f"Device {i}", f"Manufacturer {i % 3}", i, i % 3, 1 + i % 3, f"v{i % 2}")
+            for i in range(n)]
+
+
+def write_log(directory, rows, **kwargs):
+    log = AuditLog(str(directory), **kwargs)
+    for _, *fields in rows:
+        log.record(*fields)
+    log.close()
+    return log
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_frame_round_trip(compress):
+    rows = records(100)
+    frame = encode_frame(rows, compress=compress)
+    magic, flags, n, size, _ = audit_log.FRAME.unpack_from(frame)
+    assert magic == audit_log.FRAME_MAGIC and n == 100 and size == len(frame) - audit_log.FRAME.size
+    batch = decode_frame(flags, n, frame[audit_log.FRAME.size:])
+    np.testing.assert_array_equal(batch.timestamps, [r[0] for r in rows])
+    assert batch.device_names.tolist() == [r[1] for r in rows]
+    assert batch.manuf_names.tolist() == [r[2] for r in rows]
+    np.testing.assert_array_equal(batch.device_codes, [r[3] for r in rows])
+    np.testing.assert_array_equal(batch.manuf_codes, [r[4] for r in rows])
+    np.testing.assert_array_equal(batch.levels, [r[5] for r in rows])
+    assert [batch.versions[i] for i in batch.version_ids] == [r[6] for r in rows]
+
+
+def test_log_round_trip(tmp_path):
+    rows = records(10_000)
+    log = write_log(tmp_path, rows, batch_size=1000)
+    assert log.stats()["records"] == 10_000 and log.stats()["pending"] == 0
+    table = query(str(tmp_path))
+    assert table["device_name"].tolist() == [r[1] for r in rows]
+    assert table["risk_level"].tolist() == [r[5] for r in rows]
+    assert table["model_version"].tolist() == [r[6] for r in rows]
+
+    only = query(str(tmp_path), manufacturer="Manufacturer 1", levels=[2])
+    assert only["device_name"].tolist() == [r[1] for r in rows if r[2] == "Manufacturer 1" and r[5] == 2]
+
+    summary = summarize(str(tmp_path))
+    assert summary["records"] == 10_000
+    assert summary["levels"] == {level: sum(r[5] == level for r in rows) for level in (1, 2, 3)}
+    assert summary["model_versions"] == {"v0": 5_000, "v1": 5_000}
+    assert summary["errors"] == []
+
+
+def test_segments_roll_over(tmp_path):
+    write_log(tmp_path, records(5_000), batch_size=100, segment_bytes=2_000)
+    assert len(segment_paths(str(tmp_path))) > 1
+    assert len(query(str(tmp_path))) == 5_000
+
+
+def test_torn_tail_keeps_the_intact_frames(tmp_path):
+    write_log(tmp_path, records(300), batch_size=100)
+    (path,) = segment_paths(str(tmp_path))
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+    with pytest.raises(CorruptSegment):
+        list(iter_frames(path))
+    summary = summarize(str(tmp_path))
+    assert summary["records"] == 200
+    assert len(summary["errors"]) == 1
+    assert len(query(str(tmp_path))) == 200
+
+
+def test_writer_survives_unencodable_records(tmp_path):
+    log = AuditLog(str(tmp_path), flush_seconds=0.01)
+    log.record("lone \ud800 surrogate", "Manufacturer \udc00", 1, 2, 1, "v1")
+    log.record("bad code", "Manufacturer", "not a code", 2, 2, "v1")
+    log.record("after", "Manufacturer", 3, 2, 3, "v1")
+    deadline = time.monotonic() + 5
+    while log.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    log.close()
+    assert log._thread.is_alive()
+    assert log.stats()["records"] == 2 and log.stats()["dropped"] == 1
+    assert log.last_error.startswith("ValueError")
+    assert query(str(tmp_path))["device_name"].tolist() == ["lone ? surrogate", "after"]
+    # A query for the same name is encoded the same way
+    assert query(str(tmp_path), manufacturer="Manufacturer \udc00")["device_name"].tolist() == ["lone ? surrogate"]
+
+
+def test_pending_records_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_log, "MAX_PENDING", 10)
+    log = AuditLog(str(tmp_path))
+    log._thread = object()  # no writer thread; flush by hand
+    for _, *fields in records(25):
+        log.record(*fields)
+    log.close()
+    assert log.stats()["dropped"] == 15
+    assert query(str(tmp_path))["device_name"].tolist() == [f"Device {i}" for i in range(15, 25)]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from compiled_model import CompiledModel, IntervalGrid, load_or_compile
+
+
+@pytest.fixture(scope="module")
+def grid(booster_model):
+    return IntervalGrid.compile(booster_model)
+
+
+def random_pairs(encoders, n=50_000, seed=0):
+    le_device, le_manuf = encoders
+    rng = np.random.default_rng(seed)
+    # Unknown (-1) and out-of-vocabulary codes fall in the outer cells
+    device_codes = rng.integers(-1, len(le_device) + 10, n).astype(np.int32)
+    manuf_codes = rng.integers(-1, len(le_manuf) + 10, n).astype(np.int32)
+    return device_codes, manuf_codes
+
+
+def features(device_codes, manuf_codes):
+    return np.column_stack([device_codes, manuf_codes]).astype(np.float32)
+
+
+def test_grid_probabilities_are_bit_identical_to_the_booster(booster_model, grid, encoders):
+    device_codes, manuf_codes = random_pairs(encoders)
+    expected = booster_model.predict_proba(features(device_codes, manuf_codes))
+    np.testing.assert_array_equal(grid.proba_many(device_codes, manuf_codes), expected)
+
+
+def test_grid_levels_match_the_booster(booster_model, grid, encoders):
+    from risk_engine import RISK_LEVELS
+
+    device_codes, manuf_codes = random_pairs(encoders, seed=1)
+    expected = RISK_LEVELS[booster_model.predict(features(device_codes, manuf_codes))]
+    np.testing.assert_array_equal(grid.lookup_many(device_codes, manuf_codes), expected)
+
+
+def test_grid_cells_cover_every_threshold(booster_model, grid):
+    # The thresholds themselves and the points just below them are where a cell boundary could be off by one
+    device = np.concatenate([grid.device_thresholds, np.nextafter(grid.device_thresholds, -np.inf)])
+    manuf = np.resize(np.concatenate([grid.manuf_thresholds, np.nextafter(grid.manuf_thresholds, -np.inf)]),
+                      len(device))
+    np.testing.assert_array_equal(grid.proba_many(device, manuf),
+                                  booster_model.predict_proba(features(device, manuf)))
+
+
+def test_compiled_model_stands_in_for_the_booster(booster_model, grid, encoders):
+    X = features(*random_pairs(encoders, n=5_000, seed=2))
+    compiled = CompiledModel(grid)
+    np.testing.assert_array_equal(compiled.predict_proba(X), booster_model.predict_proba(X))
+    np.testing.assert_array_equal(compiled.predict(X), booster_model.predict(X))
+
+
+def test_cached_grid_round_trips(booster_model, grid, tmp_path):
+    cached = load_or_compile(booster_model, "test-version", grid_dir=str(tmp_path))
+    reloaded = load_or_compile(booster_model, "test-version", grid_dir=str(tmp_path))
+    for loaded in (cached, reloaded):
+        np.testing.assert_array_equal(loaded.device_thresholds, grid.device_thresholds)
+        np.testing.assert_array_equal(loaded.manuf_thresholds, grid.manuf_thresholds)
+        np.testing.assert_array_equal(loaded.levels, grid.levels)
+        np.testing.assert_array_equal(loaded.proba, grid.proba)
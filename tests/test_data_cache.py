@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cache import _encode_columns, load_cached_columns
+
+COLUMNS = ["name", "name_manufacturer", "risk_class"]
+
+
+def write_csv(path, frame, mode="w"):
+    frame.to_csv(path, mode=mode, header=mode == "w", index=False)
+
+
+def frame(start, stop):
+    rows = range(start, stop)
+    return pd.DataFrame({
+        "id": list(rows),
+        "name": [f"Device {i % 7}" if i % 11 else "" for i in rows],
+        "name_manufacturer": [f"Maker, \"{i % 5}\"" for i in rows],
+        "risk_class": [1 + i % 3 for i in rows],
+    })
+
+
+def decoded(cache, column):
+    values = np.array(cache.unique(column).tolist() + [None], dtype=object)
+    return values[cache.codes(column)].tolist()  # code -1 picks the trailing None
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "dataset.csv"
+    write_csv(path, frame(0, 100))
+    return str(path)
+
+
+def test_cache_matches_the_csv(source, tmp_path):
+    cache = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    expected = pd.read_csv(source, keep_default_na=False)
+    assert cache.n_rows == 100
+    assert decoded(cache, "name") == [v or None for v in expected["name"]]
+    assert decoded(cache, "name_manufacturer") == expected["name_manufacturer"].tolist()
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 1000])
+def test_chunked_encoding_matches_one_pass(source, tmp_path, chunk_rows):
+    from string_table import StringTable
+
+    one_pass, chunked = tmp_path / "one", tmp_path / "chunked"
+    one_pass.mkdir(), chunked.mkdir()
+    assert _encode_columns(source, COLUMNS[:2], str(one_pass), chunk_rows=10**6) == 100
+    assert _encode_columns(source, COLUMNS[:2], str(chunked), chunk_rows=chunk_rows) == 100
+    for column in COLUMNS[:2]:
+        np.testing.assert_array_equal(np.load(chunked / f"{column}.codes.npy"),
+                                      np.load(one_pass / f"{column}.codes.npy"))
+        assert StringTable(str(chunked / column)).tolist() == StringTable(str(one_pass / column)).tolist()
+
+
+def test_append_equals_a_full_rebuild(source, tmp_path):
+    first = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    write_csv(source, frame(100, 250), mode="a")
+    appended = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    rebuilt = load_cached_columns(source, cache_dir=str(tmp_path / "rebuilt"))
+
+    assert appended.manifest.get("appends") == 1 and "appends" not in rebuilt.manifest
+    assert appended.n_rows == rebuilt.n_rows == 250
+    assert appended.checksum == rebuilt.checksum
+    for column in COLUMNS:
+        assert decoded(appended, column) == decoded(rebuilt, column)
+    # Values seen before the append keep their codes
+    assert appended.unique("name").tolist()[:len(first.unique("name"))] == first.unique("name").tolist()
+
+
+def test_rewritten_source_is_rebuilt(source, tmp_path):
+    load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    write_csv(source, frame(500, 520))
+    cache = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    assert cache.n_rows == 20 and "appends" not in cache.manifest
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cache import load_cached_columns
+from dataset_stats import aggregate, load_stats, stats_path
+from risk_engine import RISK_LEVELS, predict_codes
+
+
+@pytest.fixture
+def dataset(tmp_path, encoders):
+    le_device, le_manuf = encoders
+    rows = pd.DataFrame({
+        "name": list(le_device.classes_[:60]) + ["no such device"] * 4,
+        "name_manufacturer": list(le_manuf.classes_[:16]) * 4,
+        "risk_class": ([1, 2, 3, ""] * 16),
+    })
+    path = tmp_path / "dataset.csv"
+    rows.to_csv(path, index=False)
+    return str(path), rows
+
+
+def test_counts_use_labels_and_the_given_model(dataset, booster_model, encoders, tmp_path):
+    source, rows = dataset
+    cache = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    stats = load_stats(cache, "test-bundle", lambda: (booster_model, *encoders))
+    predicted = predict_codes(booster_model, encoders[0].encode(rows["name"].tolist()),
+                              encoders[1].encode(rows["name_manufacturer"].tolist()))
+    labels = pd.to_numeric(rows["risk_class"], errors="coerce").fillna(0).astype(int).to_numpy()
+    levels = np.where(labels > 0, labels, predicted)
+    assert stats.n_rows == len(rows)
+    assert [int(stats.risk_counts[level]) for level in RISK_LEVELS] == [int((levels == level).sum()) for level in RISK_LEVELS]
+    assert stats.n_labeled == int((labels > 0).sum())
+    assert stats.n_agree == int((labels[labels > 0] == predicted[labels > 0]).sum())
+    assert stats.has_labels
+    assert stats_path(cache, "test-bundle").endswith("stats-test-bundle-risk_class.npz")
+
+
+def test_saved_counts_load_without_the_model(dataset, booster_model, encoders, tmp_path):
+    source, rows = dataset
+    cache = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    first = load_stats(cache, "test-bundle", lambda: (booster_model, *encoders))
+
+    def no_model():
+        raise AssertionError("the model was loaded although the saved counts cover every row")
+
+    again = load_stats(cache, "test-bundle", no_model)
+    assert (again.n_rows, again.risk_counts.tolist()) == (first.n_rows, first.risk_counts.tolist())
+    assert again.digest() == first.digest()
+    again.manufacturer_counts[0, 1] += 1
+    assert again.digest() != first.digest()
+
+
+def test_without_a_label_column_every_row_is_predicted(dataset, booster_model, encoders, tmp_path):
+    source, rows = dataset
+    rows.drop(columns=["risk_class"]).to_csv(source, index=False)
+    cache = load_cached_columns(source, cache_dir=str(tmp_path / "cache"))
+    stats = load_stats(cache, "test-bundle", lambda: (booster_model, *encoders))
+    predicted = predict_codes(booster_model, encoders[0].encode(rows["name"].tolist()),
+                              encoders[1].encode(rows["name_manufacturer"].tolist()))
+    assert stats.n_rows == len(rows) and not stats.has_labels and stats.accuracy is None
+    assert [int(stats.risk_counts[level]) for level in RISK_LEVELS] == [int((predicted == level).sum()) for level in RISK_LEVELS]
+    saved = load_stats(cache, "test-bundle", lambda: None)  # read back from the file the first call wrote
+    assert saved.n_rows == len(rows) and not saved.has_labels
+    assert not aggregate(cache, booster_model, *encoders, label_column="").has_labels
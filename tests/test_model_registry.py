@@ -0,0 +1,88 @@
+import gc
+import os
+import shutil
+import time
+import weakref
+
+import pytest
+
+from model_registry import ModelRegistry, ModelServer, RegistryError
+from risk_engine import BUNDLE_FILES, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH, MODEL_PATH, bundle_version
+
+
+def make_bundle(directory):
+    os.makedirs(directory)
+    for key, source in (("model", MODEL_PATH), ("device_encoder", DEVICE_ENCODER_PATH),
+                        ("manuf_encoder", MANUF_ENCODER_PATH)):
+        shutil.copy(source, os.path.join(directory, BUNDLE_FILES[key]))
+    return directory
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    registry.register(make_bundle(str(tmp_path / "v1")), activate=True)
+    return registry
+
+
+def tamper(registry, version, name=BUNDLE_FILES["model"]):
+    with open(os.path.join(registry.root, version, name), "ab") as f:
+        f.write(b"\0")
+
+
+def test_register_records_checksums(registry):
+    assert registry.active_version() == "v1"
+    assert set(registry.versions()["v1"]["sha256"]) == set(BUNDLE_FILES.values())
+    assert registry.verify("v1") == registry.paths("v1")
+
+
+def test_verify_rejects_a_modified_file(registry):
+    tamper(registry, "v1", BUNDLE_FILES["device_encoder"])
+    with pytest.raises(RegistryError, match="checksum mismatch for le_device.pkl"):
+        registry.verify("v1")
+
+
+def test_verify_rejects_a_missing_file(registry):
+    os.remove(os.path.join(registry.root, "v1", BUNDLE_FILES["manuf_encoder"]))
+    with pytest.raises(RegistryError, match="cannot read le_manuf.pkl"):
+        registry.verify("v1")
+
+
+def test_activate_rejects_a_modified_bundle(registry, tmp_path):
+    registry.register(make_bundle(str(tmp_path / "v2")))
+    tamper(registry, "v2")
+    with pytest.raises(RegistryError):
+        registry.activate("v2")
+    assert registry.active_version() == "v1"
+
+
+def test_server_keeps_serving_when_the_new_version_fails_to_verify(registry, tmp_path):
+    server = ModelServer(registry, poll_seconds=0)
+    assert server.current().version == "v1"
+    registry.register(make_bundle(str(tmp_path / "v2")))
+    tamper(registry, "v2")
+    manifest = registry.read()
+    manifest["active"] = "v2"  # activated without verification, e.g. by hand
+    time.sleep(0.01)  # a new registry.json stamp
+    registry._write(manifest)
+    assert not server.refresh()
+    assert server.current().version == "v1"
+    assert "checksum mismatch" in server.last_error
+
+
+def test_paths_are_known_before_the_model_loads(registry):
+    server = ModelServer(registry, poll_seconds=0)
+    assert server.paths() == registry.paths("v1") and server.loaded() is None
+    assert bundle_version(server.paths()) == bundle_version((MODEL_PATH, DEVICE_ENCODER_PATH, MANUF_ENCODER_PATH))
+    assert server.current().paths == server.paths()
+
+
+def test_swapped_out_deployment_is_freed(registry, tmp_path):
+    server = ModelServer(registry, poll_seconds=0)
+    old = weakref.ref(server.current().model)
+    time.sleep(0.01)
+    registry.register(make_bundle(str(tmp_path / "v2")), activate=True)
+    assert server.refresh()
+    assert server.current().version == "v2"
+    gc.collect()
+    assert old() is None
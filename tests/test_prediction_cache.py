@@ -0,0 +1,59 @@
+import copy
+
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(maxsize=2)
+    cache.put((1, 1), "a")
+    cache.put((2, 2), "b")
+    assert cache.get((1, 1)) == "a"  # (2, 2) is now the oldest
+    cache.put((3, 3), "c")
+    assert cache.get((2, 2)) is None
+    assert cache.get((1, 1)) == "a" and cache.get((3, 3)) == "c"
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(maxsize=10, ttl=5)
+    cache.put((1, 1), "a")
+    clock[0] += 4
+    assert cache.get((1, 1)) == "a"
+    clock[0] += 2
+    assert cache.get((1, 1)) is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_model_versions_keep_their_own_entries(booster_model, monkeypatch):
+    import risk_engine
+
+    monkeypatch.setattr(risk_engine, "PREDICTION_CACHE", PredictionCache(maxsize=10))
+    old, new = booster_model, copy.deepcopy(booster_model)
+    monkeypatch.setitem(risk_engine._MODEL_VERSIONS, old, "v1")
+    monkeypatch.setitem(risk_engine._MODEL_VERSIONS, new, "v2")
+    risk_engine.predict_pair_proba(old, 1, 1)
+    risk_engine.predict_pair_proba(new, 1, 1)  # a second deployment does not clear the first one's entries
+    risk_engine.predict_pair_proba(old, 1, 1)
+    cache = risk_engine.PREDICTION_CACHE
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+    assert cache.get(("v1", 1, 1)) is not None and cache.get(("v2", 1, 1)) is not None
+
+
+def test_stats_report_the_hit_rate():
+    cache = PredictionCache(maxsize=10)
+    cache.put((1, 1), "a")
+    cache.get((1, 1))
+    cache.get((2, 2))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
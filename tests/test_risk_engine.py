@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import risk_engine
+from compiled_model import IntervalGrid
+from risk_engine import (RISK_LEVELS, UNKNOWN_CODE, EncoderIndex, batching_applies, cross_level_counts,
+                         normalize_name, predict_codes, read_model, register_fast_path, MODEL_PATH)
+from vocabulary import build_vocabulary
+
+
+@pytest.fixture(scope="module")
+def grid_model(booster_model):
+    """A second copy of the model, served by its interval grid"""
+    import warnings
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = read_model(MODEL_PATH)
+    register_fast_path(model, "test-grid", grid=IntervalGrid.compile(booster_model))
+    return model
+
+
+def brute_force_counts(model, device_codes, manuf_codes):
+    counts = np.zeros((len(manuf_codes), len(RISK_LEVELS)), dtype=np.int64)
+    for i, manuf_code in enumerate(manuf_codes):
+        levels = predict_codes(model, device_codes, np.full(len(device_codes), manuf_code, dtype=np.int32))
+        counts[i] = [(levels == level).sum() for level in RISK_LEVELS]
+    return counts
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_cross_level_counts_match_brute_force(booster_model, grid_model, encoders, fast_path):
+    le_device, le_manuf = encoders
+    rng = np.random.default_rng(3)
+    device_codes = np.append(rng.choice(len(le_device), 500, replace=False), UNKNOWN_CODE).astype(np.int32)
+    manuf_codes = np.append(rng.choice(len(le_manuf), 40, replace=False), UNKNOWN_CODE).astype(np.int32)
+    model = grid_model if fast_path else booster_model
+    counts = cross_level_counts(model, device_codes, manuf_codes, chunk_size=1000)
+    np.testing.assert_array_equal(counts, brute_force_counts(booster_model, device_codes, manuf_codes))
+    assert (counts.sum(axis=1) == len(device_codes)).all()
+
+
+def test_cross_level_counts_of_nothing(booster_model):
+    assert cross_level_counts(booster_model, [], [1, 2]).shape == (2, len(RISK_LEVELS))
+    assert cross_level_counts(booster_model, [1, 2], []).shape == (0, len(RISK_LEVELS))
+
+
+def test_encoder_index_matches_exactly(encoders):
+    le_device, _ = encoders
+    name = le_device.classes_[10]
+    assert le_device.code(name) == 10
+    assert le_device.code(f" {name} ") == UNKNOWN_CODE
+    assert le_device.code(["unhashable"]) == UNKNOWN_CODE
+    np.testing.assert_array_equal(le_device.encode([name, f" {name} ", "no such device"]), [10, -1, -1])
+
+
+class FakeEncoder:
+    def __init__(self, classes):
+        self.classes_ = np.array(classes, dtype=object)
+
+
+def test_vocabulary_codes_come_from_the_exact_spellings():
+    encoder = EncoderIndex(FakeEncoder(["Pump", " Stent ", "Valve", "Valve  "]))
+    vocabulary = build_vocabulary(["Pump", "Pump ", " Stent ", "Valve", "Valve  ", "Unknown  one", 7], encoder)
+    # "Valve" and "Valve  " are different classes, so each is offered as written
+    assert vocabulary.names == ["Pump", "Stent", "Unknown one", "Valve", "Valve  "]
+    assert [vocabulary.code(name) for name in vocabulary.names] == [0, 1, UNKNOWN_CODE, 2, 3]
+    assert normalize_name(" Stent ") == "Stent"
+
+
+def test_vocabulary_of_the_shipped_encoders_is_consistent(encoders):
+    for encoder in encoders:
+        vocabulary = build_vocabulary(list(encoder.classes_), encoder)
+        assert len(vocabulary) == len(encoder)
+        for name, code in zip(vocabulary.names, vocabulary.codes.tolist()):
+            assert normalize_name(encoder.classes_[code]) == normalize_name(name)
+
+
+def test_only_models_without_a_fast_path_are_batched(booster_model, grid_model, monkeypatch):
+    monkeypatch.setattr(risk_engine, "BATCHING_ENABLED", True)
+    assert batching_applies(booster_model)
+    assert not batching_applies(grid_model)
+    monkeypatch.setattr(risk_engine, "BATCHING_ENABLED", False)
+    assert not batching_applies(booster_model)
@@ -0,0 +1,266 @@
+"""Offline training pipeline for the 2-feature risk model
+
+Produces a versioned artifact bundle from the recall dataset:
+
+    python train_model.py --data "data csv/final_merged_dataset.csv" --folds 5 --workers 4
+
+Steps:
+
+1. Stream the CSV into the columnar data cache (only the name, manufacturer
+   and risk class columns are read, in chunks).
+2. Fit the label encoders on the sorted unique names and encode every row
+   with one gather through the cached dictionary codes.
+3. Balance the classes, by inverse-frequency sample weights or by random
+   oversampling of the minority classes.
+4. Run stratified cross-validation folds in a process pool, each training
+   an XGBoost ``hist`` model on a share of the cores.
+5. Train the final model on all rows and write the bundle directory:
+   ``model.ubj``, ``le_device.pkl``, ``le_manuf.pkl`` and ``manifest.json``.
+
+Serve a bundle with ``RISK_APP_BUNDLE=<bundle dir>`` (see risk_engine).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data_cache import CACHE_DIR, LABEL_COLUMN, load_cached_columns
+from risk_engine import BUNDLE_FILES, RISK_MAPPING, file_version
+
+BUNDLE_DIR = "artifacts"
+BALANCING = ("weights", "oversample", "none")
+DEFAULT_PARAMS = {
+    "n_estimators": 200,
+    "max_depth": 6,
+    "learning_rate": 0.1,
+    "subsample": 0.9,
+    "tree_method": "hist",
+    "objective": "multi:softprob",
+    "eval_metric": "mlogloss",
+}
+
+
+def fit_encoder(names):
+    """LabelEncoder fitted on names without a per-row pass (classes_ is sorted and unique)"""
+    from sklearn.preprocessing import LabelEncoder
+
+    encoder = LabelEncoder()
+    encoder.classes_ = np.unique(np.asarray(names, dtype=object))
+    return encoder
+
+
+def _encode_rows(column_cache, column, encoder):
+    """Per-row encoder codes for a cached column: one searchsorted over its uniques, one gather per row"""
+    uniques = np.asarray(column_cache.unique(column).tolist(), dtype=object)
+    unique_codes = np.searchsorted(encoder.classes_, uniques).astype(np.int32)
+    return np.append(unique_codes, np.int32(-1))[np.asarray(column_cache.codes(column))]
+
+
+def _parse_labels(column_cache, label_column):
+    """Model class (0-2) per row, -1 where the recorded risk class is missing or invalid"""
+    to_class = {str(level): cls for cls, level in RISK_MAPPING.items()}
+    values = column_cache.unique(label_column).tolist()
+    classes = np.full(len(values) + 1, -1, dtype=np.int8)
+    for i, value in enumerate(values):
+        try:
+            classes[i] = to_class.get(str(int(float(value))), -1)
+        except (ValueError, OverflowError):
+            pass
+    return classes[np.asarray(column_cache.codes(label_column))]
+
+
+def load_training_data(source, label_column=LABEL_COLUMN, cache_dir=CACHE_DIR):
+    """Features, classes and fitted encoders from the rows that have a valid recorded class"""
+    cached = load_cached_columns(source, ("name", "name_manufacturer", label_column), cache_dir)
+    labels = _parse_labels(cached, label_column)
+    keep = np.flatnonzero(labels >= 0)
+    device_uniques = cached.unique("name").tolist()
+    manuf_uniques = cached.unique("name_manufacturer").tolist()
+    le_device = fit_encoder(device_uniques)
+    le_manuf = fit_encoder(manuf_uniques)
+    X = np.empty((len(keep), 2), dtype=np.float32)
+    X[:, 0] = _encode_rows(cached, "name", le_device)[keep]
+    X[:, 1] = _encode_rows(cached, "name_manufacturer", le_manuf)[keep]
+    return X, labels[keep].astype(np.int32), le_device, le_manuf, cached
+
+
+def balance(X, y, method="weights", seed=0):
+    """Return (X, y, sample_weight) with the classes balanced by method"""
+    counts = np.bincount(y, minlength=len(RISK_MAPPING))
+    if method == "weights":
+        present = counts > 0
+        class_weight = np.zeros(len(counts))
+        class_weight[present] = len(y) / (present.sum() * counts[present])
+        return X, y, class_weight[y]
+    if method == "oversample":
+        rng = np.random.default_rng(seed)
+        target = counts.max()
+        extra = [rng.choice(np.flatnonzero(y == cls), target - count)
+                 for cls, count in enumerate(counts) if 0 < count < target]
+        if extra:
+            rows = np.concatenate([np.arange(len(y))] + extra)
+            return X[rows], y[rows], None
+        return X, y, None
+    if method == "none":
+        return X, y, None
+    raise ValueError(f"unknown balancing method {method!r}, expected one of {', '.join(BALANCING)}")
+
+
+def _train(X, y, sample_weight, params, n_jobs, seed):
+    from xgboost import XGBClassifier
+
+    model = XGBClassifier(**params, n_jobs=n_jobs, random_state=seed)
+    model.fit(X, y, sample_weight=sample_weight)
+    return model
+
+
+def _run_fold(args):
+    """Train on one fold's training rows and score its held-out rows (runs in a worker process)"""
+    fold, X, y, train_idx, test_idx, method, params, n_jobs, seed = args
+    from sklearn.metrics import accuracy_score, f1_score
+
+    started = time.perf_counter()
+    X_train, y_train, weight = balance(X[train_idx], y[train_idx], method, seed + fold)
+    model = _train(X_train, y_train, weight, params, n_jobs, seed)
+    predicted = model.predict(X[test_idx])
+    return {
+        "fold": fold,
+        "rows": int(len(test_idx)),
+        "accuracy": float(accuracy_score(y[test_idx], predicted)),
+        "macro_f1": float(f1_score(y[test_idx], predicted, average="macro")),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def cross_validate(X, y, folds=5, workers=1, method="weights", params=DEFAULT_PARAMS, seed=0, progress=sys.stderr):
+    """Stratified k-fold scores, with folds trained in parallel processes"""
+    from sklearn.model_selection import StratifiedKFold
+
+    splits = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y)
+    n_jobs = max(1, (os.cpu_count() or 1) // max(1, workers))
+    tasks = [(fold, X, y, train_idx, test_idx, method, params, n_jobs, seed)
+             for fold, (train_idx, test_idx) in enumerate(splits)]
+    results = []
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            for result in pool.map(_run_fold, tasks):
+                results.append(result)
+                _report_fold(result, progress)
+    else:
+        for task in tasks:
+            results.append(_run_fold(task))
+            _report_fold(results[-1], progress)
+    return results
+
+
+def _report_fold(result, progress):
+    if progress:
+        progress.write(f"  fold {result['fold']}: accuracy {result['accuracy']:.3f}, "
+                       f"macro F1 {result['macro_f1']:.3f} ({result['seconds']}s)\n")
+
+
+def write_bundle(model, le_device, le_manuf, manifest, bundle_dir=BUNDLE_DIR):
+    """Write a versioned bundle directory atomically and return its path"""
+    import joblib
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".bundle-", dir=bundle_dir)
+    try:
+        model.save_model(os.path.join(staging, BUNDLE_FILES["model"]))
+        joblib.dump(le_device, os.path.join(staging, BUNDLE_FILES["device_encoder"]))
+        joblib.dump(le_manuf, os.path.join(staging, BUNDLE_FILES["manuf_encoder"]))
+        model_hash = file_version(os.path.join(staging, BUNDLE_FILES["model"]))
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{model_hash}"
+        manifest = dict(manifest, version=version, model_version=model_hash, files=BUNDLE_FILES)
+        with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.chmod(staging, 0o755)
+        path = os.path.join(bundle_dir, version)
+        os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return path
+
+
+def train(source, bundle_dir=BUNDLE_DIR, folds=5, workers=1, method="weights", label_column=LABEL_COLUMN,
+          params=DEFAULT_PARAMS, seed=0, progress=sys.stderr):
+    """Run the whole pipeline and return the bundle path"""
+    started = time.perf_counter()
+    X, y, le_device, le_manuf, cached = load_training_data(source, label_column)
+    if progress:
+        counts = np.bincount(y, minlength=len(RISK_MAPPING)).tolist()
+        progress.write(f"{len(y):,} labelled rows of {cached.n_rows:,}, class counts {counts}, "
+                       f"{len(le_device.classes_):,} devices, {len(le_manuf.classes_):,} manufacturers\n")
+    scores = []
+    if folds > 1:
+        if progress:
+            progress.write(f"Cross-validating {folds} folds with {workers} worker(s)\n")
+        scores = cross_validate(X, y, folds, workers, method, params, seed, progress)
+    if progress:
+        progress.write("Training the final model on all rows\n")
+    X_all, y_all, weight = balance(X, y, method, seed)
+    model = _train(X_all, y_all, weight, params, os.cpu_count() or 1, seed)
+    manifest = {
+        "created_at": time.time(),
+        "source": str(source),
+        "data_sha256": cached.checksum,
+        "label_column": label_column,
+        "rows": int(len(y)),
+        "class_counts": np.bincount(y, minlength=len(RISK_MAPPING)).tolist(),
+        "balancing": method,
+        "params": params,
+        "seed": seed,
+        "cv": scores,
+        "cv_accuracy": float(np.mean([s["accuracy"] for s in scores])) if scores else None,
+        "cv_macro_f1": float(np.mean([s["macro_f1"] for s in scores])) if scores else None,
+        "train_seconds": round(time.perf_counter() - started, 2),
+    }
+    return write_bundle(model, le_device, le_manuf, manifest, bundle_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the 2-feature risk model and write an artifact bundle")
+    parser.add_argument("--data", required=True, help="CSV path or URL of the recall dataset")
+    parser.add_argument("--output", default=BUNDLE_DIR, help="directory the versioned bundle is written under")
+    parser.add_argument("--label-column", default=LABEL_COLUMN)
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds (0 or 1 to skip)")
+    parser.add_argument("--workers", type=int, default=1, help="folds trained in parallel processes")
+    parser.add_argument("--balance", choices=BALANCING, default="weights")
+    parser.add_argument("--n-estimators", type=int, default=DEFAULT_PARAMS["n_estimators"])
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_PARAMS["max_depth"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_PARAMS["learning_rate"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--activate", action="store_true",
+                        help="register the bundle in the model registry and serve it")
+    parser.add_argument("--registry", help="registry --activate registers into "
+                                           "(default: RISK_APP_REGISTRY_DIR, as the apps read it)")
+    args = parser.parse_args(argv)
+
+    params = dict(DEFAULT_PARAMS, n_estimators=args.n_estimators, max_depth=args.max_depth,
+                  learning_rate=args.learning_rate)
+    path = train(args.data, args.output, args.folds, args.workers, args.balance, args.label_column, params,
+                 args.seed)
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    print(f"Wrote bundle {path} (CV accuracy {manifest['cv_accuracy']}, macro F1 {manifest['cv_macro_f1']}, "
+          f"{manifest['train_seconds']}s)")
+    if args.activate:
+        from model_registry import REGISTRY_DIR, ModelRegistry
+
+        # The registry the apps poll, not --output; a bundle written elsewhere is copied into it
+        registry = ModelRegistry(args.registry or REGISTRY_DIR)
+        version = registry.register(path, activate=True)
+        print(f"Activated {version} in {registry.root}; running apps swap to it in the background")
+    else:
+        print(f"Serve it with RISK_APP_BUNDLE={path}, or python model_registry.py register {path} --activate")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Presorted autocomplete vocabularies persisted next to the data cache"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from data_cache import CACHE_DIR
+from risk_engine import UNKNOWN_CODE, as_index, normalize_name
+from string_table import StringTable, string_table_exists, write_string_table
+
+FORMAT_VERSION = 2
+
+
+class Vocabulary:
+    """Sorted, deduplicated display names with their encoder codes"""
+
+    def __init__(self, names, codes):
+        self.names = names
+        self.codes = np.asarray(codes, dtype=np.int32)
+        # Built once so every rerun hands the selectbox the same object
+        self.options = ("",) + tuple(names)
+        self._positions = {name: i for i, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def code(self, name):
+        """Encoder code for a display name, -1 when the encoder does not know it"""
+        position = self._positions.get(name)
+        return UNKNOWN_CODE if position is None else int(self.codes[position])
+
+
+def build_vocabulary(names, encoder):
+    """Normalize, deduplicate and sort names, attaching each one's encoder code
+
+    The code comes from the exact spellings a display name was normalized
+    from. When those spellings are different encoder classes, the display
+    name would be ambiguous, so each spelling is listed as written instead.
+    """
+    raw = sorted({n for n in names if isinstance(n, str)})
+    groups = {}
+    for name, code in zip(raw, as_index(encoder).encode(raw).tolist()):
+        groups.setdefault(normalize_name(name), []).append((name, code))
+    entries = {}
+    for display, members in groups.items():
+        known = {code for _, code in members if code != UNKNOWN_CODE}
+        if len(known) > 1:
+            entries.update(members)
+        elif display:
+            entries[display] = known.pop() if known else UNKNOWN_CODE
+    display = sorted(entries)
+    return Vocabulary(display, [entries[name] for name in display])
+
+
+def _artifact_prefix(column_cache, column, encoder, cache_dir):
+    key = hashlib.sha1(json.dumps(
+        [FORMAT_VERSION, column_cache.checksum, column, as_index(encoder).digest]).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, "vocab", key, column)
+
+
+def load_vocabulary(column_cache, column, encoder, cache_dir=CACHE_DIR):
+    """Load the vocabulary for a cached data column, building and persisting it on first use"""
+    prefix = _artifact_prefix(column_cache, column, encoder, cache_dir)
+    codes_path = prefix + ".codes.npy"
+    if string_table_exists(prefix) and os.path.exists(codes_path):
+        return Vocabulary(StringTable(prefix).tolist(), np.load(codes_path))
+    vocabulary = build_vocabulary(column_cache.unique(column), encoder)
+    write_string_table(prefix, vocabulary.names)
+    # The codes file is what marks the artifact complete, so it is written last and atomically
+    np.save(prefix + ".codes.tmp.npy", vocabulary.codes)
+    os.replace(prefix + ".codes.tmp.npy", codes_path)
+    return vocabulary